@@ -22,6 +22,16 @@ class ACS(object):
         self._mo14_results = {}  # type: Dict[str, int]
         self._mo14_provided = {}  # type: Dict[str, int]
 
+    def register_handlers(self, router):
+        """
+        The result of `handle` is processed by the factory, i.e. the message is replayed or the output is used
+        :param router:
+        :return:
+        """
+        def _handle(msg, sender_vk):
+            self._factory.process_acs_res(self.handle(msg, sender_vk), msg, sender_vk)
+        router.register('ACS', _handle)
+
     def reset(self):
         """
         :return:
@@ -44,6 +54,8 @@ class ACS(object):
         self.reset()
         self._round = r
         self._done = True
+        # the buffered messages of these rounds are handled (i.e. ignored) now
+        self._factory.replay.release_if(lambda k: k[0] <= r)
 
     def start(self, msg, r):
         """
@@ -73,6 +85,9 @@ class ACS(object):
             self._brachas[promoter] = Bracha(self._factory, msg_wrapper_f_factory(promoter, self._round))
             self._mo14s[promoter] = Mo14(self._factory, msg_wrapper_f_factory(promoter, self._round))
 
+        # the messages of earlier rounds are ignored, the ones that waited for this round or its instances are handled
+        self._factory.replay.release_if(lambda k: k[0] < r or (k[0] == r and k[2] in ('round', 'bracha')))
+
         my_vk = self._factory.vk
         assert my_vk in self._brachas
         assert my_vk in self._mo14s
@@ -108,7 +123,7 @@ class ACS(object):
 
         if msg.round > self._round:
             logging.debug("ACS: round is not ready, curr: {}, required: {}".format(self._round, msg.round))
-            return Replay()
+            return Replay((msg.round, None, 'round'))
 
         if self._done:
             logging.debug("ACS: we're done, doing nothing")
@@ -126,26 +141,29 @@ class ACS(object):
         if body_type == 'bracha':
             if instance not in self._brachas:
                 logging.debug("instance {} not in self.brachas".format(b64encode(instance)))
-                return Replay()
+                return Replay((round, instance, 'bracha'))
             res = self._brachas[instance].handle(msg.bracha, sender_vk)
             if isinstance(res, Handled) and res.m is not None:
                 logging.debug("ACS: Bracha delivered for {}, {}".format(b64encode(instance), res.m))
                 self._bracha_results[instance] = res.m
                 if instance not in self._mo14_provided:
                     logging.debug("ACS: initiating BA for {}, {}".format(b64encode(instance), 1))
-                    self._mo14_provided[instance] = 1
-                    self._mo14s[instance].start(1)
+                    self._start_mo14(instance, 1)
 
         elif body_type == 'mo14':
             if instance in self._mo14_provided:
                 logging.debug("ACS: forwarding Mo14")
-                res = self._mo14s[instance].handle(msg.mo14, sender_vk)
+                mo14 = self._mo14s[instance]
+                mo14_round = mo14.round
+                res = mo14.handle(msg.mo14, sender_vk)
+                if mo14.round != mo14_round:
+                    self._factory.replay.release((round, instance, 'mo14', mo14.round))
                 if isinstance(res, Handled) and res.m is not None:
                     logging.debug("ACS: delivered Mo14 for {}, {}".format(b64encode(instance), res.m))
                     self._mo14_results[instance] = res.m
                 elif isinstance(res, Replay):
                     # raise AssertionError("Impossible, our Mo14 instance already instantiated")
-                    return Replay()
+                    return Replay((round, instance, 'mo14', msg.mo14.r))
 
             ones = [v for k, v in self._mo14_results.iteritems() if v == 1]
             if len(ones) >= n - t:
@@ -154,14 +172,13 @@ class ACS(object):
                 logging.debug("difference = {}".format(difference))
                 for d in list(difference):
                     logging.debug("ACS: initiating BA for {}, v {}".format(b64encode(d), 0))
-                    self._mo14_provided[d] = 0
-                    self._mo14s[d].start(0)
+                    self._start_mo14(d, 0)
 
             if instance not in self._mo14_provided:
                 logging.debug("ACS: got BA before RBC...")
                 # if we got a BA instance, but we haven't deliver its corresponding RBC,
                 # we instruct the caller to replay the message
-                return Replay()
+                return Replay((round, instance, 'ba'))
 
         else:
             raise AssertionError("ACS: invalid payload type")
@@ -182,6 +199,18 @@ class ACS(object):
             return Handled(res)
         return Handled()
 
+    def _start_mo14(self, instance, v):
+        """
+        Start the BA of `instance` and release the messages that are waiting for it
+        :param instance:
+        :param v:
+        :return:
+        """
+        self._mo14_provided[instance] = v
+        self._mo14s[instance].start(v)
+        self._factory.replay.release((self._round, instance, 'ba'))
+        self._factory.replay.release((self._round, instance, 'mo14', self._mo14s[instance].round))
+
     def _collate_results(self):
         key_of_ones = [k for k, v in self._mo14_results.iteritems() if v == 1]
 
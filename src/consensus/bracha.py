@@ -43,6 +43,14 @@ class Bracha(object):
         self._ec_driver = ECDriver(k=k, m=m, ec_type='liberasurecode_rs_vand')
         random.seed()
 
+    def register_handlers(self, router):
+        """
+        Only used for testing Bracha directly, it is normally driven by ACS
+        :param router:
+        :return:
+        """
+        router.register('Bracha', self.handle)
+
     def handle(self, msg, sender_vk):
         # type: (pb.Bracha) -> Handled
         """
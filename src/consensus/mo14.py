@@ -48,6 +48,19 @@ class Mo14(object):
         self._bin_values = defaultdict(set)  # key: r, val: binary set()
         self._msg_wrapper_f = msg_wrapper_f
 
+    def register_handlers(self, router):
+        """
+        Only used for testing Mo14 directly, it is normally driven by ACS
+        :param router:
+        :return:
+        """
+        router.register('Mo14', self.handle)
+
+    @property
+    def round(self):
+        # type: () -> int
+        return self._r
+
     def start(self, v):
         assert v in (0, 1)
 
@@ -4,10 +4,11 @@ import sys
 
 from twisted.internet import reactor, task
 from twisted.internet.protocol import Factory
-from typing import Union, Dict
+from typing import Dict
 
 import src.messages.messages_pb2 as pb
-from src.protobufreceiver import ProtobufReceiver
+from src.protobufreceiver import ProtobufReceiver, encode_frame
+from src.router import Router
 from src.utils import set_logging, my_err_back, call_later
 
 return_code = 0
@@ -18,12 +19,19 @@ class Discovery(ProtobufReceiver):
     this is both a discovery server and a coin server, the latter is not implemented yet
     """
 
-    def __init__(self, nodes, factory):
+    def __init__(self, nodes, factory, router=None):
         self.nodes = nodes  # type: Dict[str, str]
         self.vk = None
         self.addr = None
         self.state = 'SERVER'
         self.factory = factory  # this changes depending on whether it's a server or client
+        self.router = router  # the client has its own router, see make_client_router
+
+    def frame_received(self, tag, data):
+        if self.router is None:
+            ProtobufReceiver.frame_received(self, tag, data)
+        else:
+            self.router.route(tag, data, None)
 
     def connection_lost(self, reason):
         if self.vk in self.nodes:
@@ -31,8 +39,9 @@ class Discovery(ProtobufReceiver):
             logging.debug("Discovery: deleted {}".format(self.vk))
 
     def obj_received(self, obj):
-        # type: (Union[pb.Discover, pb.DiscoverReply]) -> None
+        # type: (pb.Discover) -> None
         """
+        Only the server gets here, the client routes its messages, see frame_received.
         we don't bother with decoding vk here, since we don't use vk in any crypto functions
         :param obj:
         :return:
@@ -40,32 +49,21 @@ class Discovery(ProtobufReceiver):
         logging.debug("Discovery: received msg {} from {}"
                       .format(obj, self.transport.getPeer().host).replace('\n', ','))
 
-        if self.state == 'SERVER':
-            if isinstance(obj, pb.Discover):
-                self.vk = obj.vk  # NOTE storing base64 form as is
-                self.addr = self.transport.getPeer().host + ":" + str(obj.port)
-
-                # TODO check addr to be in the form host:port
-                if self.vk not in self.nodes:
-                    logging.debug("Discovery: added node {} {}".format(self.vk, self.addr))
-                    self.nodes[self.vk] = (self.addr, self)
+        assert self.state == 'SERVER'
+        if isinstance(obj, pb.Discover):
+            self.vk = obj.vk  # NOTE storing base64 form as is
+            self.addr = self.transport.getPeer().host + ":" + str(obj.port)
 
-                assert isinstance(self.factory, DiscoveryFactory)
-                self.send_obj(pb.DiscoverReply(nodes=self.factory.make_nodes_dict()))
+            # TODO check addr to be in the form host:port
+            if self.vk not in self.nodes:
+                logging.debug("Discovery: added node {} {}".format(self.vk, self.addr))
+                self.nodes[self.vk] = (self.addr, self)
 
-            else:
-                raise AssertionError("Discovery: invalid payload type on SERVER")
+            assert isinstance(self.factory, DiscoveryFactory)
+            self.send_obj(pb.DiscoverReply(nodes=self.factory.make_nodes_dict()))
 
-        elif self.state == 'CLIENT':
-            if isinstance(obj, pb.DiscoverReply):
-                logging.debug("Discovery: making new clients...")
-                self.factory.new_connection_if_not_exist(obj.nodes)
-
-            elif isinstance(obj, pb.Instruction):
-                self.factory.handle_instruction(obj)
-
-            else:
-                raise AssertionError("Discovery: invalid payload type on CLIENT")
+        else:
+            raise AssertionError("Discovery: invalid payload type on SERVER")
 
     def say_hello(self, vk, port):
         self.state = 'CLIENT'
@@ -135,9 +133,29 @@ class DiscoveryFactory(Factory):
         return Discovery(self.nodes, self)
 
     def bcast(self, msg):
+        name, frame = encode_frame(msg)
         for k, v in self.nodes.iteritems():
             proto = v[1]
-            proto.send_obj(msg)
+            proto.send_frame(name, frame)
+
+
+def make_client_router(factory):
+    # type: (...) -> Router
+    """
+    Handle the messages from the discovery server on a node.
+    The router is separate from the one of the node, so that the discovery server can only send
+    DiscoverReply and Instruction, and its traffic is not counted as traffic between the nodes.
+    :param factory: the node factory
+    :return:
+    """
+    def _handle_reply(msg, _):
+        logging.debug("Discovery: making new clients...")
+        factory.new_connection_if_not_exist(msg.nodes)
+
+    router = Router()
+    router.register('DiscoverReply', _handle_reply)
+    router.register('Instruction', lambda msg, _: factory.handle_instruction(msg))
+    return router
 
 
 def got_discovery(p, id, port):
@@ -176,7 +194,8 @@ if __name__ == '__main__':
     parser.add_argument(
         '--inst',
         metavar='INST',
-        help='the instruction to send after all nodes are connected',
+        help='the instruction to send after all nodes are connected, as DELAY INSTRUCTION [PARAM], '
+             'e.g. 10 workload "rate=0:100,60:500 dist=zipf s=1.2"',
         nargs='*'
     )
     args = parser.parse_args()
@@ -19,9 +19,8 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   name='messages.proto',
   package='',
   syntax='proto3',
-  serialized_pb=_b('\n\x0emessages.proto\"\x12\n\x05\x44ummy\x12\t\n\x01m\x18\x01 \x01(\t\"$\n\x08\x44iscover\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x0c\n\x04port\x18\x02 \x01(\x05\"g\n\rDiscoverReply\x12(\n\x05nodes\x18\x01 \x03(\x0b\x32\x19.DiscoverReply.NodesEntry\x1a,\n\nNodesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t:\x02\x38\x01\"@\n\x0bInstruction\x12\x13\n\x0binstruction\x18\x01 \x01(\t\x12\r\n\x05\x64\x65lay\x18\x02 \x01(\x05\x12\r\n\x05param\x18\x03 \x01(\t\" \n\x04Ping\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x0c\n\x04port\x18\x02 \x01(\x05\" \n\x04Pong\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x0c\n\x04port\x18\x02 \x01(\x05\"k\n\x06\x42racha\x12\x18\n\x02ty\x18\x01 \x01(\x0e\x32\x0c.Bracha.Type\x12\x0e\n\x06\x64igest\x18\x02 \x01(\x0c\x12\x10\n\x08\x66ragment\x18\x03 \x01(\x0c\"%\n\x04Type\x12\x08\n\x04INIT\x10\x00\x12\x08\n\x04\x45\x43HO\x10\x01\x12\t\n\x05READY\x10\x02\"N\n\x04Mo14\x12\x16\n\x02ty\x18\x01 \x01(\x0e\x32\n.Mo14.Type\x12\t\n\x01r\x18\x02 \x01(\x05\x12\t\n\x01v\x18\x03 \x01(\x05\"\x18\n\x04Type\x12\x07\n\x03\x45ST\x10\x00\x12\x07\n\x03\x41UX\x10\x01\"`\n\x03\x41\x43S\x12\x10\n\x08instance\x18\x01 \x01(\x0c\x12\r\n\x05round\x18\x02 \x01(\x05\x12\x19\n\x06\x62racha\x18\x03 \x01(\x0b\x32\x07.BrachaH\x00\x12\x15\n\x04mo14\x18\x04 \x01(\x0b\x32\x05.Mo14H\x00\x42\x06\n\x04\x62ody\"\x93\x01\n\x07TxBlock\x12\x1d\n\x05inner\x18\x01 \x01(\x0b\x32\x0e.TxBlock.Inner\x12\x15\n\x01s\x18\x02 \x01(\x0b\x32\n.Signature\x1aR\n\x05Inner\x12\x0c\n\x04prev\x18\x01 \x01(\x0c\x12\x0b\n\x03seq\x18\x02 \x01(\x05\x12\x14\n\x0c\x63ounterparty\x18\x03 \x01(\x0c\x12\r\n\x05nonce\x18\x04 \x01(\x0c\x12\t\n\x01m\x18\x05 \x01(\t\"\x1d\n\x05TxReq\x12\x14\n\x02tx\x18\x01 \x01(\x0b\x32\x08.TxBlock\"+\n\x06TxResp\x12\x14\n\x02tx\x18\x01 \x01(\x0b\x32\x08.TxBlock\x12\x0b\n\x03seq\x18\x02 \x01(\x05\"\xa8\x01\n\x07\x43pBlock\x12\x1d\n\x05inner\x18\x01 \x01(\x0b\x32\x0e.CpBlock.Inner\x12\x15\n\x01s\x18\x02 \x01(\x0b\x32\n.Signature\x1ag\n\x05Inner\x12\x0c\n\x04prev\x18\x01 \x01(\x0c\x12\x0b\n\x03seq\x18\x02 \x01(\x05\x12\r\n\x05round\x18\x03 \x01(\x05\x12\x11\n\tcons_hash\x18\x04 \x01(\x0c\x12\x16\n\x02ss\x18\x05 \x03(\x0b\x32\n.Signature\x12\t\n\x01p\x18\x06 \x01(\x05\"!\n\x08\x43pBlocks\x12\x15\n\x03\x63ps\x18\x01 \x03(\x0b\x32\x08.CpBlock\"0\n\tSignature\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x17\n\x0fsigned_document\x18\x02 \x01(\x0c\"0\n\x0cSigWithRound\x12\x15\n\x01s\x18\x01 \x01(\x0b\x32\n.Signature\x12\t\n\x01r\x18\x02 \x01(\x05\"/\n\x04\x43ons\x12\r\n\x05round\x18\x01 \x01(\x05\x12\x18\n\x06\x62locks\x18\x02 \x03(\x0b\x32\x08.CpBlock\"\x14\n\x07\x41skCons\x12\t\n\x01r\x18\x01 \x01(\x05\"+\n\rValidationReq\x12\x0b\n\x03seq\x18\x01 \x01(\x05\x12\r\n\x05seq_r\x18\x02 \x01(\x05\"|\n\x0c\x43ompactBlock\x12\"\n\x05inner\x18\x01 \x01(\x0b\x32\x13.CompactBlock.Inner\x12\x0b\n\x03seq\x18\x02 \x01(\x05\x12\x14\n\x0c\x61greed_round\x18\x03 \x01(\x05\x1a%\n\x05Inner\x12\x0e\n\x06\x64igest\x18\x01 \x01(\x0c\x12\x0c\n\x04prev\x18\x02 \x01(\x0c\"K\n\x0eValidationResp\x12\x0b\n\x03seq\x18\x01 \x01(\x05\x12\r\n\x05seq_r\x18\x02 \x01(\x05\x12\x1d\n\x06pieces\x18\x03 \x03(\x0b\x32\r.CompactBlockb\x06proto3')
+  serialized_pb=_b('\n\x0emessages.proto\"\x12\n\x05\x44ummy\x12\t\n\x01m\x18\x01 \x01(\t\"$\n\x08\x44iscover\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x0c\n\x04port\x18\x02 \x01(\x05\"g\n\rDiscoverReply\x12(\n\x05nodes\x18\x01 \x03(\x0b\x32\x19.DiscoverReply.NodesEntry\x1a,\n\nNodesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t:\x02\x38\x01\"@\n\x0bInstruction\x12\x13\n\x0binstruction\x18\x01 \x01(\t\x12\r\n\x05\x64\x65lay\x18\x02 \x01(\x05\x12\r\n\x05param\x18\x03 \x01(\t\" \n\x04Ping\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x0c\n\x04port\x18\x02 \x01(\x05\" \n\x04Pong\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x0c\n\x04port\x18\x02 \x01(\x05\"k\n\x06\x42racha\x12\x18\n\x02ty\x18\x01 \x01(\x0e\x32\x0c.Bracha.Type\x12\x0e\n\x06\x64igest\x18\x02 \x01(\x0c\x12\x10\n\x08\x66ragment\x18\x03 \x01(\x0c\"%\n\x04Type\x12\x08\n\x04INIT\x10\x00\x12\x08\n\x04\x45\x43HO\x10\x01\x12\t\n\x05READY\x10\x02\"N\n\x04Mo14\x12\x16\n\x02ty\x18\x01 \x01(\x0e\x32\n.Mo14.Type\x12\t\n\x01r\x18\x02 \x01(\x05\x12\t\n\x01v\x18\x03 \x01(\x05\"\x18\n\x04Type\x12\x07\n\x03\x45ST\x10\x00\x12\x07\n\x03\x41UX\x10\x01\"`\n\x03\x41\x43S\x12\x10\n\x08instance\x18\x01 \x01(\x0c\x12\r\n\x05round\x18\x02 \x01(\x05\x12\x19\n\x06\x62racha\x18\x03 \x01(\x0b\x32\x07.BrachaH\x00\x12\x15\n\x04mo14\x18\x04 \x01(\x0b\x32\x05.Mo14H\x00\x42\x06\n\x04\x62ody\"\xea\x01\n\x07TxBlock\x12\x1d\n\x05inner\x18\x01 \x01(\x0b\x32\x0e.TxBlock.Inner\x12\x15\n\x01s\x18\x02 \x01(\x0b\x32\n.Signature\x12\x1d\n\x05\x62\x61tch\x18\x03 \x01(\x0b\x32\x0e.TxBlock.Batch\x1aR\n\x05Inner\x12\x0c\n\x04prev\x18\x01 \x01(\x0c\x12\x0b\n\x03seq\x18\x02 \x01(\x05\x12\x14\n\x0c\x63ounterparty\x18\x03 \x01(\x0c\x12\r\n\x05nonce\x18\x04 \x01(\x0c\x12\t\n\x01m\x18\x05 \x01(\t\x1a\x36\n\x05\x42\x61tch\x12\r\n\x05index\x18\x01 \x01(\x05\x12\x0c\n\x04size\x18\x02 \x01(\x05\x12\x10\n\x08siblings\x18\x03 \x03(\x0c\"\x1d\n\x05TxReq\x12\x14\n\x02tx\x18\x01 \x01(\x0b\x32\x08.TxBlock\"\x17\n\tTxReqView\x12\n\n\x02tx\x18\x01 \x01(\x0c\"+\n\x06TxResp\x12\x14\n\x02tx\x18\x01 \x01(\x0b\x32\x08.TxBlock\x12\x0b\n\x03seq\x18\x02 \x01(\x05\"%\n\nTxRespView\x12\n\n\x02tx\x18\x01 \x01(\x0c\x12\x0b\n\x03seq\x18\x02 \x01(\x05\"C\n\nTxReqBatch\x12\x1e\n\x06inners\x18\x01 \x03(\x0b\x32\x0e.TxBlock.Inner\x12\x15\n\x01s\x18\x02 \x01(\x0b\x32\n.Signature\"R\n\x0bTxRespBatch\x12\x0c\n\x04seqs\x18\x01 \x03(\x05\x12\x1e\n\x06inners\x18\x02 \x03(\x0b\x32\x0e.TxBlock.Inner\x12\x15\n\x01s\x18\x03 \x01(\x0b\x32\n.Signature\"\xbd\x01\n\x07\x43pBlock\x12\x1d\n\x05inner\x18\x01 \x01(\x0b\x32\x0e.CpBlock.Inner\x12\x15\n\x01s\x18\x02 \x01(\x0b\x32\n.Signature\x1a|\n\x05Inner\x12\x0c\n\x04prev\x18\x01 \x01(\x0c\x12\x0b\n\x03seq\x18\x02 \x01(\x05\x12\r\n\x05round\x18\x03 \x01(\x05\x12\x11\n\tcons_hash\x18\x04 \x01(\x0c\x12\x16\n\x02ss\x18\x05 \x03(\x0b\x32\n.Signature\x12\t\n\x01p\x18\x06 \x01(\x05\x12\x13\n\x0bmerkle_root\x18\x07 \x01(\x0c\"!\n\x08\x43pBlocks\x12\x15\n\x03\x63ps\x18\x01 \x03(\x0b\x32\x08.CpBlock\"\x1b\n\x0c\x43pBlocksView\x12\x0b\n\x03\x63ps\x18\x01 \x03(\x0c\"=\n\tSignature\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x17\n\x0fsigned_document\x18\x02 \x01(\x0c\x12\x0b\n\x03sig\x18\x03 \x01(\x0c\"0\n\x0cSigWithRound\x12\x15\n\x01s\x18\x01 \x01(\x0b\x32\n.Signature\x12\t\n\x01r\x18\x02 \x01(\x05\"/\n\x04\x43ons\x12\r\n\x05round\x18\x01 \x01(\x05\x12\x18\n\x06\x62locks\x18\x02 \x03(\x0b\x32\x08.CpBlock\")\n\x08\x43onsView\x12\r\n\x05round\x18\x01 \x01(\x05\x12\x0e\n\x06\x62locks\x18\x02 \x03(\x0c\"\x14\n\x07\x41skCons\x12\t\n\x01r\x18\x01 \x01(\x05\"n\n\rValidationReq\x12\x0b\n\x03seq\x18\x01 \x01(\x05\x12\r\n\x05seq_r\x18\x02 \x01(\x05\x12!\n\x04mode\x18\x03 \x01(\x0e\x32\x13.ValidationReq.Mode\"\x1e\n\x04Mode\x12\n\n\x06PIECES\x10\x00\x12\n\n\x06MERKLE\x10\x01\"|\n\x0c\x43ompactBlock\x12\"\n\x05inner\x18\x01 \x01(\x0b\x32\x13.CompactBlock.Inner\x12\x0b\n\x03seq\x18\x02 \x01(\x05\x12\x14\n\x0c\x61greed_round\x18\x03 \x01(\x05\x1a%\n\x05Inner\x12\x0e\n\x06\x64igest\x18\x01 \x01(\x0c\x12\x0c\n\x04prev\x18\x02 \x01(\x0c\"\x85\x01\n\x0bMerkleProof\x12\x14\n\x02\x63p\x18\x01 \x01(\x0b\x32\x08.CpBlock\x12\x14\n\x0c\x61greed_round\x18\x02 \x01(\x05\x12\x1b\n\x04leaf\x18\x03 \x01(\x0b\x32\r.CompactBlock\x12\r\n\x05index\x18\x04 \x01(\x05\x12\x0c\n\x04size\x18\x05 \x01(\x05\x12\x10\n\x08siblings\x18\x06 \x03(\x0c\"h\n\x0eValidationResp\x12\x0b\n\x03seq\x18\x01 \x01(\x05\x12\r\n\x05seq_r\x18\x02 \x01(\x05\x12\x1d\n\x06pieces\x18\x03 \x03(\x0b\x32\r.CompactBlock\x12\x1b\n\x05proof\x18\x04 \x01(\x0b\x32\x0c.MerkleProof\"]\n\x12ValidationRespView\x12\x0b\n\x03seq\x18\x01 \x01(\x05\x12\r\n\x05seq_r\x18\x02 \x01(\x05\x12\x0e\n\x06pieces\x18\x03 \x03(\x0c\x12\x1b\n\x05proof\x18\x04 \x01(\x0b\x32\x0c.MerkleProof\"2\n\x12ValidationReqBatch\x12\x0c\n\x04seqs\x18\x01 \x03(\x05\x12\x0e\n\x06seq_rs\x18\x02 \x03(\x05\"#\n\x11ValidationSegment\x12\x0e\n\x06pieces\x18\x01 \x03(\x0c\"I\n\x13ValidationRespBatch\x12\x0c\n\x04seqs\x18\x01 \x03(\x05\x12$\n\x08segments\x18\x02 \x03(\x0b\x32\x12.ValidationSegmentb\x06proto3')
 )
-_sym_db.RegisterFileDescriptor(DESCRIPTOR)
 
 
 
@@ -73,6 +72,28 @@ _MO14_TYPE = _descriptor.EnumDescriptor(
 )
 _sym_db.RegisterEnumDescriptor(_MO14_TYPE)
 
+_VALIDATIONREQ_MODE = _descriptor.EnumDescriptor(
+  name='Mode',
+  full_name='ValidationReq.Mode',
+  filename=None,
+  file=DESCRIPTOR,
+  values=[
+    _descriptor.EnumValueDescriptor(
+      name='PIECES', index=0, number=0,
+      options=None,
+      type=None),
+    _descriptor.EnumValueDescriptor(
+      name='MERKLE', index=1, number=1,
+      options=None,
+      type=None),
+  ],
+  containing_type=None,
+  options=None,
+  serialized_start=1695,
+  serialized_end=1725,
+)
+_sym_db.RegisterEnumDescriptor(_VALIDATIONREQ_MODE)
+
 
 _DUMMY = _descriptor.Descriptor(
   name='Dummy',
@@ -533,8 +554,52 @@ _TXBLOCK_INNER = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=668,
-  serialized_end=750,
+  serialized_start=699,
+  serialized_end=781,
+)
+
+_TXBLOCK_BATCH = _descriptor.Descriptor(
+  name='Batch',
+  full_name='TxBlock.Batch',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='index', full_name='TxBlock.Batch.index', index=0,
+      number=1, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='size', full_name='TxBlock.Batch.size', index=1,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='siblings', full_name='TxBlock.Batch.siblings', index=2,
+      number=3, type=12, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=783,
+  serialized_end=837,
 )
 
 _TXBLOCK = _descriptor.Descriptor(
@@ -558,10 +623,17 @@ _TXBLOCK = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
+    _descriptor.FieldDescriptor(
+      name='batch', full_name='TxBlock.batch', index=2,
+      number=3, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
   ],
   extensions=[
   ],
-  nested_types=[_TXBLOCK_INNER, ],
+  nested_types=[_TXBLOCK_INNER, _TXBLOCK_BATCH, ],
   enum_types=[
   ],
   options=None,
@@ -571,7 +643,7 @@ _TXBLOCK = _descriptor.Descriptor(
   oneofs=[
   ],
   serialized_start=603,
-  serialized_end=750,
+  serialized_end=837,
 )
 
 
@@ -601,8 +673,39 @@ _TXREQ = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=752,
-  serialized_end=781,
+  serialized_start=839,
+  serialized_end=868,
+)
+
+
+_TXREQVIEW = _descriptor.Descriptor(
+  name='TxReqView',
+  full_name='TxReqView',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='tx', full_name='TxReqView.tx', index=0,
+      number=1, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b(""),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=870,
+  serialized_end=893,
 )
 
 
@@ -639,8 +742,129 @@ _TXRESP = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=783,
-  serialized_end=826,
+  serialized_start=895,
+  serialized_end=938,
+)
+
+
+_TXRESPVIEW = _descriptor.Descriptor(
+  name='TxRespView',
+  full_name='TxRespView',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='tx', full_name='TxRespView.tx', index=0,
+      number=1, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b(""),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='seq', full_name='TxRespView.seq', index=1,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=940,
+  serialized_end=977,
+)
+
+
+_TXREQBATCH = _descriptor.Descriptor(
+  name='TxReqBatch',
+  full_name='TxReqBatch',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='inners', full_name='TxReqBatch.inners', index=0,
+      number=1, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='s', full_name='TxReqBatch.s', index=1,
+      number=2, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=979,
+  serialized_end=1046,
+)
+
+
+_TXRESPBATCH = _descriptor.Descriptor(
+  name='TxRespBatch',
+  full_name='TxRespBatch',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='seqs', full_name='TxRespBatch.seqs', index=0,
+      number=1, type=5, cpp_type=1, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='inners', full_name='TxRespBatch.inners', index=1,
+      number=2, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='s', full_name='TxRespBatch.s', index=2,
+      number=3, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1048,
+  serialized_end=1130,
 )
 
 
@@ -693,6 +917,13 @@ _CPBLOCK_INNER = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
+    _descriptor.FieldDescriptor(
+      name='merkle_root', full_name='CpBlock.Inner.merkle_root', index=6,
+      number=7, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b(""),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
   ],
   extensions=[
   ],
@@ -705,8 +936,8 @@ _CPBLOCK_INNER = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=894,
-  serialized_end=997,
+  serialized_start=1198,
+  serialized_end=1322,
 )
 
 _CPBLOCK = _descriptor.Descriptor(
@@ -742,8 +973,8 @@ _CPBLOCK = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=829,
-  serialized_end=997,
+  serialized_start=1133,
+  serialized_end=1322,
 )
 
 
@@ -773,8 +1004,39 @@ _CPBLOCKS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=999,
-  serialized_end=1032,
+  serialized_start=1324,
+  serialized_end=1357,
+)
+
+
+_CPBLOCKSVIEW = _descriptor.Descriptor(
+  name='CpBlocksView',
+  full_name='CpBlocksView',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='cps', full_name='CpBlocksView.cps', index=0,
+      number=1, type=12, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1359,
+  serialized_end=1386,
 )
 
 
@@ -799,6 +1061,13 @@ _SIGNATURE = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
+    _descriptor.FieldDescriptor(
+      name='sig', full_name='Signature.sig', index=2,
+      number=3, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b(""),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
   ],
   extensions=[
   ],
@@ -811,8 +1080,8 @@ _SIGNATURE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1034,
-  serialized_end=1082,
+  serialized_start=1388,
+  serialized_end=1449,
 )
 
 
@@ -849,8 +1118,8 @@ _SIGWITHROUND = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1084,
-  serialized_end=1132,
+  serialized_start=1451,
+  serialized_end=1499,
 )
 
 
@@ -887,8 +1156,46 @@ _CONS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1134,
-  serialized_end=1181,
+  serialized_start=1501,
+  serialized_end=1548,
+)
+
+
+_CONSVIEW = _descriptor.Descriptor(
+  name='ConsView',
+  full_name='ConsView',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='round', full_name='ConsView.round', index=0,
+      number=1, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='blocks', full_name='ConsView.blocks', index=1,
+      number=2, type=12, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1550,
+  serialized_end=1591,
 )
 
 
@@ -918,8 +1225,8 @@ _ASKCONS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1183,
-  serialized_end=1203,
+  serialized_start=1593,
+  serialized_end=1613,
 )
 
 
@@ -944,11 +1251,19 @@ _VALIDATIONREQ = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
+    _descriptor.FieldDescriptor(
+      name='mode', full_name='ValidationReq.mode', index=2,
+      number=3, type=14, cpp_type=8, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
   ],
   extensions=[
   ],
   nested_types=[],
   enum_types=[
+    _VALIDATIONREQ_MODE,
   ],
   options=None,
   is_extendable=False,
@@ -956,8 +1271,8 @@ _VALIDATIONREQ = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1205,
-  serialized_end=1248,
+  serialized_start=1615,
+  serialized_end=1725,
 )
 
 
@@ -994,8 +1309,8 @@ _COMPACTBLOCK_INNER = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1337,
-  serialized_end=1374,
+  serialized_start=1814,
+  serialized_end=1851,
 )
 
 _COMPACTBLOCK = _descriptor.Descriptor(
@@ -1038,8 +1353,74 @@ _COMPACTBLOCK = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1250,
-  serialized_end=1374,
+  serialized_start=1727,
+  serialized_end=1851,
+)
+
+
+_MERKLEPROOF = _descriptor.Descriptor(
+  name='MerkleProof',
+  full_name='MerkleProof',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='cp', full_name='MerkleProof.cp', index=0,
+      number=1, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='agreed_round', full_name='MerkleProof.agreed_round', index=1,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='leaf', full_name='MerkleProof.leaf', index=2,
+      number=3, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='index', full_name='MerkleProof.index', index=3,
+      number=4, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='size', full_name='MerkleProof.size', index=4,
+      number=5, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='siblings', full_name='MerkleProof.siblings', index=5,
+      number=6, type=12, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1854,
+  serialized_end=1987,
 )
 
 
@@ -1071,6 +1452,13 @@ _VALIDATIONRESP = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
+    _descriptor.FieldDescriptor(
+      name='proof', full_name='ValidationResp.proof', index=3,
+      number=4, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
   ],
   extensions=[
   ],
@@ -1083,8 +1471,167 @@ _VALIDATIONRESP = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1376,
-  serialized_end=1451,
+  serialized_start=1989,
+  serialized_end=2093,
+)
+
+
+_VALIDATIONRESPVIEW = _descriptor.Descriptor(
+  name='ValidationRespView',
+  full_name='ValidationRespView',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='seq', full_name='ValidationRespView.seq', index=0,
+      number=1, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='seq_r', full_name='ValidationRespView.seq_r', index=1,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='pieces', full_name='ValidationRespView.pieces', index=2,
+      number=3, type=12, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='proof', full_name='ValidationRespView.proof', index=3,
+      number=4, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=2095,
+  serialized_end=2188,
+)
+
+
+_VALIDATIONREQBATCH = _descriptor.Descriptor(
+  name='ValidationReqBatch',
+  full_name='ValidationReqBatch',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='seqs', full_name='ValidationReqBatch.seqs', index=0,
+      number=1, type=5, cpp_type=1, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='seq_rs', full_name='ValidationReqBatch.seq_rs', index=1,
+      number=2, type=5, cpp_type=1, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=2190,
+  serialized_end=2240,
+)
+
+
+_VALIDATIONSEGMENT = _descriptor.Descriptor(
+  name='ValidationSegment',
+  full_name='ValidationSegment',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='pieces', full_name='ValidationSegment.pieces', index=0,
+      number=1, type=12, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=2242,
+  serialized_end=2277,
+)
+
+
+_VALIDATIONRESPBATCH = _descriptor.Descriptor(
+  name='ValidationRespBatch',
+  full_name='ValidationRespBatch',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='seqs', full_name='ValidationRespBatch.seqs', index=0,
+      number=1, type=5, cpp_type=1, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='segments', full_name='ValidationRespBatch.segments', index=1,
+      number=2, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=2279,
+  serialized_end=2352,
 )
 
 _DISCOVERREPLY_NODESENTRY.containing_type = _DISCOVERREPLY
@@ -1102,10 +1649,16 @@ _ACS.oneofs_by_name['body'].fields.append(
   _ACS.fields_by_name['mo14'])
 _ACS.fields_by_name['mo14'].containing_oneof = _ACS.oneofs_by_name['body']
 _TXBLOCK_INNER.containing_type = _TXBLOCK
+_TXBLOCK_BATCH.containing_type = _TXBLOCK
 _TXBLOCK.fields_by_name['inner'].message_type = _TXBLOCK_INNER
 _TXBLOCK.fields_by_name['s'].message_type = _SIGNATURE
+_TXBLOCK.fields_by_name['batch'].message_type = _TXBLOCK_BATCH
 _TXREQ.fields_by_name['tx'].message_type = _TXBLOCK
 _TXRESP.fields_by_name['tx'].message_type = _TXBLOCK
+_TXREQBATCH.fields_by_name['inners'].message_type = _TXBLOCK_INNER
+_TXREQBATCH.fields_by_name['s'].message_type = _SIGNATURE
+_TXRESPBATCH.fields_by_name['inners'].message_type = _TXBLOCK_INNER
+_TXRESPBATCH.fields_by_name['s'].message_type = _SIGNATURE
 _CPBLOCK_INNER.fields_by_name['ss'].message_type = _SIGNATURE
 _CPBLOCK_INNER.containing_type = _CPBLOCK
 _CPBLOCK.fields_by_name['inner'].message_type = _CPBLOCK_INNER
@@ -1113,9 +1666,16 @@ _CPBLOCK.fields_by_name['s'].message_type = _SIGNATURE
 _CPBLOCKS.fields_by_name['cps'].message_type = _CPBLOCK
 _SIGWITHROUND.fields_by_name['s'].message_type = _SIGNATURE
 _CONS.fields_by_name['blocks'].message_type = _CPBLOCK
+_VALIDATIONREQ.fields_by_name['mode'].enum_type = _VALIDATIONREQ_MODE
+_VALIDATIONREQ_MODE.containing_type = _VALIDATIONREQ
 _COMPACTBLOCK_INNER.containing_type = _COMPACTBLOCK
 _COMPACTBLOCK.fields_by_name['inner'].message_type = _COMPACTBLOCK_INNER
+_MERKLEPROOF.fields_by_name['cp'].message_type = _CPBLOCK
+_MERKLEPROOF.fields_by_name['leaf'].message_type = _COMPACTBLOCK
 _VALIDATIONRESP.fields_by_name['pieces'].message_type = _COMPACTBLOCK
+_VALIDATIONRESP.fields_by_name['proof'].message_type = _MERKLEPROOF
+_VALIDATIONRESPVIEW.fields_by_name['proof'].message_type = _MERKLEPROOF
+_VALIDATIONRESPBATCH.fields_by_name['segments'].message_type = _VALIDATIONSEGMENT
 DESCRIPTOR.message_types_by_name['Dummy'] = _DUMMY
 DESCRIPTOR.message_types_by_name['Discover'] = _DISCOVER
 DESCRIPTOR.message_types_by_name['DiscoverReply'] = _DISCOVERREPLY
@@ -1127,16 +1687,28 @@ DESCRIPTOR.message_types_by_name['Mo14'] = _MO14
 DESCRIPTOR.message_types_by_name['ACS'] = _ACS
 DESCRIPTOR.message_types_by_name['TxBlock'] = _TXBLOCK
 DESCRIPTOR.message_types_by_name['TxReq'] = _TXREQ
+DESCRIPTOR.message_types_by_name['TxReqView'] = _TXREQVIEW
 DESCRIPTOR.message_types_by_name['TxResp'] = _TXRESP
+DESCRIPTOR.message_types_by_name['TxRespView'] = _TXRESPVIEW
+DESCRIPTOR.message_types_by_name['TxReqBatch'] = _TXREQBATCH
+DESCRIPTOR.message_types_by_name['TxRespBatch'] = _TXRESPBATCH
 DESCRIPTOR.message_types_by_name['CpBlock'] = _CPBLOCK
 DESCRIPTOR.message_types_by_name['CpBlocks'] = _CPBLOCKS
+DESCRIPTOR.message_types_by_name['CpBlocksView'] = _CPBLOCKSVIEW
 DESCRIPTOR.message_types_by_name['Signature'] = _SIGNATURE
 DESCRIPTOR.message_types_by_name['SigWithRound'] = _SIGWITHROUND
 DESCRIPTOR.message_types_by_name['Cons'] = _CONS
+DESCRIPTOR.message_types_by_name['ConsView'] = _CONSVIEW
 DESCRIPTOR.message_types_by_name['AskCons'] = _ASKCONS
 DESCRIPTOR.message_types_by_name['ValidationReq'] = _VALIDATIONREQ
 DESCRIPTOR.message_types_by_name['CompactBlock'] = _COMPACTBLOCK
+DESCRIPTOR.message_types_by_name['MerkleProof'] = _MERKLEPROOF
 DESCRIPTOR.message_types_by_name['ValidationResp'] = _VALIDATIONRESP
+DESCRIPTOR.message_types_by_name['ValidationRespView'] = _VALIDATIONRESPVIEW
+DESCRIPTOR.message_types_by_name['ValidationReqBatch'] = _VALIDATIONREQBATCH
+DESCRIPTOR.message_types_by_name['ValidationSegment'] = _VALIDATIONSEGMENT
+DESCRIPTOR.message_types_by_name['ValidationRespBatch'] = _VALIDATIONRESPBATCH
+_sym_db.RegisterFileDescriptor(DESCRIPTOR)
 
 Dummy = _reflection.GeneratedProtocolMessageType('Dummy', (_message.Message,), dict(
   DESCRIPTOR = _DUMMY,
@@ -1217,12 +1789,20 @@ TxBlock = _reflection.GeneratedProtocolMessageType('TxBlock', (_message.Message,
     # @@protoc_insertion_point(class_scope:TxBlock.Inner)
     ))
   ,
+
+  Batch = _reflection.GeneratedProtocolMessageType('Batch', (_message.Message,), dict(
+    DESCRIPTOR = _TXBLOCK_BATCH,
+    __module__ = 'messages_pb2'
+    # @@protoc_insertion_point(class_scope:TxBlock.Batch)
+    ))
+  ,
   DESCRIPTOR = _TXBLOCK,
   __module__ = 'messages_pb2'
   # @@protoc_insertion_point(class_scope:TxBlock)
   ))
 _sym_db.RegisterMessage(TxBlock)
 _sym_db.RegisterMessage(TxBlock.Inner)
+_sym_db.RegisterMessage(TxBlock.Batch)
 
 TxReq = _reflection.GeneratedProtocolMessageType('TxReq', (_message.Message,), dict(
   DESCRIPTOR = _TXREQ,
@@ -1231,6 +1811,13 @@ TxReq = _reflection.GeneratedProtocolMessageType('TxReq', (_message.Message,), d
   ))
 _sym_db.RegisterMessage(TxReq)
 
+TxReqView = _reflection.GeneratedProtocolMessageType('TxReqView', (_message.Message,), dict(
+  DESCRIPTOR = _TXREQVIEW,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:TxReqView)
+  ))
+_sym_db.RegisterMessage(TxReqView)
+
 TxResp = _reflection.GeneratedProtocolMessageType('TxResp', (_message.Message,), dict(
   DESCRIPTOR = _TXRESP,
   __module__ = 'messages_pb2'
@@ -1238,6 +1825,27 @@ TxResp = _reflection.GeneratedProtocolMessageType('TxResp', (_message.Message,),
   ))
 _sym_db.RegisterMessage(TxResp)
 
+TxRespView = _reflection.GeneratedProtocolMessageType('TxRespView', (_message.Message,), dict(
+  DESCRIPTOR = _TXRESPVIEW,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:TxRespView)
+  ))
+_sym_db.RegisterMessage(TxRespView)
+
+TxReqBatch = _reflection.GeneratedProtocolMessageType('TxReqBatch', (_message.Message,), dict(
+  DESCRIPTOR = _TXREQBATCH,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:TxReqBatch)
+  ))
+_sym_db.RegisterMessage(TxReqBatch)
+
+TxRespBatch = _reflection.GeneratedProtocolMessageType('TxRespBatch', (_message.Message,), dict(
+  DESCRIPTOR = _TXRESPBATCH,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:TxRespBatch)
+  ))
+_sym_db.RegisterMessage(TxRespBatch)
+
 CpBlock = _reflection.GeneratedProtocolMessageType('CpBlock', (_message.Message,), dict(
 
   Inner = _reflection.GeneratedProtocolMessageType('Inner', (_message.Message,), dict(
@@ -1260,6 +1868,13 @@ CpBlocks = _reflection.GeneratedProtocolMessageType('CpBlocks', (_message.Messag
   ))
 _sym_db.RegisterMessage(CpBlocks)
 
+CpBlocksView = _reflection.GeneratedProtocolMessageType('CpBlocksView', (_message.Message,), dict(
+  DESCRIPTOR = _CPBLOCKSVIEW,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:CpBlocksView)
+  ))
+_sym_db.RegisterMessage(CpBlocksView)
+
 Signature = _reflection.GeneratedProtocolMessageType('Signature', (_message.Message,), dict(
   DESCRIPTOR = _SIGNATURE,
   __module__ = 'messages_pb2'
@@ -1281,6 +1896,13 @@ Cons = _reflection.GeneratedProtocolMessageType('Cons', (_message.Message,), dic
   ))
 _sym_db.RegisterMessage(Cons)
 
+ConsView = _reflection.GeneratedProtocolMessageType('ConsView', (_message.Message,), dict(
+  DESCRIPTOR = _CONSVIEW,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:ConsView)
+  ))
+_sym_db.RegisterMessage(ConsView)
+
 AskCons = _reflection.GeneratedProtocolMessageType('AskCons', (_message.Message,), dict(
   DESCRIPTOR = _ASKCONS,
   __module__ = 'messages_pb2'
@@ -1310,6 +1932,13 @@ CompactBlock = _reflection.GeneratedProtocolMessageType('CompactBlock', (_messag
 _sym_db.RegisterMessage(CompactBlock)
 _sym_db.RegisterMessage(CompactBlock.Inner)
 
+MerkleProof = _reflection.GeneratedProtocolMessageType('MerkleProof', (_message.Message,), dict(
+  DESCRIPTOR = _MERKLEPROOF,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:MerkleProof)
+  ))
+_sym_db.RegisterMessage(MerkleProof)
+
 ValidationResp = _reflection.GeneratedProtocolMessageType('ValidationResp', (_message.Message,), dict(
   DESCRIPTOR = _VALIDATIONRESP,
   __module__ = 'messages_pb2'
@@ -1317,6 +1946,34 @@ ValidationResp = _reflection.GeneratedProtocolMessageType('ValidationResp', (_me
   ))
 _sym_db.RegisterMessage(ValidationResp)
 
+ValidationRespView = _reflection.GeneratedProtocolMessageType('ValidationRespView', (_message.Message,), dict(
+  DESCRIPTOR = _VALIDATIONRESPVIEW,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:ValidationRespView)
+  ))
+_sym_db.RegisterMessage(ValidationRespView)
+
+ValidationReqBatch = _reflection.GeneratedProtocolMessageType('ValidationReqBatch', (_message.Message,), dict(
+  DESCRIPTOR = _VALIDATIONREQBATCH,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:ValidationReqBatch)
+  ))
+_sym_db.RegisterMessage(ValidationReqBatch)
+
+ValidationSegment = _reflection.GeneratedProtocolMessageType('ValidationSegment', (_message.Message,), dict(
+  DESCRIPTOR = _VALIDATIONSEGMENT,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:ValidationSegment)
+  ))
+_sym_db.RegisterMessage(ValidationSegment)
+
+ValidationRespBatch = _reflection.GeneratedProtocolMessageType('ValidationRespBatch', (_message.Message,), dict(
+  DESCRIPTOR = _VALIDATIONRESPBATCH,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:ValidationRespBatch)
+  ))
+_sym_db.RegisterMessage(ValidationRespBatch)
+
 
 _DISCOVERREPLY_NODESENTRY.has_options = True
 _DISCOVERREPLY_NODESENTRY._options = _descriptor._ParseOptions(descriptor_pb2.MessageOptions(), _b('8\001'))
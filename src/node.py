@@ -1,4 +1,3 @@
-import Queue
 import argparse
 import logging
 import random
@@ -10,16 +9,20 @@ from base64 import b64encode, b64decode
 from twisted.internet import reactor, task, error
 from twisted.internet.endpoints import TCP4ClientEndpoint, connectProtocol
 from twisted.internet.protocol import Factory
-from typing import Dict, Tuple
+from typing import List
 
 import src.messages.messages_pb2 as pb
-from src.protobufreceiver import ProtobufReceiver
+from src.protobufreceiver import ProtobufReceiver, encode_frame, message_type, FRAME_OVERHEAD
+from src.router import Router
+from src.peers import PeerTable
+from src.outbound import OutboundQueue, merge_stats, BULK, DEFER, DROP
 from src.consensus.acs import ACS
 from src.consensus.bracha import Bracha
 from src.consensus.mo14 import Mo14
 from src.trustchain.trustchain_runner import TrustChainRunner
-from src.utils import Replay, Handled, set_logging, my_err_back, call_later, stop_reactor
-from src.discovery import Discovery, got_discovery
+from src.trustchain.workload import parse_workload
+from src.utils import Replay, ReplayBuffer, Handled, set_logging, my_err_back, call_later, stop_reactor
+from src.discovery import Discovery, got_discovery, make_client_router
 
 
 class MyProto(ProtobufReceiver):
@@ -34,6 +37,13 @@ class MyProto(ProtobufReceiver):
         self.peers = factory.peers
         self.remote_vk = None
         self.state = 'SERVER'
+        self.outbound = None  # type: OutboundQueue
+
+    def connectionMade(self):
+        self.outbound = OutboundQueue(self.transport,
+                                      caps=(None, None, self.config.outbound_bulk_cap),
+                                      policies=(DEFER, DEFER, self.config.outbound_bulk_policy))
+        self.transport.registerProducer(self.outbound, True)
 
     def connection_lost(self, reason):
         """
@@ -52,106 +62,46 @@ class MyProto(ProtobufReceiver):
             logging.debug("NODE: deleting peer {}, reason {}".format(peer, reason))
 
         try:
-            del self.peers[self.remote_vk]
+            self.peers.remove(self.remote_vk)
         except KeyError:
             logging.warning("NODE: peer {} already deleted".format(b64encode(self.remote_vk)))
 
         stop_reactor()
 
-    def obj_received(self, obj):
+    def frame_received(self, tag, data):
         """
-        first we handle the items in the queue
-        then we handle the received message
-        :param obj:
+        Ping and Pong set up the connection so they are handled here, everything else goes through the router
+        :param tag:
+        :param data:
         :return:
         """
+        name = message_type(tag)[0]
+        if name in ('Ping', 'Pong'):
+            self.factory.recv_message_log[name] += len(data)
+            ProtobufReceiver.frame_received(self, tag, data)
+        else:
+            self.factory.router.route(tag, data, self.remote_vk)
 
-        # TODO do something like handler registry
-
+    def obj_received(self, obj):
         if isinstance(obj, pb.Ping):
             self.handle_ping(obj)
 
         elif isinstance(obj, pb.Pong):
             self.handle_pong(obj)
 
-        elif isinstance(obj, pb.ACS):
-            if self.factory.config.failure != 'omission':
-                res = self.factory.acs.handle(obj, self.remote_vk)
-                self.process_acs_res(res, obj)
-
-        elif isinstance(obj, pb.TxReq):
-            self.factory.tc_runner.handle_tx_req(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.TxResp):
-            self.factory.tc_runner.handle_tx_resp(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.ValidationReq):
-            self.factory.tc_runner.handle_validation_req(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.ValidationResp):
-            self.factory.tc_runner.handle_validation_resp(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.SigWithRound):
-            self.factory.tc_runner.handle_sig(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.CpBlock):
-            self.factory.tc_runner.handle_cp(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.Cons):
-            self.factory.tc_runner.handle_cons(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.AskCons):
-            self.factory.tc_runner.handle_ask_cons(obj, self.remote_vk)
-
-        # NOTE messages below are for testing, bracha/mo14 is normally handled by acs
-
-        elif isinstance(obj, pb.Bracha):
-            if self.factory.config.failure != 'omission':
-                self.factory.bracha.handle(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.Mo14):
-            if self.factory.config.failure != 'omission':
-                self.factory.mo14.handle(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.Dummy):
-            logging.info("NODE: got dummy message from {}".format(b64encode(self.remote_vk)))
-
         else:
             raise AssertionError("invalid message type {}".format(obj))
 
-        self.factory.recv_message_log[obj.__class__.__name__] += obj.ByteSize()
-
-    def send_obj(self, obj):
-        """
-        Wrapper around ProtobufReceiver.send_obj for logging
-        :param obj:
-        :return:
-        """
-        ProtobufReceiver.send_obj(self, obj)
-        self.factory.sent_message_log[obj.__class__.__name__] += obj.ByteSize()
-
-    def process_acs_res(self, o, m):
+    def send_frame(self, name, frame):
         """
-        This function checks whether the result is Replay or Handled.
-        If it's the former, the message is placed into factory.q and then we replay it (factory.process_queue).
-        :param o: the object we're processing
-        :param m: the original message
+        Queue the frame by priority instead of writing it directly, see OutboundQueue.
+        The size in the log excludes the framing like ByteSize.
+        :param name:
+        :param frame:
         :return:
         """
-        assert o is not None
-
-        if isinstance(o, Replay):
-            logging.debug("NODE: putting {} into msg queue".format(m))
-            self.factory.q.put((self.remote_vk, m))
-        elif isinstance(o, Handled):
-            if self.factory.config.test == 'acs':
-                logging.debug("NODE: testing ACS, not handling the result")
-                return
-            if o.m is not None:
-                logging.debug("NODE: attempting to handle ACS result")
-                self.factory.tc_runner.handle_cons_from_acs(o.m)
-        else:
-            raise AssertionError("instance is not Replay or Handled")
+        if self.outbound.push(name, frame):
+            self.factory.sent_message_log[name] += len(frame) - FRAME_OVERHEAD
 
     def send_ping(self):
         self.send_obj(pb.Ping(vk=self.vk, port=self.config.port))
@@ -162,9 +112,9 @@ class MyProto(ProtobufReceiver):
         # type: (pb.Ping) -> None
         logging.debug("NODE: got ping, {}".format(msg))
         assert (self.state == 'SERVER')
-        if msg.vk in self.peers.keys():
-            logging.debug("NODE: ping found myself in peers.keys")
-        self.peers[msg.vk] = (self.transport.getPeer().host, msg.port, self)
+        if msg.vk in self.peers:
+            logging.debug("NODE: ping found myself in peers")
+        self.peers.add(msg.vk, self.transport.getPeer().host, msg.port, self)
         self.remote_vk = msg.vk
         self.send_obj(pb.Pong(vk=self.vk, port=self.config.port))
         logging.debug("sent pong")
@@ -173,10 +123,10 @@ class MyProto(ProtobufReceiver):
         # type: (pb.Pong) -> None
         logging.debug("NODE: got pong, {}".format(msg))
         assert (self.state == 'CLIENT')
-        if msg.vk in self.peers.keys():
-            logging.debug("NODE: pong: found myself in peers.keys")
+        if msg.vk in self.peers:
+            logging.debug("NODE: pong: found myself in peers")
             # self.transport.loseConnection()
-        self.peers[msg.vk] = (self.transport.getPeer().host, msg.port, self)
+        self.peers.add(msg.vk, self.transport.getPeer().host, msg.port, self)
         self.remote_vk = msg.vk
         logging.debug("NODE: done pong")
 
@@ -187,53 +137,95 @@ class MyFactory(Factory):
     """
     def __init__(self, config):
         # type: (Config) -> None
-        self.peers = {}  # type: Dict[str, Tuple[str, int, MyProto]]
-        self.promoters = []
         self.config = config
         self.bracha = Bracha(self)  # just for testing
         self.mo14 = Mo14(self)  # just for testing
         self.acs = ACS(self)
         self.tc_runner = TrustChainRunner(self)
         self.vk = self.tc_runner.tc.vk
-        self.q = Queue.Queue()  # (str, msg)
+        self.peers = PeerTable(self.vk)
         self.first_disconnect_logged = False
 
-        self._neighbour = None
-        self._sorted_peer_keys = None
-
-        # start looping call on the queue
-        self.lc = task.LoopingCall(self.process_queue)
-        self.lc.start(1).addErrback(my_err_back)
+        self.router = Router()
+        # consensus messages that arrived too early
+        self.replay = ReplayBuffer(self.router.dispatch, config.replay_buffer_size)
+        self.tc_runner.register_handlers(self.router)
+        self.acs.register_handlers(self.router)
+        self.bracha.register_handlers(self.router)  # just for testing
+        self.mo14.register_handlers(self.router)  # just for testing
+        self.router.register('Dummy', lambda obj, remote_vk:
+                             logging.info("NODE: got dummy message from {}".format(b64encode(remote_vk))))
+        if self.config.failure == 'omission':
+            for name in ('ACS', 'Bracha', 'Mo14'):
+                self.router.drop(name)
 
         # logging message size
-        self.recv_message_log = defaultdict(long)
+        self.recv_message_log = self.router.bytes
         self.sent_message_log = defaultdict(long)
 
         # TODO output this at the end of every round
         task.LoopingCall(self.log_communication_costs).start(5, False).addErrback(my_err_back)
+        task.LoopingCall(self.log_handler_stats).start(5, False).addErrback(my_err_back)
+
+    def log_handler_stats(self):
+        self.router.log_stats()
+        logging.info("NODE: replay buffer {}".format(self.replay.stats))
+        logging.info("NODE: outbound queues {}"
+                     .format(merge_stats([p.outbound for p in self.peers.protos if p.outbound is not None])))
+
+    def is_congested(self, node):
+        # type: (str) -> bool
+        """
+        :param node:
+        :return: True if the bulk traffic (TXs and validation) to `node` reached its cap
+        """
+        return self.peers.proto(node).outbound.congested(BULK)
 
     def log_communication_costs(self, heading="NODE:"):
         logging.info('{} messages info {{ "sent": {}, "recv": {} }}'
                      .format(heading, json.dumps(self.sent_message_log), json.dumps(self.recv_message_log)))
 
-    def process_queue(self):
-        # we use counter to stop this routine from running forever,
-        # because self.json_received can put item back into the queue
-        logging.debug("NODE: processing queue, size {}".format(self.q.qsize()))
-        qsize = self.q.qsize()
-        ctr = 0
-        while ctr < qsize:
-            ctr += 1
-            node, m = self.q.get()
-            self.peers[node][2].obj_received(m)
+    def process_acs_res(self, o, m, remote_vk):
+        """
+        This function checks whether the result is Replay or Handled.
+        If it's the former, the message is placed into the replay buffer until the event that it waits for.
+        :param o: the object we're processing
+        :param m: the original message
+        :param remote_vk: the sender of the message
+        :return:
+        """
+        assert o is not None
+
+        if isinstance(o, Replay):
+            logging.debug("NODE: putting {} into replay buffer, key {}".format(m, o.key))
+            self.replay.put(o.key, remote_vk, m)
+        elif isinstance(o, Handled):
+            if self.config.test == 'acs':
+                logging.debug("NODE: testing ACS, not handling the result")
+                return
+            if o.m is not None:
+                logging.debug("NODE: attempting to handle ACS result")
+                self.tc_runner.handle_cons_from_acs(o.m)
+        else:
+            raise AssertionError("instance is not Replay or Handled")
 
     def buildProtocol(self, addr):
         return MyProto(self)
 
+    @property
+    def promoters(self):
+        # type: () -> List[str]
+        return self.peers.promoters
+
+    @promoters.setter
+    def promoters(self, promoters):
+        # type: (List[str]) -> None
+        self.peers.set_promoters(promoters)
+
     def new_connection_if_not_exist(self, nodes):
         for _vk, addr in nodes.iteritems():
             vk = b64decode(_vk)
-            if vk not in self.peers.keys() and vk != self.vk:
+            if vk not in self.peers and vk != self.vk:
                 host, port = addr.split(":")
                 self.make_new_connection(host, int(port))
             else:
@@ -252,21 +244,16 @@ class MyFactory(Factory):
         :param msg:
         :return:
         """
-        for k, v in self.peers.iteritems():
-            proto = v[2]
-            proto.send_obj(msg)
+        self.multicast(self.peers.vks, msg)
 
     def promoter_cast(self, msg):
-        for promoter in self.promoters:
-            self.send(promoter, msg)
+        self.multicast(self.promoters, msg)
 
     def promoter_cast_t(self, msg):
-        for promoter in random.sample(self.promoters, self.config.t + 1):
-            self.send(promoter, msg)
+        self.multicast(random.sample(self.promoters, self.config.t + 1), msg)
 
     def non_promoter_cast(self, msg):
-        for node in set(self.peers.keys()) - set(self.promoters):
-            self.send(node, msg)
+        self.multicast(self.peers.non_promoters, msg)
 
     def gossip(self, msg):
         """
@@ -275,24 +262,24 @@ class MyFactory(Factory):
         :param msg: 
         :return: 
         """
-        fan_out = min(self.config.fan_out, len(self.peers.keys()))
-        for node in random.sample(self.peers.keys(), fan_out):
-            self.send(node, msg)
+        self.multicast(self.peers.sample(self.config.fan_out), msg)
 
     def gossip_except(self, exception, msg):
-        new_set = set(self.peers.keys()) - set(exception)
-        fan_out = min(self.config.fan_out, len(new_set))
-        nodes = random.sample(new_set, fan_out)
-        for node in nodes:
-            self.send(node, msg)
+        self.multicast(self.peers.sample(self.config.fan_out, exclude=exception), msg)
 
     def multicast(self, nodes, msg):
+        """
+        The message is serialized once and the same frame is written to every node
+        :param nodes:
+        :param msg:
+        :return:
+        """
+        name, frame = encode_frame(msg)
         for node in nodes:
-            self.send(node, msg)
+            self.peers.proto(node).send_frame(name, frame)
 
     def send(self, node, msg):
-        proto = self.peers[node][2]
-        proto.send_obj(msg)
+        self.peers.proto(node).send_obj(msg)
 
     def overwrite_promoters(self):
         """
@@ -300,14 +287,11 @@ class MyFactory(Factory):
         :return:
         """
         logging.debug("NODE: overwriting promoters {}".format(len(self.peers)))
-        self.promoters = self.peers.keys()
+        self.promoters = list(self.peers.vks)
 
     @property
     def random_node(self):
-        node = random.choice(self.peers.keys())
-        while node == self.vk:
-            node = random.choice(self.peers.keys())
-        return node
+        return self.peers.random_other()
 
     @property
     def neighbour(self):
@@ -315,16 +299,11 @@ class MyFactory(Factory):
         Expect all peers to be connected, return the verification key of the node that's after me, or loop back
         :return: 
         """
-        if self._neighbour is None:
-            my_idx = self.sorted_peer_keys.index(self.vk)
-            self._neighbour = self.sorted_peer_keys[(my_idx + 1) % len(self.sorted_peer_keys)]
-        return self._neighbour
+        return self.peers.neighbour
 
     @property
     def sorted_peer_keys(self):
-        if self._sorted_peer_keys is None:
-            self._sorted_peer_keys = sorted(self.peers.keys())
-        return self._sorted_peer_keys
+        return self.peers.sorted_vks
 
     def handle_instruction(self, msg):
         """
@@ -342,26 +321,25 @@ class MyFactory(Factory):
             pass
 
         elif msg.instruction == 'tx':
-            rate = float(msg.param)
-            interval = 1.0 / rate
-            call_later(msg.delay, self.tc_runner.make_tx, interval, False)
+            call_later(msg.delay, self.tc_runner.make_tx, float(msg.param), 'neighbour')
 
         elif msg.instruction == 'tx-validate':
-            rate = float(msg.param)
-            interval = 1.0 / rate
-            call_later(msg.delay, self.tc_runner.make_tx, interval, False)
-            call_later(msg.delay + 10, self.tc_runner.make_validation, interval)
+            call_later(msg.delay, self.tc_runner.make_tx, float(msg.param), 'neighbour')
+            call_later(msg.delay + 10, self.tc_runner.make_validation)
 
         elif msg.instruction == 'tx-random':
-            rate = float(msg.param)
-            interval = 1.0 / rate
-            call_later(msg.delay, self.tc_runner.make_tx, interval, True)
+            call_later(msg.delay, self.tc_runner.make_tx, float(msg.param), 'uniform')
 
         elif msg.instruction == 'tx-random-validate':
-            rate = float(msg.param)
-            interval = 1.0 / rate
-            call_later(msg.delay, self.tc_runner.make_tx, interval, True)
-            call_later(msg.delay + 10, self.tc_runner.make_validation, interval)
+            call_later(msg.delay, self.tc_runner.make_tx, float(msg.param), 'uniform')
+            call_later(msg.delay + 10, self.tc_runner.make_validation)
+
+        elif msg.instruction in ('workload', 'workload-validate'):
+            # e.g. "rate=0:100,30:500 dist=zipf s=1.2", see parse_workload
+            profile, dist, zipf_s = parse_workload(msg.param)
+            call_later(msg.delay, self.tc_runner.make_tx, profile, dist, zipf_s)
+            if msg.instruction == 'workload-validate':
+                call_later(msg.delay + 10, self.tc_runner.make_validation)
 
         else:
             raise AssertionError("Invalid instruction msg {}".format(msg))
@@ -378,7 +356,10 @@ class Config(object):
     Should be singleton
     """
     def __init__(self, port, n, t, population, test, value, failure, tx_rate, fan_out, validate,
-                 ignore_promoter, auto_byzantine):
+                 ignore_promoter, auto_byzantine, validation_mode='pieces', cons_retention=None,
+                 tx_batch_window=0.0, validation_batch=1, validation_window=4, validation_window_total=64,
+                 validation_timeout=10.0, replay_buffer_size=100000, outbound_bulk_cap=4 * 1024 * 1024,
+                 outbound_bulk_policy=DEFER, store_dir=None, tx_window=1000):
         """
         This only stores the config necessary at runtime, so not necessarily all the information from argparse
         :param port:
@@ -390,6 +371,25 @@ class Config(object):
         :param failure:
         :param tx_rate:
         :param auto_byzantine:
+        :param validation_mode: 'pieces' or 'merkle', the kind of validation response that we ask for,
+        'merkle' is a weaker trust model, see TrustChain.verify_tx_proof,
+        and only the nodes in this mode put Merkle roots in their CPs
+        :param cons_retention: number of recent consensus results to keep, None to keep all of them
+        :param tx_batch_window: transactions with the same counterparty made within this many seconds
+        are signed and sent as one batch, 0 to disable
+        :param validation_batch: maximum number of TXs with the same counterparty in one validation request
+        :param validation_window: maximum number of outstanding validation requests per counterparty
+        :param validation_window_total: maximum number of outstanding validation requests
+        :param validation_timeout: seconds before an unanswered validation request is retried
+        :param replay_buffer_size: maximum number of consensus messages that wait to be replayed
+        :param outbound_bulk_cap: maximum number of queued bytes of TXs and validation messages per peer,
+        no TX or validation requests are made to a peer above the cap
+        :param outbound_bulk_policy: 'drop' or 'defer' the validation responses beyond the cap,
+        the other TX and validation messages are never dropped, see OutboundQueue
+        :param store_dir: keep my chain, its key pair and its validation state on disk in this directory
+        and continue from it on restart, None to keep everything in memory
+        :param tx_window: maximum number of TXs per counterparty that wait for their other half,
+        it bounds the TX responses that the counterparty queues for us
         """
         self.port = port
         self.n = n
@@ -417,6 +417,41 @@ class Config(object):
 
         self.auto_byzantine = auto_byzantine
 
+        assert validation_mode in ('pieces', 'merkle')
+        self.validation_mode = validation_mode
+
+        assert cons_retention is None or cons_retention > 0
+        self.cons_retention = cons_retention
+
+        assert tx_batch_window >= 0
+        self.tx_batch_window = tx_batch_window
+
+        assert validation_batch >= 1
+        self.validation_batch = validation_batch
+
+        assert validation_window >= 1
+        self.validation_window = validation_window
+
+        assert validation_window_total >= 1
+        self.validation_window_total = validation_window_total
+
+        assert validation_timeout > 0
+        self.validation_timeout = validation_timeout
+
+        assert replay_buffer_size > 0
+        self.replay_buffer_size = replay_buffer_size
+
+        assert outbound_bulk_cap > 0
+        self.outbound_bulk_cap = outbound_bulk_cap
+
+        assert outbound_bulk_policy in (DROP, DEFER)
+        self.outbound_bulk_policy = outbound_bulk_policy
+
+        self.store_dir = store_dir
+
+        assert tx_window >= 1
+        self.tx_window = tx_window
+
 
 def run(config, bcast, discovery_addr):
     f = MyFactory(config)
@@ -430,7 +465,7 @@ def run(config, bcast, discovery_addr):
 
     # connect to discovery server
     point = TCP4ClientEndpoint(reactor, discovery_addr, 8123, timeout=90)
-    d = connectProtocol(point, Discovery({}, f))
+    d = connectProtocol(point, Discovery({}, f, make_client_router(f)))
     d.addCallback(got_discovery, b64encode(f.vk), config.port).addErrback(my_err_back)
 
     # connect to myself
@@ -453,7 +488,7 @@ def run(config, bcast, discovery_addr):
         # use port number (unique on local network) as test message
         call_later(6, f.acs.start, str(config.port), 1)
     elif config.test == 'tc':
-        call_later(5, f.tc_runner.make_tx, 1.0 / config.tx_rate, True)
+        call_later(5, f.tc_runner.make_tx, config.tx_rate, 'uniform')
         # optionally use validate
         if config.validate:
             call_later(10, f.tc_runner.make_validation)
@@ -570,13 +605,97 @@ if __name__ == '__main__':
         help="[testing] if test=='tc', perform validation",
         action='store_true'
     )
+    parser.add_argument(
+        '--validation-mode',
+        choices=['pieces', 'merkle'],
+        default='pieces',
+        help="[testing] ask for the full piece range or a Merkle proof when validating, "
+             "Merkle proofs trust that the counterparty's Merkle roots match its chain"
+    )
+    parser.add_argument(
+        '--cons-retention',
+        type=int,
+        metavar='ROUNDS',
+        help='drop consensus results older than ROUNDS rounds, keep all of them by default'
+    )
+    parser.add_argument(
+        '--tx-batch-window',
+        type=float,
+        metavar='SECONDS',
+        default=0.0,
+        help='[testing] sign and send the transactions made within SECONDS with the same counterparty as one batch'
+    )
+    parser.add_argument(
+        '--validation-batch',
+        type=int,
+        metavar='N',
+        default=1,
+        help='[testing] validate up to N transactions with the same counterparty in one request'
+    )
+    parser.add_argument(
+        '--validation-window',
+        type=int,
+        metavar='N',
+        default=4,
+        help='[testing] keep at most N validation requests outstanding per counterparty'
+    )
+    parser.add_argument(
+        '--validation-window-total',
+        type=int,
+        metavar='N',
+        default=64,
+        help='[testing] keep at most N validation requests outstanding in total'
+    )
+    parser.add_argument(
+        '--validation-timeout',
+        type=float,
+        metavar='SECONDS',
+        default=10.0,
+        help='[testing] retry a validation request that is not answered within SECONDS'
+    )
+    parser.add_argument(
+        '--replay-buffer-size',
+        type=int,
+        metavar='N',
+        default=100000,
+        help='buffer at most N consensus messages that arrive before they can be handled'
+    )
+    parser.add_argument(
+        '--outbound-bulk-cap',
+        type=int,
+        metavar='BYTES',
+        default=4 * 1024 * 1024,
+        help='queue at most BYTES of transaction and validation messages per peer'
+    )
+    parser.add_argument(
+        '--outbound-bulk-policy',
+        choices=[DROP, DEFER],
+        default=DEFER,
+        help='drop the validation responses beyond the cap, or keep them queued, '
+             'the other transaction and validation messages are always kept'
+    )
+    parser.add_argument(
+        '--store-dir',
+        metavar='DIR',
+        help='keep my chain on disk in DIR and continue from it on restart, it is kept in memory by default'
+    )
+    parser.add_argument(
+        '--tx-window',
+        type=int,
+        metavar='N',
+        default=1000,
+        help='keep at most N transactions per counterparty waiting for their other half'
+    )
     args = parser.parse_args()
 
     set_logging(args.loglevel, args.output)
 
     def _run():
         run(Config(args.port, args.n, args.t, args.population, args.test, args.value, args.failure, args.tx_rate,
-                   args.fan_out, args.validate, args.ignore_promoter, args.auto_byzantine),
+                   args.fan_out, args.validate, args.ignore_promoter, args.auto_byzantine, args.validation_mode,
+                   args.cons_retention, args.tx_batch_window, args.validation_batch, args.validation_window,
+                   args.validation_window_total, args.validation_timeout, args.replay_buffer_size,
+                   args.outbound_bulk_cap, args.outbound_bulk_policy, args.store_dir, args.tx_window),
             args.broadcast, args.discovery)
 
     if args.timeout != 0:
@@ -0,0 +1,203 @@
+import logging
+
+from collections import deque
+from twisted.internet import reactor
+from twisted.internet.interfaces import IPushProducer
+from zope.interface import implementer
+from typing import Dict, List
+
+CONSENSUS = 0
+CHECKPOINT = 1
+BULK = 2
+
+PRIORITY_NAMES = ('consensus', 'checkpoint', 'bulk')
+
+_PRIORITY_OF = {
+    'Ping': CONSENSUS,
+    'Pong': CONSENSUS,
+    'ACS': CONSENSUS,
+    'Bracha': CONSENSUS,
+    'Mo14': CONSENSUS,
+    'TxReq': BULK,
+    'TxResp': BULK,
+    'TxReqBatch': BULK,
+    'TxRespBatch': BULK,
+    'ValidationReq': BULK,
+    'ValidationResp': BULK,
+    'ValidationReqBatch': BULK,
+    'ValidationRespBatch': BULK,
+}
+
+# the validation scheduler sends the request again when the response does not arrive,
+# a TX request or response that is lost leaves a TX without its other half forever
+_DROPPABLE = frozenset(['ValidationResp', 'ValidationRespBatch'])
+
+DROP = 'drop'
+DEFER = 'defer'
+
+
+def priority_of(name):
+    # type: (str) -> int
+    """
+    :param name: name of the message type on the wire
+    :return: CONSENSUS, CHECKPOINT (CPs, Cons, signatures and everything else) or BULK (TXs and validation)
+    """
+    return _PRIORITY_OF.get(name, CHECKPOINT)
+
+
+@implementer(IPushProducer)
+class OutboundQueue(object):
+    """
+    Frames waiting to be written to one peer, in one FIFO per priority class.
+    It is registered as a streaming producer on the transport, so nothing is written while the transport is paused,
+    i.e. when the peer does not keep up, and a higher class is always written before a lower one.
+    Frames are coalesced into writes of about `coalesce_bytes`.
+
+    Every class has an optional byte cap, when it is reached `congested` tells the senders to stop.
+    The cap bounds the bulk class because nothing in it is unsolicited:
+    TX and validation requests are not made to a congested peer,
+    and the responses are bounded by the requests that the peer has outstanding, see Config.tx_window and
+    Config.validation_window. So frames beyond the cap are kept (DEFER), under DROP only the frames that are
+    retried by their sender, i.e. validation responses, are dropped instead.
+    The consensus and checkpoint classes are not capped, they carry a bounded number of messages per round
+    (CPs, signatures, consensus results and ACS) that the rounds cannot do without, independent of the TX rate.
+    """
+    def __init__(self, transport, caps=(None, None, None), policies=(DEFER, DEFER, DEFER), coalesce_bytes=16 * 1024,
+                 clock=reactor):
+        # type: (...) -> None
+        """
+        :param transport:
+        :param caps: maximum number of queued bytes per class, None for no limit
+        :param policies: DROP or DEFER per class, what to do with the frames beyond the cap that may be dropped
+        :param coalesce_bytes:
+        :param clock: provides `callLater`, the reactor by default
+        """
+        assert len(caps) == len(policies) == len(PRIORITY_NAMES)
+        assert all(p in (DROP, DEFER) for p in policies)
+        self._transport = transport
+        self._caps = caps
+        self._policies = policies
+        self._coalesce_bytes = coalesce_bytes
+        self._clock = clock
+
+        self._queues = [deque() for _ in PRIORITY_NAMES]
+        self.queued_bytes = [0] * len(PRIORITY_NAMES)
+        self.sent = [0] * len(PRIORITY_NAMES)
+        self.dropped = [0] * len(PRIORITY_NAMES)
+        self.deferred = [0] * len(PRIORITY_NAMES)
+        self.pauses = 0
+
+        self._paused = False
+        self._stopped = False
+        self._flush_call = None
+
+    def push(self, name, frame):
+        # type: (str, str) -> bool
+        """
+        :param name: name of the message type
+        :param frame:
+        :return: False if the frame is dropped, i.e. the connection is closed,
+        or the frame is a validation response beyond the cap of a DROP class
+        """
+        if self._stopped:
+            return False
+
+        p = priority_of(name)
+        cap = self._caps[p]
+        if cap is not None and self.queued_bytes[p] + len(frame) > cap:
+            if self._policies[p] == DROP and name in _DROPPABLE:
+                self.dropped[p] += 1
+                logging.debug("NODE: outbound {} queue full, dropping {}".format(PRIORITY_NAMES[p], name))
+                return False
+            self.deferred[p] += 1
+
+        self._queues[p].append(frame)
+        self.queued_bytes[p] += len(frame)
+        if not self._paused and self._flush_call is None:
+            self._flush_call = self._clock.callLater(0, self.flush)
+        return True
+
+    def congested(self, p):
+        # type: (int) -> bool
+        """
+        :param p: priority class
+        :return: True if the class reached its cap
+        """
+        cap = self._caps[p]
+        return cap is not None and self.queued_bytes[p] >= cap
+
+    def flush(self):
+        """
+        Write the queued frames in priority order until they run out or the transport pauses us
+        :return:
+        """
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+
+        chunk = []  # type: List[str]
+        size = 0
+        for p, q in enumerate(self._queues):
+            while q and not self._paused:
+                frame = q.popleft()
+                self.queued_bytes[p] -= len(frame)
+                self.sent[p] += 1
+                chunk.append(frame)
+                size += len(frame)
+                if size >= self._coalesce_bytes:
+                    # writing may pause us
+                    self._transport.write(''.join(chunk))
+                    chunk = []
+                    size = 0
+        if chunk:
+            self._transport.write(''.join(chunk))
+
+    def pauseProducing(self):
+        self._paused = True
+        self.pauses += 1
+
+    def resumeProducing(self):
+        self._paused = False
+        self.flush()
+
+    def stopProducing(self):
+        self._stopped = True
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._flush_call = None
+        for p, q in enumerate(self._queues):
+            q.clear()
+            self.queued_bytes[p] = 0
+
+    @property
+    def depth(self):
+        # type: () -> List[int]
+        """
+        :return: the number of queued frames per class
+        """
+        return [len(q) for q in self._queues]
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, Dict[str, int]]
+        return {name: {'depth': len(self._queues[p]), 'bytes': self.queued_bytes[p], 'sent': self.sent[p],
+                       'dropped': self.dropped[p], 'deferred': self.deferred[p]}
+                for p, name in enumerate(PRIORITY_NAMES)}
+
+
+def merge_stats(queues):
+    # type: (List[OutboundQueue]) -> Dict
+    """
+    :param queues:
+    :return: the sum of the stats of all the queues, and the total number of pauses
+    """
+    res = {name: {'depth': 0, 'bytes': 0, 'sent': 0, 'dropped': 0, 'deferred': 0} for name in PRIORITY_NAMES}
+    pauses = 0
+    for q in queues:
+        for name, counters in q.stats.iteritems():
+            for k, v in counters.iteritems():
+                res[name][k] += v
+        pauses += q.pauses
+    res['pauses'] = pauses
+    return res
@@ -0,0 +1,176 @@
+import random
+
+from typing import List, Dict, Tuple, Iterable, Optional
+
+
+class PeerTable(object):
+    """
+    The connected peers, indexed by vk.
+    The vks and the protocols are kept in arrays so that sampling is O(1),
+    and the views that are needed on every transaction or broadcast (sorted vks, neighbour, non-promoters)
+    are cached until the peers or the promoters change.
+    """
+    def __init__(self, my_vk, rng=random):
+        # type: (str, random.Random) -> None
+        """
+        :param my_vk: my own vk, I am normally one of the peers because every node connects to itself
+        :param rng:
+        """
+        self._my_vk = my_vk
+        self._rng = rng
+
+        self._vks = []  # type: List[str]
+        self._protos = []  # type: List
+        self._addrs = []  # type: List[Tuple[str, int]]
+        self._index = {}  # type: Dict[str, int]
+
+        self._promoters = []  # type: List[str]
+        self._promoter_set = frozenset()
+
+        self._sorted = None  # type: Optional[List[str]]
+        self._neighbour = None  # type: Optional[str]
+        self._non_promoters = None  # type: Optional[List[str]]
+
+    def _invalidate(self):
+        self._sorted = None
+        self._neighbour = None
+        self._non_promoters = None
+
+    def add(self, vk, host, port, proto):
+        # type: (str, str, int, object) -> None
+        """
+        Add a peer, or replace the protocol and the address of an existing one
+        :param vk:
+        :param host:
+        :param port:
+        :param proto:
+        :return:
+        """
+        i = self._index.get(vk)
+        if i is not None:
+            self._protos[i] = proto
+            self._addrs[i] = (host, port)
+            return
+        self._index[vk] = len(self._vks)
+        self._vks.append(vk)
+        self._protos.append(proto)
+        self._addrs.append((host, port))
+        self._invalidate()
+
+    def remove(self, vk):
+        # type: (str) -> None
+        """
+        :param vk:
+        :return:
+        :raise KeyError: if the peer does not exist
+        """
+        i = self._index.pop(vk)
+        # move the last peer into the free slot
+        last = len(self._vks) - 1
+        if i != last:
+            self._vks[i] = self._vks[last]
+            self._protos[i] = self._protos[last]
+            self._addrs[i] = self._addrs[last]
+            self._index[self._vks[i]] = i
+        self._vks.pop()
+        self._protos.pop()
+        self._addrs.pop()
+        self._invalidate()
+
+    def proto(self, vk):
+        return self._protos[self._index[vk]]
+
+    def address(self, vk):
+        # type: (str) -> Tuple[str, int]
+        return self._addrs[self._index[vk]]
+
+    @property
+    def vks(self):
+        # type: () -> List[str]
+        """
+        :return: the vks in no particular order, the list must not be modified
+        """
+        return self._vks
+
+    @property
+    def protos(self):
+        # type: () -> List
+        """
+        :return: the protocols in the same order as `vks`, the list must not be modified
+        """
+        return self._protos
+
+    @property
+    def sorted_vks(self):
+        # type: () -> List[str]
+        if self._sorted is None:
+            self._sorted = sorted(self._vks)
+        return self._sorted
+
+    @property
+    def neighbour(self):
+        # type: () -> str
+        """
+        :return: the vk that's after mine in sorted order, or loop back
+        """
+        if self._neighbour is None:
+            vks = self.sorted_vks
+            self._neighbour = vks[(vks.index(self._my_vk) + 1) % len(vks)]
+        return self._neighbour
+
+    @property
+    def promoters(self):
+        # type: () -> List[str]
+        return self._promoters
+
+    def set_promoters(self, promoters):
+        # type: (List[str]) -> None
+        self._promoters = promoters
+        self._promoter_set = frozenset(promoters)
+        self._non_promoters = None
+
+    def is_promoter(self, vk):
+        # type: (str) -> bool
+        return vk in self._promoter_set
+
+    @property
+    def non_promoters(self):
+        # type: () -> List[str]
+        if self._non_promoters is None:
+            self._non_promoters = [vk for vk in self._vks if vk not in self._promoter_set]
+        return self._non_promoters
+
+    def random_other(self):
+        # type: () -> str
+        """
+        :return: a random peer that is not me, in O(1)
+        """
+        me = self._index.get(self._my_vk)
+        if me is None:
+            return self._vks[self._rng.randrange(len(self._vks))]
+        i = self._rng.randrange(len(self._vks) - 1)
+        if i >= me:
+            i += 1
+        return self._vks[i]
+
+    def sample(self, k, exclude=None):
+        # type: (int, Optional[Iterable[str]]) -> List[str]
+        """
+        :param k: at most this many peers are returned
+        :param exclude: peers that must not be returned
+        :return:
+        """
+        candidates = self._vks
+        if exclude:
+            exclude = set(exclude)
+            candidates = [vk for vk in self._vks if vk not in exclude]
+        return self._rng.sample(candidates, min(k, len(candidates)))
+
+    def __contains__(self, vk):
+        return vk in self._index
+
+    def __len__(self):
+        return len(self._vks)
+
+    def __iter__(self):
+        return iter(self._vks)
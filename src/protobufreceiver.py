@@ -8,7 +8,59 @@ import src.messages.messages_pb2 as pb
 _PB_PAIRS = [(k, v) for k, v in vars(pb).iteritems() if isinstance(v, type) and issubclass(v, Message)]
 _PB_TAG_TO_TUPLE = {_tag: _v for _tag, _v in enumerate(_PB_PAIRS)}
 _PB_NAME_TO_TAG = {_v[0]:  _tag for _tag, _v in _PB_TAG_TO_TUPLE.iteritems()}
-assert len(_PB_PAIRS) == 21
+assert len(_PB_PAIRS) == 32
+
+# views are wire-compatible with another message type, they are sent under the tag of that type,
+# and messages of that type are always parsed as the view
+_VIEW_OF = {
+    'ConsView': 'Cons',
+    'CpBlocksView': 'CpBlocks',
+    'TxReqView': 'TxReq',
+    'TxRespView': 'TxResp',
+    'ValidationRespView': 'ValidationResp',
+}
+for _view, _name in _VIEW_OF.iteritems():
+    _PB_TAG_TO_TUPLE[_PB_NAME_TO_TAG[_name]] = (_name, getattr(pb, _view))
+
+
+def message_type(tag):
+    """
+    :param tag:
+    :return: the name of the message type on the wire and the class that it is parsed into
+    """
+    return _PB_TAG_TO_TUPLE[tag]
+
+
+def message_tag(name):
+    """
+    :param name: the name of the message type on the wire
+    :return:
+    """
+    return _PB_NAME_TO_TAG[name]
+
+
+def wire_name(obj):
+    """
+    :param obj: protobuf message
+    :return: the name of the message type on the wire
+    """
+    name = obj.__class__.__name__
+    return _VIEW_OF.get(name, name)
+
+
+# length prefix and tag
+FRAME_OVERHEAD = 4 + 2
+
+
+def encode_frame(obj):
+    """
+    Serialize a message into a complete frame, the same frame can be written to any number of transports
+    :param obj: protobuf message
+    :return: the name of the message type on the wire and the frame
+    """
+    name = wire_name(obj)
+    body = pack("H", _PB_NAME_TO_TAG[name]) + obj.SerializeToString()
+    return name, pack(Int32StringReceiver.structFormat, len(body)) + body
 
 
 class ProtobufReceiver(Int32StringReceiver):
@@ -20,8 +72,18 @@ class ProtobufReceiver(Int32StringReceiver):
 
     def stringReceived(self, string):
         tag, = unpack("H", string[:2])
-        obj = _PB_TAG_TO_TUPLE[tag][1]()
-        obj.ParseFromString(string[2:])
+        self.frame_received(tag, string[2:])
+
+    def frame_received(self, tag, data):
+        """
+        Called before parsing, by default the message is parsed and passed to obj_received,
+        override it to route messages by tag, see Router
+        :param tag:
+        :param data: the encoded message
+        :return:
+        """
+        obj = message_type(tag)[1]()
+        obj.ParseFromString(data)
         self.obj_received(obj)
 
     def obj_received(self, obj):
@@ -41,8 +103,16 @@ class ProtobufReceiver(Int32StringReceiver):
         :param obj: 
         :return: 
         """
-        msg = pack("H", _PB_NAME_TO_TAG[obj.__class__.__name__]) + obj.SerializeToString()
-        self.sendString(msg)
+        self.send_frame(*encode_frame(obj))
+
+    def send_frame(self, name, frame):
+        """
+        Write a frame from `encode_frame`, override it to queue the frames, see OutboundQueue
+        :param name: name of the message type
+        :param frame:
+        :return:
+        """
+        self.transport.write(frame)
 
     def lengthLimitExceeded(self, length):
         raise IOError("Line length exceeded, len: {}".format(length))
@@ -0,0 +1,145 @@
+import logging
+import timeit
+from collections import defaultdict
+
+from typing import Callable, Dict, List, Tuple
+
+from src.protobufreceiver import message_type, message_tag, wire_name
+
+
+class Router(object):
+    """
+    Dispatches received frames to the handler registered for their tag.
+    The frame is only parsed if it is going to be handled, message types can be dropped or deferred before parsing,
+    and filters can reject individual frames, e.g. duplicates.
+    For every type we record the number of frames, their size (without framing), and the time spent in the handler.
+    """
+    DROP = 'drop'
+    DEFER = 'defer'
+
+    def __init__(self, timer=timeit.default_timer):
+        # type: (Callable[[], float]) -> None
+        self._handlers = {}  # type: Dict[int, Callable]
+        self._filters = defaultdict(list)  # type: Dict[int, List[Callable[[str, str], bool]]]
+        self._policies = {}  # type: Dict[int, str]
+        self._deferred = defaultdict(list)  # type: Dict[int, List[Tuple[str, str]]]
+        self._timer = timer
+
+        self.count = defaultdict(long)
+        self.bytes = defaultdict(long)
+        self.seconds = defaultdict(float)
+        self.dropped = defaultdict(long)
+
+    def register(self, name, handler):
+        # type: (str, Callable) -> None
+        """
+        :param name: name of the message type on the wire, views are handled under the name of the original type
+        :param handler: called with the parsed message and the vk of the sender
+        :return:
+        """
+        tag = message_tag(name)
+        assert tag not in self._handlers, "{} is already registered".format(name)
+        self._handlers[tag] = handler
+
+    def add_filter(self, name, f):
+        # type: (str, Callable[[str, str], bool]) -> None
+        """
+        :param name:
+        :param f: called with the encoded message and the vk of the sender before parsing, returns False to drop it
+        :return:
+        """
+        self._filters[message_tag(name)].append(f)
+
+    def drop(self, name):
+        # type: (str) -> None
+        self._policies[message_tag(name)] = Router.DROP
+
+    def defer(self, name):
+        # type: (str) -> None
+        """
+        Buffer the messages of this type without parsing them until `resume` is called
+        :param name:
+        :return:
+        """
+        self._policies[message_tag(name)] = Router.DEFER
+
+    def resume(self, name):
+        # type: (str) -> None
+        """
+        Handle messages of this type again, starting with the deferred ones
+        :param name:
+        :return:
+        """
+        tag = message_tag(name)
+        self._policies.pop(tag, None)
+        for data, remote_vk in self._deferred.pop(tag, []):
+            self._handle(tag, data, remote_vk)
+
+    def route(self, tag, data, remote_vk):
+        # type: (int, str, str) -> None
+        """
+        :param tag:
+        :param data: the encoded message without the tag
+        :param remote_vk:
+        :return:
+        """
+        name = message_type(tag)[0]
+        self.count[name] += 1
+        self.bytes[name] += len(data)
+
+        policy = self._policies.get(tag)
+        if policy == Router.DROP:
+            self.dropped[name] += 1
+            return
+        if policy == Router.DEFER:
+            self._deferred[tag].append((data, remote_vk))
+            return
+
+        self._handle(tag, data, remote_vk)
+
+    def _handle(self, tag, data, remote_vk):
+        name, cls = message_type(tag)
+        for f in self._filters.get(tag, []):
+            if not f(data, remote_vk):
+                self.dropped[name] += 1
+                return
+
+        handler = self._handlers.get(tag)
+        if handler is None:
+            raise AssertionError("invalid message type {}".format(name))
+
+        obj = cls()
+        obj.ParseFromString(data)
+        start = self._timer()
+        try:
+            handler(obj, remote_vk)
+        finally:
+            self.seconds[name] += self._timer() - start
+
+    def dispatch(self, obj, remote_vk):
+        # type: (...) -> None
+        """
+        Handle a message that is already parsed, e.g. when it is replayed, it is not counted again
+        :param obj:
+        :param remote_vk:
+        :return:
+        """
+        name = wire_name(obj)
+        start = self._timer()
+        try:
+            self._handlers[message_tag(name)](obj, remote_vk)
+        finally:
+            self.seconds[name] += self._timer() - start
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, Dict]
+        return {name: {'count': self.count[name],
+                       'bytes': self.bytes[name],
+                       'seconds': round(self.seconds[name], 6),
+                       'dropped': self.dropped[name],
+                       'deferred': len(self._deferred.get(message_tag(name), []))}
+                for name in self.count}
+
+    def log_stats(self):
+        logging.info("NODE: handler stats {}".format(self.stats))
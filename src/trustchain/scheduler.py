@@ -0,0 +1,232 @@
+import heapq
+import logging
+from collections import defaultdict, deque, OrderedDict
+
+from twisted.internet import task, reactor
+from typing import List, Dict, Tuple, Callable, Set, Any
+
+from src.utils import my_err_back
+
+
+class ValidationScheduler(object):
+    """
+    Keeps a window of outstanding validation requests per counterparty and in total.
+    Every counterparty has a queue of TXs to request, oldest first, and only the counterparties whose window is open
+    and whose queue is not empty are visited, so dispatching costs time proportional to the requests sent
+    and not to the number of pending TXs.
+    New requests are dispatched as soon as a slot is freed by a response.
+    A request that is not answered within `timeout` expires and its TXs become eligible again,
+    TXs that are still pending after a response (e.g. the validation failed) are also retried after `timeout`.
+    """
+    def __init__(self, pending_since, is_pending, send, per_peer=4, total=64, timeout=10.0, batch=1, clock=reactor):
+        # type: (Callable[[int], Tuple[List, int]], Callable[[int], bool], Callable, int, int, float, int, Any) -> None
+        """
+        :param pending_since: called with a seq, returns the (seq, counterparty) of the verifiable TXs
+        from that seq onwards, ordered by seq, and the seq from which TXs are not verifiable yet
+        :param is_pending: returns whether the TX at a seq still needs to be validated
+        :param send: sends one request for the given seqs to the counterparty, returns False if nothing is sent
+        :param per_peer: maximum number of outstanding requests per counterparty
+        :param total: maximum number of outstanding requests
+        :param timeout: seconds before an outstanding request expires
+        :param batch: maximum number of TXs in one request
+        :param clock: provides `seconds` and `callLater`, the reactor by default
+        """
+        assert per_peer >= 1 and total >= 1 and timeout > 0 and batch >= 1
+        self._pending_since = pending_since
+        self._is_pending = is_pending
+        self._send = send
+        self._per_peer = per_peer
+        self._total = total
+        self._timeout = timeout
+        self._batch = batch
+        self._clock = clock
+
+        # TXs before the horizon are already handed to us
+        self._horizon = 0
+
+        self._queues = defaultdict(deque)  # type: Dict[str, deque]
+        self._queued = set()  # type: Set[int]
+        # counterparties with an open window and queued TXs, in the order in which they are served
+        self._ready = OrderedDict()  # type: OrderedDict
+
+        self._next_id = 0
+        self._requests = {}  # type: Dict[int, Tuple[str, List[int], float]]
+        self._req_of_seq = {}  # type: Dict[int, int]
+        self._peer_in_flight = defaultdict(int)  # type: Dict[str, int]
+
+        # TXs that wait before they are queued again, as a heap of (time, seq, counterparty)
+        self._retries = []  # type: List[Tuple[float, int, str]]
+        self._retry_at = {}  # type: Dict[int, float]
+
+        self._timeouts = 0
+        self._lc = None
+
+    def start(self, interval):
+        # type: (float) -> None
+        """
+        Periodically expire stale requests and pick up TXs that became verifiable.
+        :param interval:
+        :return:
+        """
+        self._lc = task.LoopingCall(self.tick)
+        self._lc.clock = self._clock
+        self._lc.start(interval).addErrback(my_err_back)
+
+    def stop(self):
+        if self._lc is not None and self._lc.running:
+            self._lc.stop()
+        self._lc = None
+
+    def add(self, seq, counterparty):
+        # type: (int, str) -> None
+        """
+        Queue a TX that became pending late, e.g. its other half arrived after it was covered by a consensus result.
+        TXs that are not verifiable yet are ignored, they are picked up when they are.
+        :param seq:
+        :param counterparty:
+        :return:
+        """
+        if seq < self._horizon:
+            self._enqueue(seq, counterparty)
+
+    def _enqueue(self, seq, counterparty, front=False):
+        # type: (int, str, bool) -> None
+        if seq in self._queued or seq in self._req_of_seq or seq in self._retry_at:
+            return
+        self._queued.add(seq)
+        if front:
+            self._queues[counterparty].appendleft(seq)
+        else:
+            self._queues[counterparty].append(seq)
+        if self._peer_in_flight.get(counterparty, 0) < self._per_peer:
+            self._ready[counterparty] = None
+
+    def _retry_later(self, seqs, counterparty, now):
+        # type: (List[int], str, float) -> None
+        for seq in seqs:
+            if seq not in self._retry_at and self._is_pending(seq):
+                self._retry_at[seq] = now + self._timeout
+                heapq.heappush(self._retries, (now + self._timeout, seq, counterparty))
+
+    def _take(self, counterparty):
+        # type: (str) -> List[int]
+        """
+        :return: up to `batch` of the oldest queued TXs of `counterparty` that are still pending
+        """
+        q = self._queues[counterparty]
+        seqs = []
+        while q and len(seqs) < self._batch:
+            seq = q.popleft()
+            self._queued.discard(seq)
+            # e.g. validated from the cache in the meantime
+            if self._is_pending(seq):
+                seqs.append(seq)
+        if not q:
+            del self._queues[counterparty]
+        return seqs
+
+    def pump(self):
+        # type: () -> int
+        """
+        Pick up the TXs that became verifiable and send requests until the windows are full.
+        :return: the number of requests sent
+        """
+        new, self._horizon = self._pending_since(self._horizon)
+        for seq, counterparty in new:
+            self._enqueue(seq, counterparty)
+
+        now = self._clock.seconds()
+        sent = 0
+        while self._ready and len(self._requests) < self._total:
+            counterparty = next(iter(self._ready))
+            seqs = self._take(counterparty)
+            if not seqs:
+                del self._ready[counterparty]
+                continue
+
+            if not self._send(counterparty, seqs):
+                # e.g. the counterparty is congested, its other TXs would not be sent either
+                self._retry_later(seqs, counterparty, now)
+                for seq in self._queues.pop(counterparty, []):
+                    self._queued.discard(seq)
+                    self._retry_later([seq], counterparty, now)
+                del self._ready[counterparty]
+                continue
+
+            self._next_id += 1
+            self._requests[self._next_id] = (counterparty, seqs, now + self._timeout)
+            for seq in seqs:
+                self._req_of_seq[seq] = self._next_id
+            self._peer_in_flight[counterparty] += 1
+            sent += 1
+
+            # round robin over the counterparties
+            del self._ready[counterparty]
+            if self._peer_in_flight[counterparty] < self._per_peer and counterparty in self._queues:
+                self._ready[counterparty] = None
+        return sent
+
+    def _release(self, req_id):
+        # type: (int) -> Tuple[str, List[int]]
+        counterparty, seqs, _ = self._requests.pop(req_id)
+        for seq in seqs:
+            del self._req_of_seq[seq]
+        self._peer_in_flight[counterparty] -= 1
+        if self._peer_in_flight[counterparty] == 0:
+            del self._peer_in_flight[counterparty]
+        if counterparty in self._queues:
+            self._ready[counterparty] = None
+        return counterparty, seqs
+
+    def on_response(self, seqs):
+        # type: (List[int]) -> None
+        """
+        Free the slots of the requests that are answered and dispatch new requests.
+        Responses to expired requests are ignored.
+        :param seqs: the seqs in the response
+        :return:
+        """
+        now = self._clock.seconds()
+        for seq in seqs:
+            req_id = self._req_of_seq.get(seq)
+            if req_id is not None:
+                counterparty, req_seqs = self._release(req_id)
+                self._retry_later(req_seqs, counterparty, now)
+        self.pump()
+
+    def tick(self):
+        # type: () -> None
+        now = self._clock.seconds()
+        expired = [req_id for req_id, (_, _, deadline) in self._requests.iteritems() if deadline <= now]
+        # newest first, so that the oldest TXs end up at the front of the queues
+        for req_id in sorted(expired, reverse=True):
+            counterparty, seqs = self._release(req_id)
+            for seq in reversed(seqs):
+                if self._is_pending(seq):
+                    self._enqueue(seq, counterparty, front=True)
+        if expired:
+            self._timeouts += len(expired)
+            logging.debug("TC: {} validation requests timed out".format(len(expired)))
+
+        due = []
+        while self._retries and self._retries[0][0] <= now:
+            _, seq, counterparty = heapq.heappop(self._retries)
+            del self._retry_at[seq]
+            due.append((seq, counterparty))
+        # the oldest go first
+        for seq, counterparty in reversed(due):
+            if self._is_pending(seq):
+                self._enqueue(seq, counterparty, front=True)
+        self.pump()
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, int]
+        """
+        :return: queue_depth is the number of TXs that wait for a request, including the ones that wait to be retried,
+        in_flight and in_flight_txs are the outstanding requests and the TXs that they cover
+        """
+        return {'queue_depth': len(self._queued) + len(self._retry_at),
+                'in_flight': len(self._requests),
+                'in_flight_txs': len(self._req_of_seq),
+                'timeouts': self._timeouts}
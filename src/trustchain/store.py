@@ -0,0 +1,419 @@
+import os
+import mmap
+import struct
+import logging
+from collections import OrderedDict
+
+from typing import List, Dict, Callable, Tuple, Optional, Iterator
+
+KIND_TX = 0
+KIND_CP = 1
+
+# kinds of the records in the state log, the key is a seq for the first two and a round for the last
+STATE_OTHER_HALF = 0
+STATE_VALIDITY = 1
+STATE_CONS = 2
+
+# segment number, offset, length, kind, digest, prev
+_INDEX_ENTRY = struct.Struct('<IQIB32s32s')
+_RECORD_HEADER = struct.Struct('<I')
+# kind, key, length
+_STATE_HEADER = struct.Struct('<BQI')
+
+# number of index entries that are appended before the index is mapped again
+_INDEX_TAIL_SIZE = 1024
+
+
+class MemoryStore(list):
+    """
+    The default storage for Chain, every block is kept in memory.
+    It exposes the same interface as SegmentStore so that Chain does not need to know which one it is using.
+    """
+    def __init__(self):
+        list.__init__(self)
+        self._kinds = bytearray()
+        self._dropped = 0
+
+    def append_block(self, block, kind):
+        # type: (...) -> None
+        self.append(block)
+        self._kinds.append(kind)
+
+    def kind(self, seq):
+        # type: (int) -> int
+        return self._kinds[seq]
+
+    def compacts(self, lo, hi):
+        # type: (int, int) -> List
+        """
+        :return: the compact form of the blocks in the range [lo, hi)
+        """
+        return [b.compact for b in self[lo:hi]]
+
+    def pin(self, seq):
+        pass
+
+    def unpin(self, seq):
+        pass
+
+    def drop(self, seq):
+        # type: (int) -> None
+        """
+        Release the block at `seq`, it must not be accessed afterwards.
+        :param seq:
+        :return:
+        """
+        if self[seq] is not None:
+            self[seq] = None
+            self._dropped += 1
+
+    @property
+    def resident_count(self):
+        # type: () -> int
+        return len(self) - self._dropped
+
+    def log_state(self, kind, key, data):
+        pass
+
+    def states(self):
+        # type: () -> Iterator[Tuple[int, int, str]]
+        return iter([])
+
+    def keypair(self):
+        # type: () -> Optional[Tuple[str, str]]
+        return None
+
+    def save_keypair(self, vk, sk):
+        pass
+
+
+class SegmentStore(object):
+    """
+    Append-only block storage on disk.
+    Blocks are serialized into length-prefixed records in segment files,
+    and a fixed-width index records where each block is along with its digest and previous hash.
+    Old blocks are read back lazily through mmap, only the `hot_size` blocks that are most recently appended
+    or used again while they are in memory,
+    the pinned blocks (i.e. the ones pending validation) and the CP blocks, which are few and needed to find
+    enclosures, are kept in memory. So are the kinds of the blocks, one byte per block.
+    The index entries of the recent blocks are kept in memory until there are enough of them to map the index again.
+    The state that is not in the blocks (other halves, validity, consensus results) is appended to a state log
+    and replayed by the owner when the store is reopened, the key pair of the chain is kept next to it.
+    """
+    def __init__(self, directory, decode, make_compact, segment_size=64 * 1024 * 1024, hot_size=1024):
+        # type: (str, Callable[[int, str], object], Callable[[str, str, int], object], int, int) -> None
+        """
+        :param directory: where the segment files and the index are stored, created if it does not exist
+        :param decode: function that converts a kind and a serialized block into a block
+        :param make_compact: function that creates a compact block from a digest, a previous hash and a seq
+        :param segment_size: a new segment is started when the current one exceeds this size
+        :param hot_size: number of recently used blocks to keep in memory
+        """
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._dir = directory
+        self._decode = decode
+        self._make_compact = make_compact
+        self._segment_size = segment_size
+        self._hot_size = hot_size
+
+        self._hot = OrderedDict()  # type: OrderedDict
+        self._pinned = {}  # type: Dict[int, object]
+        self._cps = {}  # type: Dict[int, object]
+        self._maps = {}  # type: Dict[int, Tuple[mmap.mmap, int]]
+
+        index_path = os.path.join(directory, 'index.dat')
+        self._len = self._recover(index_path)
+        self._index = open(index_path, 'ab')
+        self._index_map = None  # type: Optional[mmap.mmap]
+        # the entries before this seq are read from the map, the ones after it from the tail
+        self._mapped = 0
+        self._tail = []  # type: List[Tuple[int, int, int, int, str, str]]
+        self._map_index()
+        self._kinds = bytearray(self._entry(seq)[3] for seq in xrange(self._len))
+
+        if self._len > 0:
+            self._seg, off, length = self._entry(self._len - 1)[:3]
+            self._seg_offset = off + _RECORD_HEADER.size + length
+        else:
+            self._seg = 0
+            self._seg_offset = 0
+        self._seg_file = open(self._segment_path(self._seg), 'ab')
+
+        state_path = os.path.join(directory, 'state.dat')
+        self._recover_state(state_path)
+        self._state = open(state_path, 'ab')
+
+    def _segment_path(self, seg):
+        return os.path.join(self._dir, 'seg-{:06d}.dat'.format(seg))
+
+    def _recover(self, index_path):
+        # type: (str) -> int
+        """
+        Drop partially written index entries and segment records, e.g. after a crash.
+        The index is authoritative, a record that is not in the index does not exist.
+        :return: the number of blocks in the store
+        """
+        if not os.path.exists(index_path):
+            return 0
+
+        size = os.path.getsize(index_path)
+        n = size // _INDEX_ENTRY.size
+        if size != n * _INDEX_ENTRY.size:
+            logging.warning("STORE: truncating partial index entry in {}".format(index_path))
+            with open(index_path, 'r+b') as f:
+                f.truncate(n * _INDEX_ENTRY.size)
+
+        if n > 0:
+            with open(index_path, 'rb') as f:
+                f.seek((n - 1) * _INDEX_ENTRY.size)
+                seg, off, length = _INDEX_ENTRY.unpack(f.read(_INDEX_ENTRY.size))[:3]
+            end = off + _RECORD_HEADER.size + length
+            seg_path = self._segment_path(seg)
+            if os.path.getsize(seg_path) > end:
+                with open(seg_path, 'r+b') as f:
+                    f.truncate(end)
+        return n
+
+    @staticmethod
+    def _read_states(path):
+        # type: (str) -> Iterator[Tuple[int, int, str, int]]
+        """
+        :return: the complete records in the state log and the offset after each of them
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            end = 0
+            while True:
+                header = f.read(_STATE_HEADER.size)
+                if len(header) < _STATE_HEADER.size:
+                    return
+                kind, key, length = _STATE_HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length:
+                    return
+                end += _STATE_HEADER.size + length
+                yield kind, key, data, end
+
+    def _recover_state(self, state_path):
+        # type: (str) -> None
+        """
+        Drop a partially written record at the end of the state log
+        :param state_path:
+        :return:
+        """
+        end = 0
+        for _, _, _, end in self._read_states(state_path):
+            pass
+        if os.path.exists(state_path) and os.path.getsize(state_path) > end:
+            logging.warning("STORE: truncating partial state record in {}".format(state_path))
+            with open(state_path, 'r+b') as f:
+                f.truncate(end)
+
+    def _map(self, f, size, old):
+        # type: (file, int, Optional[mmap.mmap]) -> mmap.mmap
+        if old is not None:
+            old.close()
+        return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+    def _map_index(self):
+        if self._len == 0:
+            return
+        self._index.flush()
+        with open(self._index.name, 'rb') as f:
+            self._index_map = self._map(f, self._len * _INDEX_ENTRY.size, self._index_map)
+        self._mapped = self._len
+        self._tail = []
+
+    def _entry(self, seq):
+        # type: (int) -> Tuple[int, int, int, int, str, str]
+        if seq >= self._mapped:
+            return self._tail[seq - self._mapped]
+        return _INDEX_ENTRY.unpack_from(self._index_map, seq * _INDEX_ENTRY.size)
+
+    def _read(self, seg, off, length):
+        # type: (int, int, int) -> str
+        m, size = self._maps.get(seg, (None, 0))
+        start = off + _RECORD_HEADER.size
+        if start + length > size:
+            if seg == self._seg:
+                self._seg_file.flush()
+            with open(self._segment_path(seg), 'rb') as f:
+                size = os.path.getsize(f.name)
+                m = self._map(f, size, m)
+            self._maps[seg] = (m, size)
+        return m[start:start + length]
+
+    def _load(self, seq):
+        seg, off, length, kind = self._entry(seq)[:4]
+        return self._decode(kind, self._read(seg, off, length))
+
+    def append_block(self, block, kind):
+        # type: (...) -> None
+        data = block.SerializeToString()
+        if self._seg_offset > 0 and self._seg_offset + _RECORD_HEADER.size + len(data) > self._segment_size:
+            self._seg_file.close()
+            self._seg += 1
+            self._seg_offset = 0
+            self._seg_file = open(self._segment_path(self._seg), 'ab')
+
+        self._seg_file.write(_RECORD_HEADER.pack(len(data)) + data)
+        self._seg_file.flush()
+        entry = (self._seg, self._seg_offset, len(data), kind, block.compact.digest, block.compact.prev)
+        self._index.write(_INDEX_ENTRY.pack(*entry))
+        self._index.flush()
+        self._seg_offset += _RECORD_HEADER.size + len(data)
+
+        self._tail.append(entry)
+        self._kinds.append(kind)
+        if kind == KIND_CP:
+            self._cps[self._len] = block
+        else:
+            self._hot[self._len] = block
+            if len(self._hot) > self._hot_size:
+                self._hot.popitem(last=False)
+        self._len += 1
+        if len(self._tail) >= _INDEX_TAIL_SIZE:
+            self._map_index()
+
+    def kind(self, seq):
+        # type: (int) -> int
+        return self._kinds[self._normalise(seq)]
+
+    def compacts(self, lo, hi):
+        # type: (int, int) -> List
+        """
+        Build the compact blocks in the range [lo, hi) directly from the index.
+        :return:
+        """
+        res = []
+        for seq in xrange(lo, min(hi, self._len)):
+            digest, prev = self._entry(seq)[4:]
+            res.append(self._make_compact(digest, prev, seq))
+        return res
+
+    def log_state(self, kind, key, data):
+        # type: (int, int, str) -> None
+        """
+        Append a state change, see `states`
+        :param kind: one of the STATE_ constants
+        :param key:
+        :param data:
+        :return:
+        """
+        self._state.write(_STATE_HEADER.pack(kind, key, len(data)) + data)
+        self._state.flush()
+
+    def states(self):
+        # type: () -> Iterator[Tuple[int, int, str]]
+        """
+        :return: the logged state changes as (kind, key, data), oldest first
+        """
+        self._state.flush()
+        for kind, key, data, _ in self._read_states(self._state.name):
+            yield kind, key, data
+
+    def keypair(self):
+        # type: () -> Optional[Tuple[str, str]]
+        """
+        :return: the (vk, sk) that the chain in this store is signed with, None if it is not saved yet
+        """
+        path = os.path.join(self._dir, 'key.dat')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        n, = _RECORD_HEADER.unpack_from(data)
+        return data[_RECORD_HEADER.size:_RECORD_HEADER.size + n], data[_RECORD_HEADER.size + n:]
+
+    def save_keypair(self, vk, sk):
+        # type: (str, str) -> None
+        """
+        Save the key pair, the file is only readable by the owner and replaced atomically
+        :param vk:
+        :param sk:
+        :return:
+        """
+        path = os.path.join(self._dir, 'key.dat')
+        tmp = path + '.tmp'
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_RECORD_HEADER.pack(len(vk)) + vk + sk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, path)
+
+    def pin(self, seq):
+        # type: (int) -> None
+        """
+        Keep the block at `seq` in memory until it is unpinned.
+        :param seq:
+        :return:
+        """
+        if seq not in self._pinned:
+            self._pinned[seq] = self[seq]
+
+    def unpin(self, seq):
+        # type: (int) -> None
+        self._pinned.pop(seq, None)
+
+    def drop(self, seq):
+        # type: (int) -> None
+        """
+        Release the block at `seq` from memory, it stays on disk.
+        :param seq:
+        :return:
+        """
+        self._pinned.pop(seq, None)
+        self._hot.pop(seq, None)
+
+    @property
+    def resident_count(self):
+        # type: () -> int
+        return len(set(self._hot.keys()) | set(self._pinned.keys())) + len(self._cps)
+
+    def close(self):
+        self._seg_file.close()
+        self._index.close()
+        self._state.close()
+        for m, _ in self._maps.values():
+            m.close()
+        if self._index_map is not None:
+            self._index_map.close()
+
+    def _normalise(self, seq):
+        # type: (int) -> int
+        if seq < 0:
+            seq += self._len
+        if not 0 <= seq < self._len:
+            raise IndexError("store index out of range")
+        return seq
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in xrange(*item.indices(self._len))]
+
+        seq = self._normalise(item)
+        if seq in self._pinned:
+            return self._pinned[seq]
+        if seq in self._hot:
+            # most recently used last
+            block = self._hot.pop(seq)
+            self._hot[seq] = block
+            return block
+        if seq in self._cps:
+            return self._cps[seq]
+        # old blocks that are read once, e.g. to serve pieces, do not evict the recent ones
+        block = self._load(seq)
+        if self._kinds[seq] == KIND_CP:
+            self._cps[seq] = block
+        return block
+
+    def __iter__(self):
+        for seq in xrange(self._len):
+            yield self[seq]
@@ -1,27 +1,60 @@
 import math
+import heapq
 import libnacl
-import copy
 import logging
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, OrderedDict
 from base64 import b64encode
-from typing import List, Union, Dict, Tuple, Optional
+from typing import List, Union, Dict, Tuple, Optional, Iterator, Set
 from enum import Enum
 
-from src.utils import hash_pointers_ok, GrowingList, encode_n
+from src.utils import hash_pointers_ok, LRUCache, encode_n, merkle_levels, merkle_root_of_levels, merkle_proof, \
+    merkle_verify, merkle_root, merkle_root_of_proof, sign_detached, verify_detached
+from src.trustchain.store import MemoryStore, SegmentStore, KIND_TX, KIND_CP, STATE_OTHER_HALF, STATE_VALIDITY, \
+    STATE_CONS
 import src.messages.messages_pb2 as pb
 
 VALIDITY_ENUM = Enum('VALIDITY_ENUM', 'Valid Invalid Unknown')
 
+# signatures that are already verified, keyed on (vk, signature or signed document, expected message)
+_verified_sigs = LRUCache(100000)
+
+
+def verification_cache_stats():
+    # type: () -> Dict[str, int]
+    """
+    :return: hits, misses and size of the verified signature cache
+    """
+    return _verified_sigs.stats
+
 
 class ProtobufWrapper(object):
-    def __init__(self, x):
+    _pb_type = None  # the wrapped protobuf type, needed by from_string
+
+    def __init__(self, x, raw=None):
         """
         The argument `x`, or `self.pb`, is the only data that gets serialized.
         :param x: 
+        :param raw: the encoding of `x` if we already have it, see `from_string`
         """
         self.pb = x
-        self._str = None
+        self._str = raw
         self._hash = None
 
+    @classmethod
+    def from_string(cls, data):
+        """
+        Decode a wrapper and keep `data`, so that hashing, comparing and forwarding do not serialize again.
+        The bytes are only kept if their size is the canonical one, which rules out duplicated or unknown fields,
+        explicit default values and padded varints. Fields out of order are not detected,
+        the hash of such a block differs from the one its creator computed so it only fails to validate.
+        :param data:
+        :return:
+        """
+        x = cls._pb_type.FromString(data)
+        return cls(x, data if x.ByteSize() == len(data) else None)
+
     def SerializeToString(self):
         if self._str is None:
             self._str = self.pb.SerializeToString()
@@ -50,18 +83,21 @@ class ProtobufWrapper(object):
 class Signature(ProtobufWrapper):
     """
     Data structure stores the verification key along with the signature,
-    we expect the original message to be small, preferably a digest
+    we expect the original message to be small, preferably a digest.
+    New signatures are detached, i.e. they do not carry the message,
+    signatures with a signed document (signature and message) are still verified for the older blocks.
     """
     def __init__(self, x):
         # type: (pb.Signature) -> None
         ProtobufWrapper.__init__(self, x)
         self.vk = self.pb.vk
+        self._sig = self.pb.sig
         self._signed_document = self.pb.signed_document
 
     @classmethod
     def new(cls, vk, sk, msg):
         # type: (str, str, str) -> Signature
-        return cls(pb.Signature(vk=vk, signed_document=libnacl.crypto_sign(msg, sk)))
+        return cls(pb.Signature(vk=vk, sig=sign_detached(msg, sk)))
 
 
     def verify(self, vk, msg):
@@ -72,27 +108,59 @@ class Signature(ProtobufWrapper):
         """
         if vk != self.vk:
             raise ValueError("Mismatch verification key")
+
+        # the same signatures are verified many times, e.g. the promoter signatures in every CpBlock
+        if self.is_verified(msg):
+            return
+
+        self.verify_uncached(msg)
+        self.set_verified(msg)
+
+    def is_verified(self, msg):
+        # type: (str) -> bool
+        """
+        :param msg:
+        :return: whether this signature over `msg` is in the verified signature cache
+        """
+        return _verified_sigs.get((self.vk, self._sig or self._signed_document, msg), False)
+
+    def set_verified(self, msg):
+        # type: (str) -> None
+        _verified_sigs.put((self.vk, self._sig or self._signed_document, msg), True)
+
+    def verify_uncached(self, msg):
+        # type: (str) -> None
+        """
+        Verify without touching the cache, it is safe to call this from a worker thread.
+        Throws ValueError on failure
+        :param msg:
+        :return:
+        """
+        if self._sig:
+            verify_detached(self._sig, msg, self.vk)
+            return
+
         expected_msg = libnacl.crypto_sign_open(self._signed_document, self.vk)
         if expected_msg != msg:
             raise ValueError("Mismatch message")
 
 
 class TxBlock(ProtobufWrapper):
-    def __init__(self, x):
-        # type: (pb.TxBlock) -> None
+    _pb_type = pb.TxBlock
+
+    def __init__(self, x, raw=None):
+        # type: (pb.TxBlock, Optional[str]) -> None
         """
-        Convert a protobuf TxBlock into a TrustChain TxBlock
+        Convert a protobuf TxBlock into a TrustChain TxBlock.
+        The block must not be mutated after construction so that it can be shared without copying,
+        the validation state (other half, validity, etc.) is kept by `Chain`.
         :param x: 
+        :param raw: see ProtobufWrapper
         """
-        ProtobufWrapper.__init__(self, x)
+        ProtobufWrapper.__init__(self, x, raw)
         self.inner = self.pb.inner
         self.s = Signature(self.pb.s)
 
-        # properties below are not a part of hash
-        self.other_half = None
-        self.validity = VALIDITY_ENUM.Unknown
-        self.request_sent_r = -1  # a positive value indicate the round at which the request is sent
-
         # make sure the arguments of CompactBlock constructor are initialised, especially _tuple
         self.compact = CompactBlock.new(self.hash, self.prev, self.seq)
 
@@ -105,6 +173,71 @@ class TxBlock(ProtobufWrapper):
         s = Signature.new(vk, sk, libnacl.crypto_hash_sha256(inner.SerializeToString()))
         return cls(pb.TxBlock(inner=inner, s=s.pb))
 
+    @classmethod
+    def new_batch(cls, prev, seq, counterparty, ms, nonces, vk, sk):
+        # type: (str, int, str, List[str], List[str], str, str) -> List[TxBlock]
+        """
+        Create consecutive blocks with the same counterparty that share one signature over the root of the batch
+        :param prev: hash pointer of the block before the batch
+        :param seq: height of the first block
+        :param counterparty:
+        :param ms: messages of the blocks
+        :param nonces: nonces of the blocks, new ones are generated for the None entries
+        :param vk:
+        :param sk:
+        :return:
+        """
+        inners = []
+        for m, nonce in zip(ms, nonces):
+            if nonce is None:
+                nonce = libnacl.randombytes(32)
+            inner = pb.TxBlock.Inner(prev=prev, seq=seq, counterparty=counterparty, nonce=nonce, m=m)
+            inners.append(inner)
+            # the hash pointer of a batched block only covers its inner, see `hash`
+            prev = CompactBlock.new(libnacl.crypto_hash_sha256(inner.SerializeToString()), inner.prev, seq).hash
+            seq += 1
+
+        root = merkle_root([libnacl.crypto_hash_sha256(inner.SerializeToString()) for inner in inners])
+        return cls.from_batch(inners, Signature.new(vk, sk, root).pb)
+
+    @classmethod
+    def from_batch(cls, inners, s):
+        # type: (List[pb.TxBlock.Inner], pb.Signature) -> List[TxBlock]
+        """
+        Build the blocks of a batch, the result is deterministic so both sides of the batch store the same blocks
+        :param inners:
+        :param s: signature over the root of the batch
+        :return:
+        """
+        levels = merkle_levels([libnacl.crypto_hash_sha256(inner.SerializeToString()) for inner in inners])
+        return [cls(pb.TxBlock(inner=inner, s=s,
+                               batch=pb.TxBlock.Batch(index=i, size=len(inners), siblings=merkle_proof(levels, i))))
+                for i, inner in enumerate(inners)]
+
+    @property
+    def hash(self):
+        # type: () -> str
+        """
+        The signature of a batched block covers the prev pointers of the blocks after it,
+        so the hash (and thus the hash pointer) of a batched block only covers its inner to avoid a cycle.
+        The inner is authenticated by the batch signature through the Merkle proof.
+        """
+        if self._hash is None and self.pb.HasField('batch'):
+            self._hash = libnacl.crypto_hash_sha256(self.inner.SerializeToString())
+        return ProtobufWrapper.hash.fget(self)
+
+    @property
+    def signed_digest(self):
+        # type: () -> Optional[str]
+        """
+        :return: the digest that `s` signs, the root of the batch for batched blocks, None if the proof is malformed
+        """
+        digest = libnacl.crypto_hash_sha256(self.inner.SerializeToString())
+        if not self.pb.HasField('batch'):
+            return digest
+        b = self.pb.batch
+        return merkle_root_of_proof(digest, b.index, b.size, b.siblings)
+
     @property
     def seq(self):
         # type: () -> int
@@ -115,17 +248,31 @@ class TxBlock(ProtobufWrapper):
         # type: () -> str
         return self.inner.prev
 
-    def add_other_half(self, other_half):
-        # type: (TxBlock) -> ()
+    def verify_other_half(self, other_half):
+        # type: (TxBlock) -> None
+        """
+        Check that `other_half` is the counterparty's half of this tx, throws ValueError on bad signature.
+        :param other_half:
+        :return:
+        """
         assert self.inner.nonce == other_half.inner.nonce
         assert self.inner.m == other_half.inner.m
-        other_half.s.verify(self.inner.counterparty,
-                            libnacl.crypto_hash_sha256(other_half.inner.SerializeToString()))
-        self.other_half = other_half
+        digest = other_half.signed_digest
+        if digest is None:
+            raise ValueError("Malformed batch proof")
+        other_half.s.verify(self.inner.counterparty, digest)
 
 
-def _verify_signatures(data, ss, vks, t):
-    # type: (str, List[Signature], List[str], int) -> None
+def promoter_signatures(ss, vks, t):
+    # type: (List[Signature], List[str], int) -> List[Signature]
+    """
+    Filter the signatures that are made by promoters,
+    throws ValueError if there cannot be more than t valid ones.
+    :param ss:
+    :param vks:
+    :param t:
+    :return:
+    """
     _ss = [s for s in ss if s.vk in vks]  # only consider nodes that are promoters
 
     # validation will surely fail if these are not satisfied
@@ -135,6 +282,13 @@ def _verify_signatures(data, ss, vks, t):
     if not len(_ss) > t:
         raise ValueError("{} > {}, not satisfied".format(len(_ss), t))
 
+    return _ss
+
+
+def _verify_signatures(data, ss, vks, t):
+    # type: (str, List[Signature], List[str], int) -> None
+    _ss = promoter_signatures(ss, vks, t)
+
     oks = 0
     for _s in _ss:
         try:
@@ -142,6 +296,8 @@ def _verify_signatures(data, ss, vks, t):
             oks += 1
         except ValueError:
             logging.debug("one verification failed for {}".format(_s.vk))
+        if oks > t:
+            break
 
     if not oks > t:
         raise ValueError("verification failed, oks = {}, t = {}".format(oks, t))
@@ -154,16 +310,20 @@ class CpBlock(ProtobufWrapper):
     2, node receives some signatures
     3, generate the cp block
     """
-    def __init__(self, x):
-        ProtobufWrapper.__init__(self, x)
+    _pb_type = pb.CpBlock
+
+    def __init__(self, x, raw=None):
+        # type: (pb.CpBlock, Optional[str]) -> None
+        ProtobufWrapper.__init__(self, x, raw)
         self.inner = self.pb.inner
         self.s = Signature(self.pb.s)  # type: Signature
 
         self.compact = CompactBlock.new(self.hash, self.prev, self.seq)
+        self._luck = None
 
     @classmethod
-    def new(cls, prev, seq, cons, p, vk, sk, ss, vks, t):
-        # type: (str, int, Cons, int, str, str, List[Signature], List[str], int) -> pb.CpBlock
+    def new(cls, prev, seq, cons, p, vk, sk, ss, vks, t, merkle_root=''):
+        # type: (str, int, Cons, int, str, str, List[Signature], List[str], int, str) -> pb.CpBlock
         """
 
         :param prev: hash pointer to the previous block
@@ -175,9 +335,11 @@ class CpBlock(ProtobufWrapper):
         :param ss: signatures of the promoters, at least t-1 of them must be valid
         :param vks: all verification keys of promoters
         :param t:
+        :param merkle_root: Merkle root over the compact hashes of the blocks since the previous CP
         """
         assert p in (0, 1)
-        inner = pb.CpBlock.Inner(prev=prev, seq=seq, round=cons.round, cons_hash=cons.hash, ss=[s.pb for s in ss], p=p)
+        inner = pb.CpBlock.Inner(prev=prev, seq=seq, round=cons.round, cons_hash=cons.hash, ss=[s.pb for s in ss], p=p,
+                                 merkle_root=merkle_root)
 
         if cons.round != 0 or len(ss) != 0 or len(vks) != 0 or inner.seq != 0:
             _verify_signatures(inner.cons_hash, ss, vks, t)
@@ -191,7 +353,9 @@ class CpBlock(ProtobufWrapper):
     @property
     def luck(self):
         # type: () -> str
-        return libnacl.crypto_hash_sha256(self.hash + self.s.vk)
+        if self._luck is None:
+            self._luck = libnacl.crypto_hash_sha256(self.hash + self.s.vk)
+        return self._luck
 
     @property
     def seq(self):
@@ -210,38 +374,31 @@ class CpBlock(ProtobufWrapper):
 
 
 class CompactBlock(ProtobufWrapper):
-    def __init__(self, x):
-        # type: (pb.CompactBlock) -> None
-        ProtobufWrapper.__init__(self, x)
+    _pb_type = pb.CompactBlock
+
+    def __init__(self, x, raw=None):
+        # type: (pb.CompactBlock, Optional[str]) -> None
+        ProtobufWrapper.__init__(self, x, raw)
         self.digest = self.pb.inner.digest
         self.prev = self.pb.inner.prev
-
-        # NOTE: these will be mutated, so we use getter/setter
-        self._seq = self.pb.seq
-        self._agreed_round = self.pb.agreed_round
+        self.seq = self.pb.seq
+        self.agreed_round = self.pb.agreed_round
 
     @classmethod
     def new(cls, digest, prev, seq):
         # type: (str, str, int) -> pb.CompactBlock
         return cls(pb.CompactBlock(inner=pb.CompactBlock.Inner(digest=digest, prev=prev), seq=seq, agreed_round=-1))
 
-    @property
-    def seq(self):
-        return self._seq
-
-    @seq.setter
-    def seq(self, v):
-        self.pb.seq = v
-        self._seq = self.pb.seq
-
-    @property
-    def agreed_round(self):
-        return self._agreed_round
-
-    @agreed_round.setter
-    def agreed_round(self, v):
-        self.pb.agreed_round = v
-        self._agreed_round = self.pb.agreed_round
+    def with_agreed_round(self, r):
+        # type: (int) -> CompactBlock
+        """
+        Blocks may be shared, so instead of mutating we return a copy with the agreed round set
+        :param r:
+        :return:
+        """
+        res = CompactBlock(pb.CompactBlock(inner=self.pb.inner, seq=self.seq, agreed_round=r))
+        res._hash = self._hash
+        return res
 
     @property
     def hash(self):
@@ -255,15 +412,318 @@ class CompactBlock(ProtobufWrapper):
         return self._hash
 
 
+class CompactColumns(object):
+    """
+    Columnar storage of a contiguous run of compact blocks of one counterparty, starting at `base`.
+    A CompactBlock wrapper holds a protobuf, a cached serialization and a hash,
+    here we only keep fixed-width columns and build the wrappers on demand.
+    """
+    _W = 32  # width of digest, prev and hash
+    ROW_BYTES = 3 * _W + 4
+
+    def __init__(self, base):
+        # type: (int) -> None
+        self.base = base
+        self._digests = bytearray()
+        self._prevs = bytearray()
+        self._hashes = bytearray()
+        self._agreed_rounds = array('i')
+        self._agreed = []  # type: List[int]  sorted seqs that have an agreed round
+
+    @property
+    def end(self):
+        # type: () -> int
+        """
+        One past the last seq
+        """
+        return self.base + len(self._agreed_rounds)
+
+    def has(self, seq):
+        # type: (int) -> bool
+        return self.base <= seq < self.end
+
+    def agreed_round(self, seq):
+        # type: (int) -> int
+        return self._agreed_rounds[seq - self.base]
+
+    def _col(self, col, seq):
+        i = seq - self.base
+        return str(col[i * self._W:(i + 1) * self._W])
+
+    def put(self, b):
+        # type: (CompactBlock) -> bool
+        """
+        Store a compact block, it must be inside the run or right after it.
+        If it is already stored we only learn its agreed round.
+        :param b:
+        :return: True if something new is stored
+        """
+        seq = b.seq
+        if self.has(seq):
+            assert self._col(self._hashes, seq) == b.hash
+            if self.agreed_round(seq) == -1 and b.agreed_round != -1:
+                self._agreed_rounds[seq - self.base] = b.agreed_round
+                _insort_unique(self._agreed, seq)
+                return True
+            return False
+
+        assert seq == self.end
+        self._digests.extend(b.digest)
+        self._prevs.extend(b.prev)
+        self._hashes.extend(b.hash)
+        self._agreed_rounds.append(b.agreed_round)
+        if b.agreed_round != -1:
+            self._agreed.append(seq)
+        return True
+
+    def absorb(self, other):
+        # type: (CompactColumns) -> None
+        """
+        Append a run that overlaps with or directly follows this one
+        :param other:
+        :return:
+        """
+        assert self.base <= other.base <= self.end
+        for seq in xrange(other.base, min(self.end, other.end)):
+            self.put(other.get(seq))
+        if other.end <= self.end:
+            return
+        i = (self.end - other.base) * self._W
+        self._digests.extend(other._digests[i:])
+        self._prevs.extend(other._prevs[i:])
+        self._hashes.extend(other._hashes[i:])
+        first = self.end
+        self._agreed_rounds.extend(other._agreed_rounds[first - other.base:])
+        self._agreed.extend(seq for seq in other._agreed if seq >= first)
+
+    def agreed_before(self, seq):
+        # type: (int) -> int
+        """
+        :return: the nearest seq before `seq` with an agreed round, -1 if there is none in this run
+        """
+        i = bisect_left(self._agreed, seq)
+        return self._agreed[i - 1] if i > 0 else -1
+
+    def agreed_after(self, seq):
+        # type: (int) -> int
+        """
+        :return: the nearest seq after `seq` with an agreed round, -1 if there is none in this run
+        """
+        i = bisect_right(self._agreed, seq)
+        return self._agreed[i] if i < len(self._agreed) else -1
+
+    def get(self, seq):
+        # type: (int) -> Optional[CompactBlock]
+        if not self.has(seq):
+            return None
+        b = CompactBlock(pb.CompactBlock(inner=pb.CompactBlock.Inner(digest=self._col(self._digests, seq),
+                                                                     prev=self._col(self._prevs, seq)),
+                                         seq=seq, agreed_round=self.agreed_round(seq)))
+        b._hash = self._col(self._hashes, seq)
+        return b
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.get(i) for i in xrange(*item.indices(self.end))]
+        return self.get(item)
+
+    def __len__(self):
+        return len(self._agreed_rounds)
+
+    def __iter__(self):
+        for seq in xrange(self.base, self.end):
+            yield self.get(seq)
+
+
+class SparsePieces(object):
+    """
+    The verified pieces of one counterparty, as a sorted list of disjoint contiguous runs.
+    Unlike a list indexed by seq, the memory does not depend on how high the sequence numbers are.
+    """
+    def __init__(self):
+        self._bases = []  # type: List[int]
+        self._runs = []  # type: List[CompactColumns]
+        self.count = 0
+
+    def _run_of(self, seq):
+        # type: (int) -> Optional[CompactColumns]
+        i = bisect_right(self._bases, seq) - 1
+        if i >= 0 and self._runs[i].has(seq):
+            return self._runs[i]
+        return None
+
+    def has(self, seq):
+        # type: (int) -> bool
+        return self._run_of(seq) is not None
+
+    def put(self, compact_blocks):
+        # type: (List[CompactBlock]) -> bool
+        """
+        Store a contiguous list of compact blocks, merging the runs that it overlaps or touches.
+        :param compact_blocks:
+        :return: True if something new is stored
+        """
+        lo = compact_blocks[0].seq
+        hi = compact_blocks[-1].seq + 1
+
+        # the runs in [k, j) overlap or touch [lo, hi)
+        j = bisect_right(self._bases, hi)
+        k = j
+        while k > 0 and self._runs[k - 1].end >= lo:
+            k -= 1
+        touching = self._runs[k:j]
+
+        if touching and touching[0].base <= lo:
+            run = touching[0]
+            touching = touching[1:]
+        else:
+            run = CompactColumns(lo)
+
+        before = sum(len(r) for r in self._runs[k:j])
+        updated = False
+        for b in compact_blocks:
+            if b.seq >= run.end and touching and touching[0].base <= b.seq:
+                # the rest overlaps with the next run
+                run.absorb(touching.pop(0))
+            if run.put(b):
+                updated = True
+        for other in touching:
+            run.absorb(other)
+
+        self._bases[k:j] = [run.base]
+        self._runs[k:j] = [run]
+        self.count += len(run) - before
+        return updated
+
+    def agreed_range(self, seq):
+        # type: (int) -> List[CompactBlock]
+        """
+        Find the pieces between the nearest agreed blocks before and after `seq`,
+        they must all be in the cache.
+        :param seq:
+        :return: the pieces, or an empty list if they are not available
+        """
+        run = self._run_of(seq)
+        if run is None:
+            return []
+        a = run.agreed_before(seq)
+        b = run.agreed_after(seq)
+        if a == -1 or b == -1:
+            return []
+        return run[a:b + 1]
+
+    @property
+    def nbytes(self):
+        # type: () -> int
+        return self.count * CompactColumns.ROW_BYTES
+
+    def __iter__(self):
+        for run in self._runs:
+            for b in run:
+                yield b
+
+
+class PieceCache(object):
+    """
+    Verified pieces of every counterparty,
+    whole counterparties are evicted in least recently used order when the memory budget is exceeded.
+    """
+    def __init__(self, max_bytes=None):
+        # type: (Optional[int]) -> None
+        """
+        :param max_bytes: memory budget of the cached pieces, None means unbounded
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.evictions = 0
+        self._d = OrderedDict()  # type: OrderedDict
+
+    def put(self, vk, compact_blocks):
+        # type: (str, List[CompactBlock]) -> bool
+        pieces = self._d.pop(vk, None)
+        if pieces is None:
+            pieces = SparsePieces()
+        self._d[vk] = pieces
+
+        before = pieces.nbytes
+        updated = pieces.put(compact_blocks)
+        self.nbytes += pieces.nbytes - before
+
+        while self.max_bytes is not None and self.nbytes > self.max_bytes and len(self._d) > 1:
+            evicted_vk, evicted = self._d.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+            logging.debug("TC: evicted pieces of {}".format(encode_n(evicted_vk)))
+        return updated
+
+    def agreed_range(self, vk, seq):
+        # type: (str, int) -> List[CompactBlock]
+        pieces = self._d.get(vk)
+        if pieces is None:
+            return []
+        self._d[vk] = self._d.pop(vk)
+        return pieces.agreed_range(seq)
+
+    def __contains__(self, vk):
+        return vk in self._d
+
+    def __getitem__(self, vk):
+        # type: (str) -> SparsePieces
+        return self._d[vk]
+
+    def __len__(self):
+        return len(self._d)
+
+
+class LazyCpBlocks(object):
+    """
+    Read-only sequence of CpBlocks that are only decoded when they are accessed,
+    the items are either encoded CpBlocks or pb.CpBlock messages.
+    """
+    def __init__(self, items):
+        # type: (List[Union[str, pb.CpBlock]]) -> None
+        self._items = items
+        self._blocks = [None] * len(items)  # type: List[Optional[CpBlock]]
+
+    def _get(self, i):
+        # type: (int) -> CpBlock
+        b = self._blocks[i]
+        if b is None:
+            x = self._items[i]
+            b = CpBlock.from_string(x) if isinstance(x, str) else CpBlock(x)
+            self._blocks[i] = b
+        return b
+
+    @property
+    def decoded_count(self):
+        # type: () -> int
+        return sum(1 for b in self._blocks if b is not None)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._get(i) for i in xrange(*item.indices(len(self._items)))]
+        return self._get(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        for i in xrange(len(self._items)):
+            yield self._get(i)
+
+
 class Cons(ProtobufWrapper):
     """
     The consensus results, data structure that the promoters agree on
     """
     def __init__(self, x):
-        # type: (pb.Cons) -> None
+        # type: (Union[pb.Cons, pb.ConsView]) -> None
+        """
+        :param x: a ConsView leaves the CpBlocks encoded, they are decoded on access
+        """
         ProtobufWrapper.__init__(self, x)
         self.round = self.pb.round
-        self.blocks = [CpBlock(blk) for blk in self.pb.blocks]  # convert to TrustChain type
+        self.blocks = LazyCpBlocks(list(self.pb.blocks))  # convert to TrustChain type
         self._promoters = []
 
     @classmethod
@@ -277,12 +737,22 @@ class Cons(ProtobufWrapper):
         """
         return cls(pb.Cons(round=round, blocks=blocks))
 
+    @classmethod
+    def new_encoded(cls, round, blocks):
+        # type: (int, List[str]) -> Cons
+        """
+        Same as `new` but the checkpoint blocks are encoded, they stay encoded until they are accessed.
+        :param round: consensus round
+        :param blocks: list of encoded agreed checkpoint blocks
+        """
+        return cls(pb.ConsView(round=round, blocks=blocks))
+
     def get_promoters(self, n):
         # type: () -> List[str]
         if not self._promoters:
-            registered = [cp for cp in self.blocks if cp.inner.p == 1]
-            registered.sort(key=lambda x: x.luck)
-            self._promoters = [b.s.vk for b in registered][:n]
+            # only the n luckiest are needed, so avoid sorting all of them
+            registered = (cp for cp in self.blocks if cp.inner.p == 1)
+            self._promoters = [b.s.vk for b in heapq.nsmallest(n, registered, key=lambda x: x.luck)]
         return self._promoters
 
     @property
@@ -298,22 +768,237 @@ def generate_genesis_block(vk, sk):
     return CpBlock.new(prev, 0, cons, 1, vk, sk, [], [], 0)
 
 
+class TxTracker(object):
+    """
+    Incrementally tracks the validation state of the TXs in a Chain,
+    so that finding pending TXs costs time proportional to the pending work and not to the chain length.
+    A TX is pending (unknown) when it has its other half but its validity is still unknown.
+    """
+    def __init__(self):
+        self._unknown = []  # type: List[int]
+        self._unknown_by_counterparty = defaultdict(list)  # type: Dict[str, List[int]]
+        self._validated = []  # type: List[int]
+        self._forgotten = 0  # number of validated TXs that are archived
+
+    def add_unknown(self, seq, counterparty):
+        # type: (int, str) -> None
+        _insort_unique(self._unknown, seq)
+        _insort_unique(self._unknown_by_counterparty[counterparty], seq)
+
+    def settle(self, seq, counterparty):
+        # type: (int, str) -> None
+        """
+        Move a TX out of the pending set once its validity is known
+        :param seq:
+        :param counterparty:
+        :return:
+        """
+        _remove_sorted(self._unknown, seq)
+        bucket = self._unknown_by_counterparty.get(counterparty)
+        if bucket is not None:
+            _remove_sorted(bucket, seq)
+            if not bucket:
+                del self._unknown_by_counterparty[counterparty]
+        self._validated.append(seq)
+
+    def unknown_seqs(self, max_seq=None, counterparty=None):
+        # type: (Optional[int], Optional[str]) -> List[int]
+        """
+        :param max_seq: only return sequence numbers strictly lower than this
+        :param counterparty: only return TXs made with this counterparty
+        :return: sorted sequence numbers of the pending TXs
+        """
+        if counterparty is None:
+            seqs = self._unknown
+        else:
+            seqs = self._unknown_by_counterparty.get(counterparty, [])
+        if max_seq is None:
+            return list(seqs)
+        return seqs[:bisect_left(seqs, max_seq)]
+
+    def unknown_between(self, lo, hi):
+        # type: (int, int) -> List[int]
+        """
+        :return: sorted sequence numbers of the pending TXs in [lo, hi)
+        """
+        return self._unknown[bisect_left(self._unknown, lo):bisect_left(self._unknown, hi)]
+
+    def validated_seqs(self):
+        # type: () -> List[int]
+        return sorted(self._validated)
+
+    def forget_before(self, seq):
+        # type: (int) -> None
+        """
+        Stop tracking the validated TXs before `seq`, they are still counted in `validated_count`
+        :param seq:
+        :return:
+        """
+        kept = [s for s in self._validated if s >= seq]
+        self._forgotten += len(self._validated) - len(kept)
+        self._validated = kept
+
+    @property
+    def unknown_count(self):
+        # type: () -> int
+        return len(self._unknown)
+
+    @property
+    def validated_count(self):
+        # type: () -> int
+        return len(self._validated) + self._forgotten
+
+
+def _insort_unique(xs, x):
+    i = bisect_left(xs, x)
+    if i == len(xs) or xs[i] != x:
+        xs.insert(i, x)
+
+
+def _remove_sorted(xs, x):
+    i = bisect_left(xs, x)
+    if i < len(xs) and xs[i] == x:
+        del xs[i]
+
+
+def _decode_block(kind, data):
+    # type: (int, str) -> Union[TxBlock, CpBlock]
+    if kind == KIND_TX:
+        return TxBlock(pb.TxBlock.FromString(data))
+    return CpBlock(pb.CpBlock.FromString(data))
+
+
+def open_segment_store(directory, **kwargs):
+    # type: (str, ...) -> SegmentStore
+    """
+    Open (or create) an on-disk block store for Chain in `directory`,
+    the keyword arguments are passed to SegmentStore.
+    :param directory:
+    :return:
+    """
+    return SegmentStore(directory, _decode_block, CompactBlock.new, **kwargs)
+
+
 class Chain(object):
-    def __init__(self, vk, sk):
-        # type: (str, str) -> None
+    def __init__(self, vk, sk, store=None):
+        # type: (str, str, Optional[Union[MemoryStore, SegmentStore]]) -> None
+        """
+        :param vk:
+        :param sk:
+        :param store: where the blocks are kept, in memory by default.
+        A non-empty store (e.g. an existing SegmentStore) is reopened as it is, along with the validation state.
+        """
         self.vk = vk
-        self.chain = [generate_genesis_block(vk, sk)]  # type: List[Union[CpBlock, TxBlock]]
+        self.chain = MemoryStore() if store is None else store  # type: Union[MemoryStore, SegmentStore]
+        if len(self.chain) == 0:
+            self.chain.append_block(generate_genesis_block(vk, sk), KIND_CP)
+        assert self.chain[0].s.vk == vk, "the store holds the chain of another key"
         self._tx_count = 0
         self._cp_count = 0
-        self.latest_cp = self.chain[0]
+
+        # positions of the CpBlocks, kept sorted because CPs are only ever appended
+        self._cp_seqs = []  # type: List[int]
+        self._round_to_seq = {}  # type: Dict[int, int]
+
+        self._tracker = TxTracker()
+        self._merkle_levels = LRUCache(64)  # key: seq of a CP, val: levels of its Merkle tree
+
+        # mutable validation state of the TXs, keyed by seq, the blocks themselves are never mutated
+        self._other_halves = {}  # type: Dict[int, TxBlock]
+        self._validity = {}  # type: Dict[int, VALIDITY_ENUM]
+        self._request_sent_r = {}  # type: Dict[int, int]
+
+        # TXs that are not Valid or Invalid yet, including the ones that do not have their other half
+        self._unsettled = []  # type: List[int]
+
+        # compact form of the pruned prefix of the chain, only the TX blocks of the prefix are dropped
+        self._archive = CompactColumns(0)
+        self._archived_invalid = set()  # type: Set[int]
+
+        for seq in xrange(len(self.chain)):
+            if self.chain.kind(seq) == KIND_CP:
+                self._cp_seqs.append(seq)
+                self._round_to_seq[self.chain[seq].round] = seq
+                self._cp_count += 1
+            else:
+                self._tx_count += 1
+                self._unsettled.append(seq)
+        self._cp_count -= 1  # the genesis block is not counted
+        self.latest_cp = self.chain[self._cp_seqs[-1]]
+
+        # restore the validation state of a reopened store, it is logged in add_other_half and set_validity
+        for kind, seq, data in self.chain.states():
+            if kind == STATE_OTHER_HALF:
+                self._put_other_half(seq, TxBlock.from_string(data))
+            elif kind == STATE_VALIDITY:
+                self._settle(seq, VALIDITY_ENUM(ord(data)))
+        for seq in self._unsettled:
+            self.chain.pin(seq)
 
     def new_tx(self, tx):
         # type: (TxBlock) -> None
         assert tx.prev == self.chain[-1].compact.hash
         assert tx.seq == self.chain[-1].seq + 1
 
-        self.chain.append(tx)
+        self.chain.append_block(tx, KIND_TX)
         self._tx_count += 1
+        self._unsettled.append(tx.seq)
+
+        # keep it in memory until it is validated
+        self.chain.pin(tx.seq)
+
+    def add_other_half(self, seq, other_half):
+        # type: (int, TxBlock) -> None
+        """
+        Attach the counterparty's half to the tx block at `seq`, it becomes pending for validation.
+        :param seq:
+        :param other_half:
+        :return:
+        """
+        tx = self.chain[seq]
+        assert isinstance(tx, TxBlock)
+        tx.verify_other_half(other_half)
+        self._put_other_half(seq, other_half)
+        self.chain.log_state(STATE_OTHER_HALF, seq, other_half.SerializeToString())
+
+    def _put_other_half(self, seq, other_half):
+        # type: (int, TxBlock) -> None
+        self._other_halves[seq] = other_half
+        if self.validity(seq) == VALIDITY_ENUM.Unknown:
+            self._tracker.add_unknown(seq, self.chain[seq].inner.counterparty)
+
+    def other_half(self, seq):
+        # type: (int) -> Optional[TxBlock]
+        return self._other_halves.get(seq)
+
+    def validity(self, seq):
+        # type: (int) -> VALIDITY_ENUM
+        v = self._validity.get(seq)
+        if v is not None:
+            return v
+        if seq < self._archive.end:
+            # only settled TXs are archived
+            return VALIDITY_ENUM.Invalid if seq in self._archived_invalid else VALIDITY_ENUM.Valid
+        return VALIDITY_ENUM.Unknown
+
+    def request_sent_r(self, seq):
+        # type: (int) -> int
+        """
+        :param seq:
+        :return: the round at which the validation request is sent, -1 if it is not sent
+        """
+        return self._request_sent_r.get(seq, -1)
+
+    def set_request_sent(self, seq, r):
+        # type: (int, int) -> None
+        """
+        Record the round `r` at which the validation request for the tx block at `seq` is sent.
+        :param seq:
+        :param r:
+        :return:
+        """
+        assert self.is_tx(seq)
+        self._request_sent_r[seq] = r
 
     def new_cp(self, cp):
         # type: (CpBlock) -> None
@@ -324,19 +1009,55 @@ class Chain(object):
         assert prev_cp.inner.round < cp.inner.round, \
             "prev round {}, curr round {}, len {}".format(prev_cp, cp, len(self.chain))
 
-        self.chain.append(cp)
+        self.chain.append_block(cp, KIND_CP)
         self._cp_count += 1
 
         self.latest_cp = cp
+        self._cp_seqs.append(cp.seq)
+        self._round_to_seq[cp.round] = cp.seq
+
+    def interval_merkle_levels(self, seq):
+        # type: (int) -> List[List[str]]
+        """
+        Merkle tree over the compact hashes of the blocks after the last CP before `seq`, up to but excluding `seq`.
+        If `seq` is a CP, this is the tree that it commits to.
+        :param seq:
+        :return: see `merkle_levels`
+        """
+        levels = self._merkle_levels.get(seq)
+        if levels is None:
+            prev_cp = next(self.cps_before(seq))
+            levels = merkle_levels([b.hash for b in self.compacts(prev_cp.seq + 1, seq)])
+            if seq < len(self.chain):
+                self._merkle_levels.put(seq, levels)
+        return levels
 
     def get_cp_of_round(self, r):
         # type: (int) -> Optional[CpBlock]
-        # TODO an optimisation would be to begin from the back side if 'r' is large
-        for block in self.chain:
-            if isinstance(block, CpBlock):
-                if block.round == r:
-                    return block
-        return None
+        seq = self._round_to_seq.get(r)
+        if seq is None:
+            return None
+        return self.chain[seq]
+
+    def cps_before(self, seq):
+        # type: (int) -> Iterator[CpBlock]
+        """
+        Iterate over the CpBlocks that come before `seq`, nearest first
+        :param seq:
+        :return:
+        """
+        for i in xrange(bisect_left(self._cp_seqs, seq) - 1, -1, -1):
+            yield self.chain[self._cp_seqs[i]]
+
+    def cps_after(self, seq):
+        # type: (int) -> Iterator[CpBlock]
+        """
+        Iterate over the CpBlocks that come after `seq`, nearest first
+        :param seq:
+        :return:
+        """
+        for i in xrange(bisect_right(self._cp_seqs, seq), len(self._cp_seqs)):
+            yield self.chain[self._cp_seqs[i]]
 
     @property
     def latest_compact_hash(self):
@@ -380,7 +1101,21 @@ class Chain(object):
             return []
 
         # the height (h) should always be correct, since it is checked when adding new CP
-        return [b.compact for b in self.chain[c_a.seq:c_b.seq + 1]]
+        return self.compacts(c_a.seq, c_b.seq + 1)
+
+    def compacts(self, lo, hi):
+        # type: (int, int) -> List[CompactBlock]
+        """
+        :return: the compact form of the blocks in the range [lo, hi), archived or not
+        """
+        mid = max(lo, min(hi, self._archive.end))
+        res = self._archive[lo:mid]
+        res.extend(self.chain.compacts(mid, hi))
+        return res
+
+    def is_tx(self, seq):
+        # type: (int) -> bool
+        return self.chain.kind(seq) == KIND_TX
 
     def _enclosure(self, seq):
         # type: (int) -> Tuple[CpBlock, CpBlock]
@@ -389,22 +1124,10 @@ class Chain(object):
         :param seq: the sequence number of interest, must be a TX block
         :return: (CpBlock, CpBlock)
         """
-        tx = self.chain[seq]
-        assert isinstance(tx, TxBlock)
+        assert self.is_tx(seq)
 
-        cp_a = cp_b = None
-
-        for i in xrange(seq - 1, -1, -1):
-            cp = self.chain[i]
-            if isinstance(cp, CpBlock):
-                cp_a = cp
-                break
-
-        for i in xrange(seq + 1, len(self.chain)):
-            cp = self.chain[i]
-            if isinstance(cp, CpBlock):
-                cp_b = cp
-                break
+        cp_a = next(self.cps_before(seq), None)
+        cp_b = next(self.cps_after(seq), None)
 
         return cp_a, cp_b
 
@@ -416,22 +1139,100 @@ class Chain(object):
         :param validity: 
         :return: 
         """
-        tx = self.chain[seq]
-        assert isinstance(tx, TxBlock)
+        assert self.is_tx(seq)
         assert validity != VALIDITY_ENUM.Unknown
 
-        if tx.validity == VALIDITY_ENUM.Unknown:
-            tx.validity = validity
+        if self.validity(seq) == VALIDITY_ENUM.Unknown:
+            self._settle(seq, validity)
+            self.chain.log_state(STATE_VALIDITY, seq, chr(validity.value))
 
-    def get_unknown_txs(self):
-        # type: () -> List[TxBlock]
+    def _settle(self, seq, validity):
+        # type: (int, VALIDITY_ENUM) -> None
+        self._validity[seq] = validity
+        self._request_sent_r.pop(seq, None)  # only needed while the tx is pending
+        self._tracker.settle(seq, self.chain[seq].inner.counterparty)
+        _remove_sorted(self._unsettled, seq)
+        self.chain.unpin(seq)
+
+    @property
+    def first_unsettled(self):
+        # type: () -> int
+        """
+        :return: seq of the first TX that is neither Valid nor Invalid, the chain length if there is none
+        """
+        return self._unsettled[0] if self._unsettled else len(self.chain)
+
+    def prune(self, hi):
+        # type: (int) -> int
+        """
+        Archive the blocks before the CP at `hi`, every TX before it must be Valid or Invalid.
+        The TX blocks, their other halves and their validation state are dropped,
+        only their compact form stays so that the pieces can still be served.
+        The CP blocks stay in the chain, there are few of them and they are needed to find enclosures.
+        :param hi: seq of a CpBlock
+        :return: the number of newly archived blocks
+        """
+        assert self.chain.kind(hi) == KIND_CP
+        assert hi <= self.first_unsettled
+
+        lo = self._archive.end
+        if hi <= lo:
+            return 0
+
+        for b in self.chain.compacts(lo, hi):
+            self._archive.put(b)
+
+        for seq in xrange(lo, hi):
+            if self.chain.kind(seq) == KIND_TX:
+                if self._validity.pop(seq) == VALIDITY_ENUM.Invalid:
+                    self._archived_invalid.add(seq)
+                self._other_halves.pop(seq, None)
+                self.chain.drop(seq)
+        self._tracker.forget_before(hi)
+
+        logging.debug("TC: archived blocks [{}, {})".format(lo, hi))
+        return hi - lo
+
+    @property
+    def resident_count(self):
+        # type: () -> int
+        """
+        :return: number of full blocks in memory
+        """
+        return self.chain.resident_count
+
+    @property
+    def archived_count(self):
+        # type: () -> int
+        """
+        :return: number of blocks that are only kept in the compact form
+        """
+        return len(self._archive)
+
+    @property
+    def archived_nbytes(self):
+        # type: () -> int
+        return len(self._archive) * CompactColumns.ROW_BYTES
+
+    def get_unknown_txs(self, max_seq=None, counterparty=None):
+        # type: (Optional[int], Optional[str]) -> List[TxBlock]
         """
-        Return a list of TXs which have unknown validity
+        Return a list of TXs which have unknown validity, ordered by sequence number
+        :param max_seq: only consider TXs with a sequence number lower than this
+        :param counterparty: only consider TXs made with this counterparty
         :return: 
         """
-        def _is_valid(b):
-            return isinstance(b, TxBlock) and b.validity == VALIDITY_ENUM.Unknown and b.other_half is not None
-        return filter(_is_valid, self.chain)
+        return [self.chain[seq] for seq in self._tracker.unknown_seqs(max_seq, counterparty)]
+
+    def get_unknown_between(self, lo, hi):
+        # type: (int, int) -> List[TxBlock]
+        """
+        Same as `get_unknown_txs` but only for the sequence numbers in [lo, hi), in time proportional to the result
+        :param lo:
+        :param hi:
+        :return:
+        """
+        return [self.chain[seq] for seq in self._tracker.unknown_between(lo, hi)]
 
     def get_validated_txs(self):
         # type: () -> List[TxBlock]
@@ -439,15 +1240,23 @@ class Chain(object):
         Opposite of `get_unknown_txs`
         :return: 
         """
-        return filter(lambda b: isinstance(b, TxBlock) and b.validity != VALIDITY_ENUM.Unknown, self.chain)
+        return [self.chain[seq] for seq in self._tracker.validated_seqs()]
+
+    @property
+    def unknown_count(self):
+        # type: () -> int
+        return self._tracker.unknown_count
+
+    @property
+    def validated_count(self):
+        # type: () -> int
+        return self._tracker.validated_count
 
     def compute_latest_cp(self):
         # type: () -> CpBlock
-        for i in xrange(len(self.chain) - 1, -1, -1):
-            b = self.chain[i]
-            if isinstance(b, CpBlock):
-                return b
-        raise ValueError("No CpBlock in Chain")
+        if not self._cp_seqs:
+            raise ValueError("No CpBlock in Chain")
+        return self.chain[self._cp_seqs[-1]]
 
 
 class TrustChain(object):
@@ -458,12 +1267,41 @@ class TrustChain(object):
     We assume there's a keyserver, so public keys (vk) of all nodes are available to us.
     """
 
-    def __init__(self):
-        # type: () -> None
-        self.vk, self._sk = libnacl.crypto_sign_keypair()
-        self._other_chains = {}  # type: Dict[str, GrowingList]
-        self.my_chain = Chain(self.vk, self._sk)
+    def __init__(self, store=None, piece_cache_bytes=64 * 1024 * 1024, n_promoters=None, merkle_roots=False):
+        # type: (Optional[Union[MemoryStore, SegmentStore]], Optional[int], Optional[int], bool) -> None
+        """
+        :param store: block storage for my chain, see `Chain`, a reopened store keeps its key pair
+        :param piece_cache_bytes: memory budget for the verified pieces of the counterparties
+        :param n_promoters: number of promoters per round, needed by `promoters_of_round`
+        :param merkle_roots: commit to a Merkle root in every new CP so that `merkle_proof` can answer,
+        see `verify_tx_proof` for what such a proof does not show
+        """
+        keypair = None if store is None else store.keypair()
+        if keypair is None:
+            keypair = libnacl.crypto_sign_keypair()
+            if store is not None:
+                store.save_keypair(*keypair)
+        self.vk, self._sk = keypair
+        self._other_chains = PieceCache(piece_cache_bytes)
+        self.my_chain = Chain(self.vk, self._sk, store)
         self.consensus = {}  # type: Dict[int, Cons]
+
+        # indices over the stored consensus results, filled in new_cp
+        self._cons_hashes = {}  # type: Dict[int, Set[str]]
+        self._cons_compact_hashes = {}  # type: Dict[int, Set[str]]
+        self._cp_hash_to_round = {}  # type: Dict[str, int]
+        self._compact_hash_to_round = {}  # type: Dict[str, int]
+        self._compact_hash_to_vk = {}  # type: Dict[str, str]
+
+        self._n_promoters = n_promoters
+        self._merkle_roots = merkle_roots
+        self._promoters = {}  # type: Dict[int, List[str]]
+
+        # consensus results of a reopened store, they are logged in new_cp
+        for kind, r, data in self.my_chain.chain.states():
+            if kind == STATE_CONS:
+                self._store_cons(Cons(pb.ConsView.FromString(data)))
+
         logging.info("TC: my VK is {}".format(b64encode(self.vk)))
 
     def new_tx(self, counterparty, m, nonce=None):
@@ -478,6 +1316,23 @@ class TrustChain(object):
         tx = TxBlock.new(self.latest_compact_hash, self.next_seq, counterparty, m, self.vk, self._sk, nonce)
         self._new_tx(tx)
 
+    def new_tx_batch(self, counterparty, ms, nonces=None):
+        # type: (str, List[str], Optional[List[str]]) -> List[TxBlock]
+        """
+        Same as calling `new_tx` for every message, but the blocks are signed once as a batch
+        :param counterparty:
+        :param ms:
+        :param nonces:
+        :return: the new blocks
+        """
+        if nonces is None:
+            nonces = [None] * len(ms)
+        txs = TxBlock.new_batch(self.latest_compact_hash, self.next_seq, counterparty, ms, nonces,
+                                self.vk, self._sk)
+        for tx in txs:
+            self._new_tx(tx)
+        return txs
+
     def _new_tx(self, tx):
         # type: (TxBlock) -> None
         """
@@ -485,7 +1340,7 @@ class TrustChain(object):
         :return: None
         """
         assert tx.seq == self.next_seq, "{} != {}".format(tx.seq, self.next_seq)
-        self.my_chain.new_tx(copy.deepcopy(tx))
+        self.my_chain.new_tx(tx)
 
     def new_cp(self, p, cons, ss, vks, t):
         # type: (int, Cons, List[Signature], List[str], int) -> None
@@ -498,10 +1353,112 @@ class TrustChain(object):
         :param t:
         :return:
         """
+        self._store_cons(cons)
+        self.my_chain.chain.log_state(STATE_CONS, cons.round, cons.SerializeToString())
+        root = ''
+        if self._merkle_roots:
+            root = merkle_root_of_levels(self.my_chain.interval_merkle_levels(self.next_seq))
+        cp = CpBlock.new(self.latest_compact_hash, self.next_seq, cons, p, self.vk, self._sk, ss, vks, t, root)
+        self._new_cp(cp)
+
+    def _store_cons(self, cons):
+        # type: (Cons) -> None
         assert cons.round not in self.consensus
         self.consensus[cons.round] = cons
-        cp = CpBlock.new(self.latest_compact_hash, self.next_seq, cons, p, self.vk, self._sk, ss, vks, t)
-        self._new_cp(cp)
+        self._index_cons(cons)
+
+    def _index_cons(self, cons):
+        # type: (Cons) -> None
+        """
+        Record the hashes of the CPs in `cons`,
+        a CP may be agreed in more than one round, we keep the earliest one.
+        :param cons:
+        :return:
+        """
+        hashes = set()
+        compact_hashes = set()
+        for b in cons.blocks:
+            hashes.add(b.hash)
+            compact_hashes.add(b.compact.hash)
+            self._cp_hash_to_round.setdefault(b.hash, cons.round)
+            self._compact_hash_to_round.setdefault(b.compact.hash, cons.round)
+            self._compact_hash_to_vk[b.compact.hash] = b.s.vk
+        self._cons_hashes[cons.round] = hashes
+        self._cons_compact_hashes[cons.round] = compact_hashes
+
+        if self._n_promoters is not None:
+            self._promoters[cons.round] = cons.get_promoters(self._n_promoters)
+
+    def promoters_of_round(self, r):
+        # type: (int) -> List[str]
+        """
+        :param r: a round that we have the consensus result of
+        :return: the promoters that are selected by the consensus result of round `r`
+        """
+        assert self._n_promoters is not None
+        promoters = self._promoters.get(r)
+        if promoters is None:
+            promoters = self.consensus[r].get_promoters(self._n_promoters)
+            self._promoters[r] = promoters
+        return promoters
+
+    def _drop_cons(self, r):
+        # type: (int) -> None
+        """
+        Remove the consensus result of round `r` and its entries in the indices,
+        except the rounds of my own CPs, which are needed to serve the pieces of any of my TXs.
+        :param r:
+        :return:
+        """
+        cons = self.consensus.pop(r)
+        del self._cons_hashes[r]
+        del self._cons_compact_hashes[r]
+        self._promoters.pop(r, None)
+        for b in cons.blocks:
+            if self._cp_hash_to_round.get(b.hash) == r and b.s.vk != self.vk:
+                del self._cp_hash_to_round[b.hash]
+            if self._compact_hash_to_round.get(b.compact.hash) == r:
+                del self._compact_hash_to_round[b.compact.hash]
+                del self._compact_hash_to_vk[b.compact.hash]
+
+    def prune(self, cons_retention=None):
+        # type: (Optional[int]) -> int
+        """
+        Archive the prefix of my chain up to the latest agreed CP before which every TX is settled,
+        then drop the consensus results that are older than the retention window and not needed anymore,
+        see `_oldest_needed_round`. The rounds of my own CPs stay indexed, see `_drop_cons`.
+        Consensus results are dropped after archiving because archiving needs to know which CPs are agreed.
+        :param cons_retention: number of recent rounds to keep, None to keep all of them
+        :return: the number of newly archived blocks
+        """
+        archived = 0
+        for cp in self.my_chain.cps_before(self.my_chain.first_unsettled + 1):
+            if cp.seq <= self.my_chain.archived_count:
+                break
+            if self.consensus_round_of_cp(cp) != -1:
+                archived = self.my_chain.prune(cp.seq)
+                break
+
+        if cons_retention is not None:
+            assert cons_retention > 0
+            oldest = min(self.latest_round - cons_retention + 1, self._oldest_needed_round())
+            for r in [r for r in self.consensus if r < oldest]:
+                self._drop_cons(r)
+
+        return archived
+
+    def _oldest_needed_round(self):
+        # type: () -> int
+        """
+        The counterparties enclose the other halves of my pending TXs in CPs that are agreed
+        in about the same rounds as mine, the consensus results of these rounds are needed to verify them.
+        :return: the round in which the agreed CP before my first unsettled TX is agreed, -1 if there is none
+        """
+        for cp in self.my_chain.cps_before(self.my_chain.first_unsettled):
+            r = self.consensus_round_of_cp(cp)
+            if r != -1:
+                return r
+        return -1
 
     def _new_cp(self, cp):
         # type: (CpBlock) -> None
@@ -511,7 +1468,7 @@ class TrustChain(object):
         :return: None
         """
         assert cp.seq == len(self.my_chain.chain)
-        self.my_chain.new_cp(copy.deepcopy(cp))
+        self.my_chain.new_cp(cp)
 
     @property
     def next_seq(self):
@@ -561,18 +1518,31 @@ class TrustChain(object):
         :return: 
         """
         assert isinstance(cp, CpBlock)
-        for r in range(cp.round, self.my_chain.latest_round + 1):
-            if r in self.consensus:
-                if any(map(lambda b: b.hash == cp.hash, self.consensus[r].blocks)):
-                    return r
-        return -1
+        return self._cp_hash_to_round.get(cp.hash, -1)
 
-    def compact_cp_in_consensus(self, cp, r):
-        # type: (CompactBlock) -> bool
-        if r not in self.consensus:
+    def consensus_round_of_compact_cp(self, cp):
+        # type: (CompactBlock) -> int
+        """
+        Same as `consensus_round_of_cp` but for the compact form
+        :param cp:
+        :return:
+        """
+        assert isinstance(cp, CompactBlock)
+        return self._compact_hash_to_round.get(cp.hash, -1)
+
+    def compact_cp_in_consensus(self, cp, r, vk=None):
+        # type: (CompactBlock, int, Optional[str]) -> bool
+        """
+        :param cp:
+        :param r:
+        :param vk: if set, the CP must also be signed by `vk`, i.e. it is in the chain of `vk`
+        :return: True if `cp` is agreed in round `r`
+        """
+        if r not in self._cons_compact_hashes:
+            return False
+        if cp.hash not in self._cons_compact_hashes[r]:
             return False
-        cons = self.consensus[r]
-        return any(map(lambda b: b.compact.hash == cp.hash, cons.blocks))
+        return vk is None or self._compact_hash_to_vk.get(cp.hash) == vk
 
     def pieces(self, seq):
         # type: (int) -> List[CompactBlock]
@@ -585,11 +1555,32 @@ class TrustChain(object):
             return []
 
         # the height (h) should always be correct, since it is checked when adding new CP
-        blocks = [b.compact for b in self.my_chain.chain[c_a.seq:c_b.seq + 1]]
-        blocks[0].agreed_round = r_a
-        blocks[-1].agreed_round = r_b
+        blocks = self.my_chain.compacts(c_a.seq, c_b.seq + 1)
+        blocks[0] = blocks[0].with_agreed_round(r_a)
+        blocks[-1] = blocks[-1].with_agreed_round(r_b)
         return blocks
 
+    def agreed_segments(self, seqs):
+        # type: (List[int]) -> List[List[CompactBlock]]
+        """
+        The union of the agreed pieces of many TXs, TXs in the same agreed segment share it.
+        Sequence numbers that are not TXs are ignored.
+        :param seqs:
+        :return: the segments ordered by sequence number, each of them is the result of `agreed_pieces`
+        """
+        segments = []
+        lo = hi = -1
+        for seq in sorted(set(seqs)):
+            if lo < seq < hi:
+                continue
+            if not 0 <= seq < len(self.my_chain.chain) or not self.my_chain.is_tx(seq):
+                continue
+            blocks = self.agreed_pieces(seq)
+            if blocks:
+                segments.append(blocks)
+                lo, hi = blocks[0].seq, blocks[-1].seq
+        return segments
+
     def _agreed_enclosure(self, seq):
         # type: (int) -> Tuple[Optional[CpBlock], Optional[CpBlock], int, int]
         """
@@ -601,79 +1592,107 @@ class TrustChain(object):
         :return: 
         """
 
-        tx = self.my_chain.chain[seq]
-        assert isinstance(tx, TxBlock)
+        assert self.my_chain.is_tx(seq)
 
         cp_a = cp_b = None
         r_a = r_b = -1
 
-        for i in xrange(seq - 1, -1, -1):
-            cp = self.my_chain.chain[i]
-            if isinstance(cp, CpBlock):
-                r_a = self.consensus_round_of_cp(cp)
-                if r_a != -1:
-                    cp_a = cp
-                    break
-
-        for i in xrange(seq + 1, len(self.my_chain.chain)):
-            cp = self.my_chain.chain[i]
-            if isinstance(cp, CpBlock):
-                r_b = self.consensus_round_of_cp(cp)
-                if r_b != -1:
-                    cp_b = cp
-                    break
+        for cp in self.my_chain.cps_before(seq):
+            r_a = self.consensus_round_of_cp(cp)
+            if r_a != -1:
+                cp_a = cp
+                break
+
+        for cp in self.my_chain.cps_after(seq):
+            r_b = self.consensus_round_of_cp(cp)
+            if r_b != -1:
+                cp_b = cp
+                break
 
         return cp_a, cp_b, r_a, r_b
 
-    def load_cache_for_verification(self, seq):
-        # type: (int) -> List[CompactBlock]
+    def merkle_proof(self, seq):
+        # type: (int) -> Optional[pb.MerkleProof]
         """
-        Check that we can verify using cached results, 
-        :param seq: 
-        :return: 
+        Prove that the tx at `seq` is committed to by the first CP after it,
+        the proof size is logarithmic in the number of blocks between the CPs.
+        :param seq:
+        :return: the proof, or None if the CP is not agreed yet or does not have a Merkle root
         """
+        assert self.my_chain.is_tx(seq)
+        cp_a, cp_b = self.my_chain._enclosure(seq)
+        if cp_a is None or cp_b is None or not cp_b.inner.merkle_root:
+            return None
+
+        r_b = self.consensus_round_of_cp(cp_b)
+        if r_b == -1:
+            return None
+
+        levels = self.my_chain.interval_merkle_levels(cp_b.seq)
+        index = seq - cp_a.seq - 1
+        leaf = self.my_chain.compacts(seq, seq + 1)[0]
+        return pb.MerkleProof(cp=cp_b.pb, agreed_round=r_b, leaf=leaf.pb, index=index, size=len(levels[0]),
+                              siblings=merkle_proof(levels, index))
+
+    def verify_tx_proof(self, seq, proof):
+        # type: (int, pb.MerkleProof) -> VALIDITY_ENUM
+        """
+        Verify one of our own TX using a Merkle proof from the counterparty,
+        the alternative to `verify_tx` when the counterparty responds in the Merkle mode.
+
+        NOTE: this is a weaker trust model than `verify_tx`.
+        The consensus only agrees on the hash of the CP, nobody checks that its Merkle root is computed over
+        the blocks that are actually hash-linked between the CPs.
+        So a proof shows that the counterparty committed to its half in an agreed CP,
+        but not that the half is in its chain, a Byzantine counterparty can leave it out of the chain.
+        Only `verify_tx` proves that, the Merkle mode must be enabled explicitly (see `merkle_roots`).
+        :param seq:
+        :param proof:
+        :return:
+        """
+        # e.g. a late response, the TX may already be archived
+        validity = self.my_chain.validity(seq)
+        if validity != VALIDITY_ENUM.Unknown:
+            return validity
+
         tx = self.my_chain.chain[seq]
+        other_half = self.my_chain.other_half(seq)
         assert isinstance(tx, TxBlock)
-        assert tx.other_half is not None
-
-        if tx.inner.counterparty not in self._other_chains:
-            return []
-
-        blocks_cache = self._other_chains[tx.inner.counterparty]
-        other_seq = tx.other_half.seq
+        assert other_half is not None
 
-        if len(blocks_cache) <= other_seq:
-            return []
+        cp = CpBlock(proof.cp)
+        leaf = CompactBlock(proof.leaf)
 
-        if blocks_cache[other_seq] is None:
-            return []
-
-        # iterate starting from other_seq (both sides)
-        # check that there exist some agreed_round
+        # the CP must be from the counterparty and agreed
+        if cp.s.vk != tx.inner.counterparty:
+            return VALIDITY_ENUM.Unknown
+        if not self.compact_cp_in_consensus(cp.compact, proof.agreed_round):
+            return VALIDITY_ENUM.Unknown
 
-        idx_a = -1
-        idx_b = -1
+        # the leaf must be the other half, at the position of the other half
+        if leaf.hash != other_half.compact.hash or other_half.seq != cp.seq - proof.size + proof.index:
+            return VALIDITY_ENUM.Unknown
 
-        for i in xrange(other_seq - 1, -1, -1):
-            block = blocks_cache[i]
-            if block is None:
-                return []
-            if block.agreed_round != -1:
-                idx_a = i
-                break
+        if not merkle_verify(leaf.hash, proof.index, proof.size, proof.siblings, cp.inner.merkle_root):
+            return VALIDITY_ENUM.Unknown
 
-        for i in xrange(other_seq + 1, len(blocks_cache)):
-            block = blocks_cache[i]
-            if block is None:
-                return []
-            if block.agreed_round != -1:
-                idx_b = i
-                break
+        self.my_chain.set_validity(seq, VALIDITY_ENUM.Valid)
+        logging.debug("TC: verified (Merkle) {}".format(encode_n(tx.hash)))
+        return VALIDITY_ENUM.Valid
 
-        if idx_a == -1 or idx_b == -1:
-            return []
+    def load_cache_for_verification(self, seq):
+        # type: (int) -> List[CompactBlock]
+        """
+        Check that we can verify using cached results, 
+        :param seq: 
+        :return: 
+        """
+        tx = self.my_chain.chain[seq]
+        other_half = self.my_chain.other_half(seq)
+        assert isinstance(tx, TxBlock)
+        assert other_half is not None
 
-        return blocks_cache[idx_a:idx_b+1]
+        return self._other_chains.agreed_range(tx.inner.counterparty, other_half.seq)
 
     def verify_tx(self, seq, compact_blocks, use_cache=True):
         # type: (int, List[CompactBlock]) -> VALIDITY_ENUM
@@ -690,9 +1709,15 @@ class TrustChain(object):
         if compact_blocks is None:
             raise NotImplemented
 
+        # e.g. a late response, the TX may already be archived
+        validity = self.my_chain.validity(seq)
+        if validity != VALIDITY_ENUM.Unknown:
+            return validity
+
         tx = self.my_chain.chain[seq]
+        other_half = self.my_chain.other_half(seq)
         assert isinstance(tx, TxBlock)
-        assert tx.other_half is not None
+        assert other_half is not None
 
         if len(compact_blocks) == 0:
             return VALIDITY_ENUM.Unknown
@@ -709,7 +1734,10 @@ class TrustChain(object):
         assert isinstance(peer_cp_a, CompactBlock)
         assert isinstance(peer_cp_b, CompactBlock)
 
-        if not (self.compact_cp_in_consensus(peer_cp_a, r_a) and self.compact_cp_in_consensus(peer_cp_b, r_b)):
+        # the end points must be agreed CPs of the counterparty, otherwise the blocks are from another chain
+        counterparty = tx.inner.counterparty
+        if not (self.compact_cp_in_consensus(peer_cp_a, r_a, counterparty) and
+                self.compact_cp_in_consensus(peer_cp_b, r_b, counterparty)):
             return VALIDITY_ENUM.Unknown
 
         if not hash_pointers_ok(compact_blocks):
@@ -717,8 +1745,8 @@ class TrustChain(object):
 
         # TODO the logic here is ugly and error prone
         for b in compact_blocks:
-            if b.hash == tx.other_half.compact.hash:
-                assert b.seq == tx.other_half.seq
+            if b.hash == other_half.compact.hash:
+                assert b.seq == other_half.seq
                 self.my_chain.set_validity(seq, VALIDITY_ENUM.Valid)
                 logging.debug("TC: verified {}".format(encode_n(self.my_chain.chain[seq].hash)))
                 if use_cache:
@@ -729,33 +1757,61 @@ class TrustChain(object):
 
         return VALIDITY_ENUM.Unknown
 
-    def _cache_compact_blocks(self, vk, compact_blocks):
-        # type: (str, List[CompactBlock]) -> bool
+    def verify_segments(self, counterparty, seqs, segments):
+        # type: (str, List[int], List[List[CompactBlock]]) -> int
+        """
+        Verify many of our TXs with `counterparty` at once, using the segments from `agreed_segments`.
+        Every segment is checked once, then all the TXs in `seqs` that they cover are settled in one pass,
+        and the segments are cached to verify the other pending TXs with the same counterparty.
+        :param counterparty:
+        :param seqs: sequence numbers of the TXs on my side
+        :param segments:
+        :return: the number of TXs in `seqs` that are now Valid
+        """
+        digests = {}  # type: Dict[int, str]
         updated = False
+        for blocks in segments:
+            if not blocks:
+                continue
+            a, b = blocks[0], blocks[-1]
+            # only segments of the counterparty's chain are cached under its vk
+            if not self.compact_cp_in_consensus(a, a.agreed_round, counterparty) or \
+                    not self.compact_cp_in_consensus(b, b.agreed_round, counterparty):
+                continue
+            if not hash_pointers_ok(blocks):
+                continue
+            digests.update((c.seq, c.hash) for c in blocks)
+            updated = self._cache_compact_blocks(counterparty, blocks) or updated
+
+        count = 0
+        for seq in seqs:
+            if not 0 <= seq < len(self.my_chain.chain):
+                continue
+            validity = self.my_chain.validity(seq)
+            if validity != VALIDITY_ENUM.Unknown:
+                count += validity == VALIDITY_ENUM.Valid
+                continue
+            tx = self.my_chain.chain[seq]
+            other_half = self.my_chain.other_half(seq)
+            if not isinstance(tx, TxBlock) or tx.inner.counterparty != counterparty or other_half is None:
+                continue
+            if digests.get(other_half.seq) == other_half.compact.hash:
+                self.my_chain.set_validity(seq, VALIDITY_ENUM.Valid)
+                count += 1
 
-        if vk not in self._other_chains:
-            self._other_chains[vk] = GrowingList()
-
-        blocks_cache = self._other_chains[vk]
+        if updated:
+            self._verify_from_cache(counterparty)
+        logging.debug("TC: verified {} of {} txs in {} segments".format(count, len(seqs), len(segments)))
+        return count
 
+    def _cache_compact_blocks(self, vk, compact_blocks):
+        # type: (str, List[CompactBlock]) -> bool
         idx = compact_blocks[0].seq
         for compact_block in compact_blocks:
             assert idx == compact_block.seq
-            # blocks_cache[idx] can be none of we skip a segment of the cache
-            if len(blocks_cache) > idx:
-                if blocks_cache[idx] is None:
-                    blocks_cache[idx] = compact_block
-                    updated = True
-                else:
-                    assert blocks_cache[idx] == compact_block
-            else:
-                blocks_cache[idx] = compact_block
-                updated = True
             idx += 1
 
-        self._other_chains[vk] = blocks_cache
-
-        return updated
+        return self._other_chains.put(vk, compact_blocks)
 
     def _verify_from_cache(self, counterparty):
         """
@@ -764,32 +1820,64 @@ class TrustChain(object):
         :param counterparty: 
         :return: 
         """
-        txs = filter(lambda _tx: _tx.inner.counterparty == counterparty, self.get_verifiable_txs())
-        for tx in txs:
+        for tx in self.get_verifiable_txs(counterparty):
             compact_blocks = self.load_cache_for_verification(tx.seq)
             res = self.verify_tx(tx.seq, compact_blocks, use_cache=False)
             if res == VALIDITY_ENUM.Valid:
                 logging.debug("TC: verified (from cache) {}".format(encode_n(tx.hash)))
 
-    def get_verifiable_txs(self):
-        # type: () -> List[TxBlock]
+    def get_verifiable_txs(self, counterparty=None):
+        # type: (Optional[str]) -> List[TxBlock]
         """
         There are some transactions that are impossible to verify because we don't have the consensus result,
         or the validation request is already sent but we haven't heard the reply,
         this function attempts to filter these cases.
+        :param counterparty: optionally only consider TXs made with this counterparty
         :return: 
         """
+        latest_round = self.latest_round
+        return [tx for tx in self.get_pending_txs(counterparty)
+                if self.my_chain.request_sent_r(tx.seq) < latest_round]
+
+    def get_pending_txs(self, counterparty=None):
+        # type: (Optional[str]) -> List[TxBlock]
+        """
+        The TXs with unknown validity that are covered by a consensus result, i.e. the ones that the counterparty
+        can produce pieces for, regardless of whether a validation request is already sent.
+        :param counterparty: optionally only consider TXs made with this counterparty
+        :return: ordered by sequence number
+        """
+        return self.my_chain.get_unknown_txs(self.verifiable_bound, counterparty)
+
+    @property
+    def verifiable_bound(self):
+        # type: () -> int
+        """
+        :return: the seq of my CP of the previous round, the TXs before it are covered by a consensus result
+        """
         if self.latest_cp.round < 2:
-            return []
-        max_h = self.my_chain.get_cp_of_round(self.latest_cp.round - 1).seq
-        txs = filter(lambda _tx: _tx.seq < max_h and _tx.request_sent_r < self.latest_round,
-                     self.my_chain.get_unknown_txs())
-        return txs
+            return 0
+        return self.my_chain.get_cp_of_round(self.latest_cp.round - 1).seq
+
+    def get_pending_since(self, lo):
+        # type: (int) -> Tuple[List[TxBlock], int]
+        """
+        Incremental version of `get_pending_txs`, the callers keep the returned bound and pass it in the next call.
+        :param lo:
+        :return: the pending TXs from `lo` up to `verifiable_bound`, and the larger of the two
+        """
+        hi = max(lo, self.verifiable_bound)
+        return self.my_chain.get_unknown_between(lo, hi), hi
 
     def get_validated_txs(self):
         # type: () -> List[TxBlock]
         return self.my_chain.get_validated_txs()
 
+    @property
+    def validated_count(self):
+        # type: () -> int
+        return self.my_chain.validated_count
+
 # EqHash.register(Signature)
 # EqHash.register(TxBlockInner)
 # EqHash.register(TxBlock)
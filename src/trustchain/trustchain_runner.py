@@ -1,23 +1,43 @@
 import logging
 import random
+import libnacl
 import time
 from base64 import b64encode
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
-from twisted.internet import task
+from twisted.internet import task, defer
+from typing import List, Tuple
 
 import src.messages.messages_pb2 as pb
-from src.trustchain.trustchain import TrustChain, TxBlock, CpBlock, Signature, Cons, CompactBlock
-from src.utils import collate_cp_blocks, my_err_back, encode_n
+from src.trustchain.trustchain import TrustChain, TxBlock, CpBlock, Signature, Cons, CompactBlock, \
+    verification_cache_stats, open_segment_store, VALIDITY_ENUM
+from src.trustchain.verifier import BatchVerifier
+from src.trustchain.scheduler import ValidationScheduler
+from src.trustchain.workload import WorkloadGenerator, RateProfile, make_sampler, DEFAULT_DISTRIBUTION, \
+    DEFAULT_ZIPF_S
+from src.utils import collate_cp_blocks, my_err_back, encode_n, LRUCache, call_later
+
+_VALIDATION_MODES = {
+    'pieces': pb.ValidationReq.PIECES,
+    'merkle': pb.ValidationReq.MERKLE,
+}
 
 
 class RoundState(object):
+    """
+    Everything received for one round.
+    Callers can wait for the number of CPs or signatures to reach a threshold with `when_cps` and `when_sigs`,
+    the Deferreds fire as soon as the message that crosses the threshold is added.
+    """
     def __init__(self):
         self.received_cons = None
-        self.received_sigs = {}
-        self.received_cps = []
+        self.received_sigs = OrderedDict()
+        self._received_cps = OrderedDict()  # keyed by vk
+        self._cp_waiters = []  # type: List[Tuple[int, defer.Deferred]]
+        self._sig_waiters = []  # type: List[Tuple[int, defer.Deferred]]
         self.start_time = int(time.time())
         self.asked = False
+        self.verifying = False  # whether the signatures are being verified in the background
 
     def __str__(self):
         return "received cons: {}, sig count: {}, cp count: {}"\
@@ -43,6 +63,7 @@ class RoundState(object):
         assert isinstance(s, Signature)
         if s.vk not in self.received_sigs:
             self.received_sigs[s.vk] = s
+            self._notify(self._sig_waiters, len(self.received_sigs), self.received_sigs.values)
             return True
 
         # TODO we should handle this
@@ -50,11 +71,60 @@ class RoundState(object):
         return False
 
     def new_cp(self, cp):
-        # type: (CpBlock) -> None
+        # type: (CpBlock) -> bool
+        """
+        :param cp:
+        :return: True if it is new, otherwise False, only the first CP of every vk is kept
+        """
         assert isinstance(cp, CpBlock)
-        if self.received_cps:
-            assert self.received_cps[0].round == cp.round
-        self.received_cps.append(cp)
+        if self._received_cps:
+            assert next(self._received_cps.itervalues()).round == cp.round
+        if cp.s.vk in self._received_cps:
+            if self._received_cps[cp.s.vk] != cp:
+                logging.warning("TC: round {}, conflicting CPs from {}".format(cp.round, b64encode(cp.s.vk)))
+            return False
+
+        self._received_cps[cp.s.vk] = cp
+        self._notify(self._cp_waiters, len(self._received_cps), self._received_cps.values)
+        return True
+
+    @property
+    def received_cps(self):
+        # type: () -> List[CpBlock]
+        return self._received_cps.values()
+
+    def when_cps(self, n):
+        # type: (int) -> defer.Deferred
+        """
+        :param n:
+        :return: Deferred that fires with the received CPs once there are at least `n` of them
+        """
+        return self._wait(self._cp_waiters, n, len(self._received_cps), self._received_cps.values)
+
+    def when_sigs(self, n):
+        # type: (int) -> defer.Deferred
+        """
+        :param n:
+        :return: Deferred that fires with the received signatures once there are at least `n` of them
+        """
+        return self._wait(self._sig_waiters, n, len(self.received_sigs), self.received_sigs.values)
+
+    @staticmethod
+    def _wait(waiters, n, count, values):
+        if count >= n:
+            return defer.succeed(values())
+        d = defer.Deferred()
+        waiters.append((n, d))
+        return d
+
+    @staticmethod
+    def _notify(waiters, count, values):
+        ready = [d for n, d in waiters if count >= n]
+        if not ready:
+            return
+        waiters[:] = [(n, d) for n, d in waiters if count < n]
+        for d in ready:
+            d.callback(values())
 
 
 class TrustChainRunner(object):
@@ -64,8 +134,27 @@ class TrustChainRunner(object):
     """
 
     def __init__(self, factory):
-        self.tc = TrustChain()
+        store = None
+        if factory.config.store_dir is not None:
+            store = open_segment_store(factory.config.store_dir)
+        merkle = factory.config.validation_mode == 'merkle'
+        if merkle:
+            logging.warning("TC: Merkle validation trusts that the Merkle roots of the counterparties "
+                            "match their chains, see TrustChain.verify_tx_proof")
+        self.tc = TrustChain(store, n_promoters=factory.config.n, merkle_roots=merkle)
         self.factory = factory
+        self.verifier = BatchVerifier()
+
+        # hashes of the encoded Cons messages that we received
+        self._seen_cons = LRUCache(1024)
+
+        # messages of the transactions that wait to be sent as a batch, keyed by counterparty
+        self._tx_batches = defaultdict(list)
+
+        # number of my TXs that wait for their other half, keyed by counterparty
+        self._tx_in_flight = defaultdict(int)
+        # number of TXs that are not made because the counterparty does not keep up
+        self.tx_throttled = 0
 
         self.collect_rubbish_lc = task.LoopingCall(self._collect_rubbish)
         self.collect_rubbish_lc.start(5, False).addErrback(my_err_back)
@@ -73,9 +162,11 @@ class TrustChainRunner(object):
         self.log_tx_count_lc = task.LoopingCall(self._log_info)
         self.log_tx_count_lc.start(5, False).addErrback(my_err_back)
 
-        self.bootstrap_lc = None
+        # created by make_validation
+        self.validation_scheduler = None  # type: ValidationScheduler
 
-        self.random_node_for_tx = False
+        # created by make_tx
+        self.workload = None  # type: WorkloadGenerator
 
         # attributes below are states for building new CP blocks
         self.round_states = defaultdict(RoundState)
@@ -84,8 +175,33 @@ class TrustChainRunner(object):
 
         random.seed()
 
+    def register_handlers(self, router):
+        """
+        :param router:
+        :return:
+        """
+        router.register('TxReq', self.handle_tx_req)
+        router.register('TxResp', self.handle_tx_resp)
+        router.register('TxReqBatch', self.handle_tx_req_batch)
+        router.register('TxRespBatch', self.handle_tx_resp_batch)
+        router.register('ValidationReq', self.handle_validation_req)
+        router.register('ValidationResp', self.handle_validation_resp)
+        router.register('ValidationReqBatch', self.handle_validation_req_batch)
+        router.register('ValidationRespBatch', self.handle_validation_resp_batch)
+        router.register('SigWithRound', self.handle_sig)
+        router.register('CpBlock', self.handle_cp)
+        router.register('Cons', self.handle_cons)
+        router.register('AskCons', self.handle_ask_cons)
+
+        # every promoter broadcasts the same Cons, only the first copy is parsed
+        router.add_filter('Cons', lambda data, _: self.is_new_cons(data))
+
     def _log_info(self):
-        logging.info("TC: current tx count {}, validated {}".format(self.tc.tx_count, len(self.tc.get_validated_txs())))
+        logging.info("TC: current tx count {}, validated {}, throttled {}"
+                     .format(self.tc.tx_count, self.tc.validated_count, self.tx_throttled))
+        logging.debug("TC: signature cache {}".format(verification_cache_stats()))
+        if self.validation_scheduler is not None:
+            logging.info("TC: validation scheduler {}".format(self.validation_scheduler.stats))
 
     def _sufficient_sigs(self, r):
         if len(self.round_states[r].received_sigs) > self.factory.config.t:
@@ -99,6 +215,11 @@ class TrustChainRunner(object):
                 del self.round_states[k]
         # logging.info("TC: states - {}".format(self.round_states))
 
+        if self.tc.prune(self.factory.config.cons_retention) > 0:
+            logging.debug("TC: resident blocks {}, archived blocks {} ({} bytes)"
+                          .format(self.tc.my_chain.resident_count, self.tc.my_chain.archived_count,
+                                  self.tc.my_chain.archived_nbytes))
+
     def _latest_promoters(self):
         r = self.tc.latest_round
         return self._promoter_of_round(r)
@@ -106,7 +227,7 @@ class TrustChainRunner(object):
     def _promoter_of_round(self, r):
         if r == 0:
             return self._initial_promoters
-        return self.tc.consensus[r].get_promoters(self.factory.config.n)
+        return self.tc.promoters_of_round(r)
 
     def handle_cons_from_acs(self, msg):
         """
@@ -120,13 +241,12 @@ class TrustChainRunner(object):
         if isinstance(bs, dict):
             assert len(bs) > 0
 
+            # the CPs are collated in their encoded form, they are decoded later if they are needed
             def _parse_cps(_b):
-                _cps = pb.CpBlocks()
-                _cps.ParseFromString(_b)
-                return [CpBlock(_cp) for _cp in _cps.cps]
+                return list(pb.CpBlocksView.FromString(_b).cps)
 
             cps = {k: _parse_cps(v) for k, v in bs.iteritems()}
-            cons = Cons.new(r, [cp.pb for cp in collate_cp_blocks(cps)])
+            cons = Cons.new_encoded(r, collate_cp_blocks(cps))
             self.round_states[r].new_cons(cons)
 
             s = Signature.new(self.tc.vk, self.tc._sk, cons.hash)
@@ -177,8 +297,22 @@ class TrustChainRunner(object):
             assert cp.s.vk == remote_vk
             self.round_states[cp.round].new_cp(cp)
 
+    def is_new_cons(self, data):
+        # type: (str) -> bool
+        """
+        Check whether an encoded Cons message is seen for the first time,
+        it is called before parsing so duplicates are dropped without building any object.
+        :param data:
+        :return:
+        """
+        digest = libnacl.crypto_hash_sha256(data)
+        if self._seen_cons.get(digest) is not None:
+            return False
+        self._seen_cons.put(digest, True)
+        return True
+
     def handle_cons(self, msg, remote_vk):
-        # type: (pb.Cons, str) -> None
+        # type: (pb.ConsView, str) -> None
         """
         Update round_state on new consensus message, 
         then conditionally gossip.
@@ -186,7 +320,7 @@ class TrustChainRunner(object):
         :param remote_vk: 
         :return: 
         """
-        assert isinstance(msg, pb.Cons)
+        assert isinstance(msg, pb.ConsView)
         logging.debug("TC: received Cons {} from {}".format(msg, b64encode(remote_vk)))
 
         cons = Cons(msg)
@@ -236,17 +370,43 @@ class TrustChainRunner(object):
             return
 
         try:
-            self._promoter_of_round(r - 1)
+            promoters = self._promoter_of_round(r - 1)
         except KeyError:
             self.send(random.choice(self.factory.promoters), pb.AskCons(r=r-1))
             return
 
-        self._add_cp(r)
+        # verify the signatures off the reactor thread, new signatures may arrive in the meantime
+        state = self.round_states[r]
+        if state.verifying:
+            return
+        state.verifying = True
+        sig_count = len(state.received_sigs)
 
-    def _add_cp(self, r):
-        # type: (int) -> None
+        def _verified(ss):
+            state.verifying = False
+            if self.tc.latest_round >= r:
+                logging.debug("TC: already added the CP")
+                return
+            self._add_cp(r, ss)
+
+        def _not_verified(failure):
+            state.verifying = False
+            failure.trap(ValueError)
+            logging.info("TC: round {}, signatures not verified yet, {}".format(r, failure.getErrorMessage()))
+            if len(state.received_sigs) > sig_count:
+                # more signatures arrived while we were verifying
+                self._try_add_cp(r)
+
+        self.verifier.verify_signatures(state.received_cons.hash, state.received_sigs.values(),
+                                        promoters, self.factory.config.t)\
+            .addCallbacks(_verified, _not_verified)\
+            .addErrback(my_err_back)
+
+    def _add_cp(self, r, ss):
+        # type: (int, List[Signature]) -> None
         """
         :param r:
+        :param ss: verified signatures of the promoters over the consensus result of round r
         :return:
         """
         # here we create a new CP from the consensus result (both of round r)
@@ -254,7 +414,7 @@ class TrustChainRunner(object):
         _prev_cp = self.tc.latest_cp.compact  # this is just for logging
         self.tc.new_cp(1,
                        self.round_states[r].received_cons,
-                       self.round_states[r].received_sigs.values(),
+                       ss,
                        self._promoter_of_round(r - 1),
                        self.factory.config.t)
         if not self.tc.compact_cp_in_consensus(_prev_cp, self.tc.latest_round):
@@ -289,35 +449,20 @@ class TrustChainRunner(object):
                              .format(r))
                 self.round_states[r].new_cp(self.tc.my_chain.latest_cp)
 
-                class LoopingStartACS(object):
-                    def __init__(self, _p):
-                        # type: (TrustChainRunner) -> None
-                        self.p = _p
-                        self.lc = None
-
-                    def try_start_acs(self, _r):
-                        assert self.lc
-                        # NOTE: we take CPs of round r - 1 to create consensus result of round r
-                        _msg = [cp.pb for cp in self.p.round_states[_r - 1].received_cps]
-                        if self.p.tc.latest_round >= _r:
-                            logging.info("TC: round {}, somebody completed ACS before me, not starting".format(_r))
-                            # setting the following causes the old messages to be dropped
-                            self.p.factory.acs.stop(self.p.tc.latest_round)
-                            self.lc.stop()
-                            self.lc = None
-                        elif len(_msg) >= self.p.factory.config.population - self.p.factory.config.t:
-                            logging.info("TC: round {}, starting ACS with {} CPs".format(_r, len(_msg)))
-                            self.p.factory.acs.reset_then_start(pb.CpBlocks(cps=_msg).SerializeToString(), _r)
-                            self.lc.stop()
-                            self.lc = None
-                        else:
-                            logging.info("TC: round {}, not enough CPs {}".format(_r, len(_msg)))
-
-                lc_acs = LoopingStartACS(self)
-                lc = task.LoopingCall(lc_acs.try_start_acs, r + 1)
-                lc_acs.lc = lc
-
-                lc.start(2, False).addErrback(my_err_back)
+                # NOTE: we take CPs of round r to create consensus result of round r + 1
+                def _start_acs(cps):
+                    if self.tc.latest_round > r:
+                        logging.info("TC: round {}, somebody completed ACS before me, not starting".format(r + 1))
+                        # setting the following causes the old messages to be dropped
+                        self.factory.acs.stop(self.tc.latest_round)
+                        return
+                    logging.info("TC: round {}, starting ACS with {} CPs".format(r + 1, len(cps)))
+                    self.factory.acs.reset_then_start(pb.CpBlocks(cps=[cp.pb for cp in cps]).SerializeToString(),
+                                                      r + 1)
+
+                self.round_states[r].when_cps(self.factory.config.population - self.factory.config.t)\
+                    .addCallback(_start_acs)\
+                    .addErrback(my_err_back)
 
         else:
             logging.info("TC: round {}, I'm NOT a promoter".format(r))
@@ -325,6 +470,33 @@ class TrustChainRunner(object):
         # send new CP to either all promoters
         self.factory.promoter_cast(self.tc.my_chain.latest_cp.pb)
 
+        # the new consensus result makes more TXs verifiable
+        if self.validation_scheduler is not None:
+            self.validation_scheduler.pump()
+
+    def _send_validation(self, node, seqs):
+        # type: (str, List[int]) -> bool
+        """
+        Called by the validation scheduler to send one request for `seqs`, all of them are made with `node`.
+        :param node:
+        :param seqs:
+        :return: False if the request is not sent
+        """
+        if self.factory.config.ignore_promoter:
+            if self.tc.vk in self.factory.promoters or node in self.factory.promoters:
+                return False
+
+        # the scheduler retries later
+        if self.factory.is_congested(node):
+            return False
+
+        if self.factory.config.validation_batch > 1:
+            self._send_validation_req_batch(seqs)
+        else:
+            assert len(seqs) == 1
+            self._send_validation_req(seqs[0])
+        return True
+
     def _send_validation_req(self, seq):
         # type: (int) -> None
         """
@@ -335,24 +507,48 @@ class TrustChainRunner(object):
         block = self.tc.my_chain.chain[seq]
         assert isinstance(block, TxBlock)
 
-        if self.factory.config.ignore_promoter and block.inner.counterparty in self.factory.promoters:
-            return
-
-        block.request_sent_r = self.tc.latest_round
+        self.tc.my_chain.set_request_sent(seq, self.tc.latest_round)
 
-        assert block.other_half is not None
-        seq_r = block.other_half.inner.seq
+        other_half = self.tc.my_chain.other_half(seq)
+        assert other_half is not None
+        seq_r = other_half.inner.seq
         node = block.inner.counterparty
 
-        req = pb.ValidationReq(seq=seq, seq_r=seq_r)
+        req = pb.ValidationReq(seq=seq, seq_r=seq_r, mode=_VALIDATION_MODES[self.factory.config.validation_mode])
         logging.debug("TC: sent validation to {}, {}".format(b64encode(node), req))
         self.send(node, req)
 
+    def _send_validation_req_batch(self, seqs):
+        # type: (List[int]) -> None
+        """
+        Same as `_send_validation_req` for many TXs with the same counterparty, in one request.
+        :param seqs: The sequence numbers on my side
+        :return:
+        """
+        node = self.tc.my_chain.chain[seqs[0]].inner.counterparty
+
+        seq_rs = []
+        for seq in seqs:
+            assert self.tc.my_chain.chain[seq].inner.counterparty == node
+            self.tc.my_chain.set_request_sent(seq, self.tc.latest_round)
+            seq_rs.append(self.tc.my_chain.other_half(seq).inner.seq)
+
+        req = pb.ValidationReqBatch(seqs=seqs, seq_rs=seq_rs)
+        logging.debug("TC: sent validation batch to {}, {}".format(b64encode(node), req))
+        self.send(node, req)
+
     def handle_validation_req(self, req, remote_vk):
         # type: (pb.ValidationReq, str) -> None
         assert isinstance(req, pb.ValidationReq)
         logging.debug("TC: received validation req from {}, {}".format(b64encode(remote_vk), req))
 
+        # fall back to pieces if there is no proof, e.g. the CP was created before Merkle roots existed
+        if req.mode == pb.ValidationReq.MERKLE:
+            proof = self.tc.merkle_proof(req.seq_r)
+            if proof is not None:
+                self.send(remote_vk, pb.ValidationRespView(seq=req.seq, seq_r=req.seq_r, proof=proof))
+                return
+
         pieces = self.tc.agreed_pieces(req.seq_r)
 
         if not pieces:
@@ -361,66 +557,169 @@ class TrustChainRunner(object):
 
         assert len(pieces) > 2
 
-        self.send(remote_vk, pb.ValidationResp(seq=req.seq, seq_r=req.seq_r, pieces=[p.pb for p in pieces]))
+        self.send(remote_vk, pb.ValidationRespView(seq=req.seq, seq_r=req.seq_r,
+                                                   pieces=[p.SerializeToString() for p in pieces]))
+
+    def handle_validation_req_batch(self, req, remote_vk):
+        # type: (pb.ValidationReqBatch, str) -> None
+        assert isinstance(req, pb.ValidationReqBatch)
+        logging.debug("TC: received validation batch req from {}, {}".format(b64encode(remote_vk), req))
+
+        segments = self.tc.agreed_segments(list(req.seq_rs))
+        if not segments:
+            logging.warning("TC: no segments, {}".format(sorted(self.tc.consensus.keys())))
+            return
+
+        self.send(remote_vk, pb.ValidationRespBatch(
+            seqs=req.seqs,
+            segments=[pb.ValidationSegment(pieces=[p.SerializeToString() for p in s]) for s in segments]))
 
     def handle_validation_resp(self, resp, remote_vk):
-        # type: (pb.ValidationResp, str) -> None
+        # type: (pb.ValidationRespView, str) -> None
         """
-        Try to validate the pieces that we just received.
+        Try to validate the pieces or the Merkle proof that we just received.
         Note that tc.verify_tx will also validate additional transactions when there's sufficient information in cache.
         :param resp: 
         :param remote_vk: 
         :return: 
         """
-        assert isinstance(resp, pb.ValidationResp)
+        assert isinstance(resp, pb.ValidationRespView)
         logging.debug("TC: received validation resp from {}, {}".format(b64encode(remote_vk), resp))
 
-        self.tc.verify_tx(resp.seq, [CompactBlock(p) for p in resp.pieces])
+        if resp.HasField('proof'):
+            self.tc.verify_tx_proof(resp.seq, resp.proof)
+        else:
+            self.tc.verify_tx(resp.seq, [CompactBlock.from_string(p) for p in resp.pieces])
+
+        if self.validation_scheduler is not None:
+            self.validation_scheduler.on_response([resp.seq])
+
+    def handle_validation_resp_batch(self, resp, remote_vk):
+        # type: (pb.ValidationRespBatch, str) -> None
+        """
+        Verify all the segments of the response, then settle the TXs that they cover.
+        :param resp:
+        :param remote_vk:
+        :return:
+        """
+        assert isinstance(resp, pb.ValidationRespBatch)
+        logging.debug("TC: received validation batch resp from {}, {} segments"
+                      .format(b64encode(remote_vk), len(resp.segments)))
+
+        segments = [[CompactBlock.from_string(p) for p in s.pieces] for s in resp.segments]
+        self.tc.verify_segments(remote_vk, list(resp.seqs), segments)
+
+        if self.validation_scheduler is not None:
+            self.validation_scheduler.on_response(list(resp.seqs))
 
     def handle_tx_req(self, msg, remote_vk):
-        # type: (pb.TxReq, str) -> None
-        assert isinstance(msg, pb.TxReq)
+        # type: (pb.TxReqView, str) -> None
+        assert isinstance(msg, pb.TxReqView)
 
-        nonce = msg.tx.inner.nonce
-        m = msg.tx.inner.m
+        other_half = TxBlock.from_string(msg.tx)
+        nonce = other_half.inner.nonce
+        m = other_half.inner.m
 
-        assert remote_vk == msg.tx.s.vk, "{} != {}".format(b64encode(remote_vk), b64encode(msg.tx.s.vk))
+        assert remote_vk == other_half.s.vk, "{} != {}".format(b64encode(remote_vk), b64encode(other_half.s.vk))
         self.tc.new_tx(remote_vk, m, nonce)
 
         # new_tx cannot be a CpBlock because we just called new_tx
         new_tx = self.tc.my_chain.chain[-1]
-        new_tx.add_other_half(TxBlock(msg.tx))
-        self.send(remote_vk, pb.TxResp(seq=msg.tx.inner.seq, tx=new_tx.pb))
+        self._add_other_half(new_tx.seq, other_half)
+        self.send(remote_vk, pb.TxRespView(seq=other_half.seq, tx=new_tx.SerializeToString()))
         logging.debug("TC: added tx (received) {}, from {}"
-                      .format(encode_n(new_tx.other_half.hash), encode_n(remote_vk)))
+                      .format(encode_n(other_half.hash), encode_n(remote_vk)))
 
     def handle_tx_resp(self, msg, remote_vk):
-        # type: (pb.TxResp, str) -> None
-        assert isinstance(msg, pb.TxResp)
-        assert remote_vk == msg.tx.s.vk, "{} != {}".format(b64encode(remote_vk), b64encode(msg.tx.s.vk))
+        # type: (pb.TxRespView, str) -> None
+        assert isinstance(msg, pb.TxRespView)
+        other_half = TxBlock.from_string(msg.tx)
+        assert remote_vk == other_half.s.vk, "{} != {}".format(b64encode(remote_vk), b64encode(other_half.s.vk))
         # TODO index access not safe
         tx = self.tc.my_chain.chain[msg.seq]
-        tx.add_other_half(TxBlock(msg.tx))
+        self._add_other_half(msg.seq, other_half)
+        self._tx_answered(remote_vk, 1)
         logging.debug("TC: other half {}".format(encode_n(tx.hash)))
 
+    def handle_tx_req_batch(self, msg, remote_vk):
+        # type: (pb.TxReqBatch, str) -> None
+        """
+        Same as handle_tx_req for every transaction in the batch, but we also reply with one batch
+        :param msg:
+        :param remote_vk:
+        :return:
+        """
+        assert isinstance(msg, pb.TxReqBatch)
+        assert remote_vk == msg.s.vk, "{} != {}".format(b64encode(remote_vk), b64encode(msg.s.vk))
+        if not msg.inners:
+            return
+
+        other_halves = TxBlock.from_batch(msg.inners, msg.s)
+        new_txs = self.tc.new_tx_batch(remote_vk, [i.m for i in msg.inners], [i.nonce for i in msg.inners])
+        for new_tx, other_half in zip(new_txs, other_halves):
+            self._add_other_half(new_tx.seq, other_half)
+
+        self.send(remote_vk, pb.TxRespBatch(seqs=[i.seq for i in msg.inners], inners=[tx.inner for tx in new_txs],
+                                            s=new_txs[0].pb.s))
+        logging.debug("TC: added {} txs (received batch) from {}".format(len(new_txs), encode_n(remote_vk)))
+
+    def handle_tx_resp_batch(self, msg, remote_vk):
+        # type: (pb.TxRespBatch, str) -> None
+        assert isinstance(msg, pb.TxRespBatch)
+        assert remote_vk == msg.s.vk, "{} != {}".format(b64encode(remote_vk), b64encode(msg.s.vk))
+        assert len(msg.seqs) == len(msg.inners)
+
+        for seq, other_half in zip(msg.seqs, TxBlock.from_batch(msg.inners, msg.s)):
+            self._add_other_half(seq, other_half)
+        self._tx_answered(remote_vk, len(msg.seqs))
+        logging.debug("TC: other halves of batch {}".format(list(msg.seqs)))
+
+    def _add_other_half(self, seq, other_half):
+        # type: (int, TxBlock) -> None
+        self.tc.my_chain.add_other_half(seq, other_half)
+        # late other halves are not picked up by the scheduler otherwise
+        if self.validation_scheduler is not None:
+            self.validation_scheduler.add(seq, self.tc.my_chain.chain[seq].inner.counterparty)
+
+    def _tx_answered(self, node, n):
+        # type: (str, int) -> None
+        # TXs made before a restart are not counted
+        self._tx_in_flight[node] = max(0, self._tx_in_flight[node] - n)
+
+    def _can_make_tx(self, node):
+        # type: (str) -> bool
+        """
+        Reject TXs at the source when `node` does not keep up, so that neither our requests
+        nor its responses pile up in the outbound queues, see OutboundQueue
+        :param node:
+        :return:
+        """
+        if self.factory.is_congested(node):
+            return False
+        return self._tx_in_flight[node] + len(self._tx_batches.get(node, [])) < self.factory.config.tx_window
+
     def send(self, node, msg):
         self.factory.send(node, msg)
 
-    def make_tx(self, interval, random_node=False):
-        # type: (float, bool) -> None
+    def make_tx(self, profile, dist=DEFAULT_DISTRIBUTION, zipf_s=DEFAULT_ZIPF_S):
+        # type: (RateProfile, str, float) -> None
         """
-        Entry point for making transactions periodically.
-        :param interval: 
-        :param random_node: 
+        Entry point for making transactions, see WorkloadGenerator.
+        :param profile: a RateProfile, or a constant rate in tx/s
+        :param dist: how the counterparties are drawn, 'uniform', 'zipf' or 'neighbour'
+        :param zipf_s: the exponent of the Zipf distribution
         :return: 
         """
-        if random_node:
-            lc = task.LoopingCall(lambda: self._make_tx(self.factory.random_node))
-        else:
-            node = self.factory.neighbour
-            lc = task.LoopingCall(self._make_tx, node)
+        if not isinstance(profile, RateProfile):
+            profile = RateProfile([(0, profile)])
 
-        lc.start(interval).addErrback(my_err_back)
+        # the other peers starting from my neighbour, so that the popular peers are different for every node
+        keys = self.factory.sorted_peer_keys
+        i = keys.index(self.factory.vk)
+        peers = keys[i + 1:] + keys[:i]
+
+        self.workload = WorkloadGenerator(self._make_tx, make_sampler(dist, peers, zipf_s), profile)
+        self.workload.start()
 
     def _make_tx(self, node):
         if self.factory.config.ignore_promoter:
@@ -430,43 +729,75 @@ class TrustChainRunner(object):
         # cannot be myself
         assert node != self.factory.vk
 
+        if not self._can_make_tx(node):
+            self.tx_throttled += 1
+            return
+
         # typical bitcoin tx is 500 bytes
         m = 'a' * random.randint(400, 600)
         logging.debug("TC: {} making tx to".format(encode_n(node)))
 
+        window = self.factory.config.tx_batch_window
+        if window > 0:
+            batch = self._tx_batches[node]
+            batch.append(m)
+            if len(batch) == 1:
+                call_later(window, self._send_tx_batch, node)
+            return
+
         # create the tx and send the request
         self.tc.new_tx(node, m)
         tx = self.tc.my_chain.chain[-1]
-        self.send(node, pb.TxReq(tx=tx.pb))
+        self._tx_in_flight[node] += 1
+        self.send(node, pb.TxReqView(tx=tx.SerializeToString()))
         logging.debug("TC: added tx {}, from {}".format(encode_n(tx.hash), encode_n(self.tc.vk)))
 
-    def make_validation(self, interval):
-        # type: (float) -> None
-        """
-        Entry point for making validations periodically.
-        :param interval: 
-        :return: 
-        """
-        lc = task.LoopingCall(self._validate_random_tx)
-        lc.start(interval).addErrback(my_err_back)
-
-    def _validate_random_tx(self):
+    def _send_tx_batch(self, node):
         """
-        Each call sends validation requests for all unvalidated TX
-        :return: 
+        Create the transactions that are accumulated for `node`, sign them once and send the request
+        :param node:
+        :return:
         """
-        if self.factory.config.ignore_promoter and self.tc.vk in self.factory.promoters:
+        ms = self._tx_batches.pop(node, [])
+        if not ms:
             return
 
-        if self.tc.latest_cp.round < 2:
+        # the TXs are not made yet, so nothing is lost
+        if self.factory.is_congested(node):
+            self.tx_throttled += len(ms)
             return
 
-        txs = filter(lambda tx: tx.request_sent_r == -1, self.tc.get_verifiable_txs())
+        txs = self.tc.new_tx_batch(node, ms)
+        self._tx_in_flight[node] += len(txs)
+        self.send(node, pb.TxReqBatch(inners=[tx.inner for tx in txs], s=txs[0].pb.s))
+        logging.debug("TC: added {} txs (batch), to {}".format(len(txs), encode_n(node)))
 
-        if not txs:
+    def make_validation(self, interval=1.0):
+        # type: (float) -> None
+        """
+        Entry point for validating transactions.
+        Requests are sent as soon as there is room in the window, see ValidationScheduler.
+        :param interval: how often stale requests are expired and new TXs are picked up
+        :return: 
+        """
+        if self.validation_scheduler is not None:
+            logging.warning("TC: validation is already running")
             return
 
-        self._send_validation_req(random.choice(txs).seq)
+        def _pending_since(lo):
+            txs, hi = self.tc.get_pending_since(lo)
+            return [(tx.seq, tx.inner.counterparty) for tx in txs], hi
+
+        config = self.factory.config
+        self.validation_scheduler = ValidationScheduler(
+            _pending_since,
+            lambda seq: self.tc.my_chain.validity(seq) == VALIDITY_ENUM.Unknown,
+            self._send_validation,
+            per_peer=config.validation_window,
+            total=config.validation_window_total,
+            timeout=config.validation_timeout,
+            batch=config.validation_batch)
+        self.validation_scheduler.start(interval)
 
     def bootstrap_promoters(self):
         """
@@ -475,23 +806,18 @@ class TrustChainRunner(object):
         :return:
         """
         n = self.factory.config.n
-        self.factory.promoters = sorted(self.factory.peers.keys())[:n]
+        self.factory.promoters = self.factory.sorted_peer_keys[:n]
         self.factory.promoter_cast(self.tc.genesis.pb)
 
         self._initial_promoters = self.factory.promoters
 
-        def bootstrap_when_ready():
-            if self.factory.vk in self.factory.promoters:
-                logging.info("TC: bootstrap_lc, got {} CPs".format(len(self.round_states[0].received_cps)))
-                # collect CPs of round 0, from it, create consensus result of round 1
-                if len(self.round_states[0].received_cps) >= n:
-                    msg = pb.CpBlocks(cps=[cp.pb for cp in self.round_states[0].received_cps])
-                    self.factory.acs.start(msg.SerializeToString(), 1)
-                    self.bootstrap_lc.stop()
-            else:
-                logging.info(
-                    "TC: bootstrap_lc, not promoter, got {} CPs".format(len(self.round_states[0].received_cps)))
-                self.bootstrap_lc.stop()
+        if self.factory.vk not in self.factory.promoters:
+            logging.info("TC: bootstrap, not promoter, got {} CPs".format(len(self.round_states[0].received_cps)))
+            return
+
+        # collect CPs of round 0, from it, create consensus result of round 1
+        def _start_acs(cps):
+            logging.info("TC: bootstrap, got {} CPs".format(len(cps)))
+            self.factory.acs.start(pb.CpBlocks(cps=[cp.pb for cp in cps]).SerializeToString(), 1)
 
-        self.bootstrap_lc = task.LoopingCall(bootstrap_when_ready)
-        self.bootstrap_lc.start(5, False).addErrback(my_err_back)
+        self.round_states[0].when_cps(n).addCallback(_start_acs).addErrback(my_err_back)
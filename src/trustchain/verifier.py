@@ -0,0 +1,103 @@
+import logging
+from base64 import b64encode
+
+from twisted.internet import defer, threads, reactor
+from typing import List, Tuple, Callable
+
+from src.trustchain.trustchain import Signature, promoter_signatures
+
+
+class BatchVerifier(object):
+    """
+    Verifies batches of signatures on a worker pool so that the reactor thread is not blocked.
+    libnacl calls into C through ctypes which releases the GIL, so the workers do run in parallel.
+    Only the raw verification runs on the workers, the verified signature cache is updated on the reactor thread.
+    """
+    def __init__(self, defer_to_thread=None, margin=1):
+        # type: (Callable[..., defer.Deferred], int) -> None
+        """
+        :param defer_to_thread: runs a function on a worker and returns a Deferred of the result,
+        defaults to the thread pool of the reactor
+        :param margin: number of extra verifications to run in parallel in case some of them fail
+        """
+        if defer_to_thread is None:
+            def defer_to_thread(f, *args):
+                return threads.deferToThreadPool(reactor, reactor.getThreadPool(), f, *args)
+        self._defer_to_thread = defer_to_thread
+        self._margin = margin
+
+    def verify(self, pairs, threshold):
+        # type: (List[Tuple[Signature, str]], int) -> defer.Deferred
+        """
+        Verify the (signature, message) pairs until `threshold` of them are valid,
+        the remaining ones are not verified.
+        At most `threshold` minus the valid ones plus `margin` verifications are submitted at a time,
+        another one is only submitted when one fails.
+        :param pairs:
+        :param threshold: the number of valid signatures that we need
+        :return: Deferred that fires with `threshold` valid signatures,
+        or fails with ValueError if there are not enough of them
+        """
+        d = defer.Deferred()
+        oks = []
+        todo = []
+        state = {'done': False, 'in_flight': 0, 'next': 0}
+
+        def _finish():
+            if state['done']:
+                return
+            if len(oks) >= threshold:
+                state['done'] = True
+                d.callback(oks[:threshold])
+            elif state['in_flight'] == 0 and state['next'] == len(todo):
+                state['done'] = True
+                d.errback(ValueError("verification failed, oks = {}, threshold = {}".format(len(oks), threshold)))
+
+        def _fill():
+            while len(oks) < threshold and state['next'] < len(todo) \
+                    and state['in_flight'] < threshold - len(oks) + self._margin:
+                _s, _msg = todo[state['next']]
+                state['next'] += 1
+                state['in_flight'] += 1
+                # the job may complete right away and call _fill again
+                self._defer_to_thread(_s.verify_uncached, _msg)\
+                    .addCallbacks(_ok, _failed, callbackArgs=(_s, _msg), errbackArgs=(_s,))
+            _finish()
+
+        def _ok(_, _s, _msg):
+            state['in_flight'] -= 1
+            _s.set_verified(_msg)
+            oks.append(_s)
+            _fill()
+
+        def _failed(failure, _s):
+            state['in_flight'] -= 1
+            if not failure.check(ValueError):
+                logging.error("unexpected verification error {}".format(failure.getTraceback()))
+            logging.debug("one verification failed for {}".format(b64encode(_s.vk)))
+            _fill()
+
+        for s, msg in pairs:
+            if s.is_verified(msg):
+                oks.append(s)
+            else:
+                todo.append((s, msg))
+
+        _fill()
+        return d
+
+    def verify_signatures(self, data, ss, vks, t):
+        # type: (str, List[Signature], List[str], int) -> defer.Deferred
+        """
+        Asynchronous version of `_verify_signatures`, stops as soon as t + 1 promoter signatures are valid.
+        :param data: the signed message, e.g. the hash of a Cons
+        :param ss:
+        :param vks: verification keys of the promoters
+        :param t:
+        :return: Deferred that fires with t + 1 valid signatures, or fails with ValueError
+        """
+        try:
+            _ss = promoter_signatures(ss, vks, t)
+        except ValueError:
+            return defer.fail()
+        return self.verify([(s, data) for s in _ss], t + 1)
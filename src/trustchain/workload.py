@@ -0,0 +1,216 @@
+import random
+from bisect import bisect_right
+
+from twisted.internet import task, reactor
+from typing import List, Tuple, Callable, Optional
+
+from src.utils import my_err_back
+
+
+class AliasSampler(object):
+    """
+    Draw items from a discrete distribution in O(1) per sample using the alias method (Vose's variant).
+    """
+    def __init__(self, items, weights, rng=random):
+        # type: (List, List[float], random.Random) -> None
+        assert len(items) == len(weights) > 0
+        self._items = list(items)
+        self._rng = rng
+
+        n = len(weights)
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+        self._prob = [1.0] * n
+        self._alias = range(n)
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # whatever is left has a probability of 1 up to rounding errors
+
+    def sample(self):
+        i = self._rng.randrange(len(self._items))
+        if self._rng.random() < self._prob[i]:
+            return self._items[i]
+        return self._items[self._alias[i]]
+
+
+class UniformSampler(object):
+    def __init__(self, items, rng=random):
+        # type: (List, random.Random) -> None
+        assert items
+        self._items = list(items)
+        self._rng = rng
+
+    def sample(self):
+        return self._items[self._rng.randrange(len(self._items))]
+
+
+class NeighbourSampler(object):
+    def __init__(self, items, rng=random):
+        # type: (List, random.Random) -> None
+        assert items
+        self._item = items[0]
+
+    def sample(self):
+        return self._item
+
+
+DISTRIBUTIONS = ('uniform', 'zipf', 'neighbour')
+
+# used by every entry point that does not name a distribution
+DEFAULT_DISTRIBUTION = 'uniform'
+DEFAULT_ZIPF_S = 1.0
+
+
+def make_sampler(dist, items, s=DEFAULT_ZIPF_S, rng=random):
+    # type: (str, List, float, random.Random) -> object
+    """
+    :param dist: one of DISTRIBUTIONS
+    :param items: ordered by popularity, for Zipf the k-th item (starting from 1) has a weight of 1/k^s,
+    for neighbour only the first item is drawn
+    :param s: the exponent of the Zipf distribution
+    :param rng:
+    :return: an object with a `sample` method
+    """
+    if dist == 'uniform':
+        return UniformSampler(items, rng)
+    if dist == 'zipf':
+        return AliasSampler(items, [1.0 / (k ** s) for k in range(1, len(items) + 1)], rng)
+    if dist == 'neighbour':
+        return NeighbourSampler(items, rng)
+    raise ValueError("unknown distribution {}".format(dist))
+
+
+class RateProfile(object):
+    """
+    A piecewise constant transaction rate, the rate of a point applies from its time until the next point.
+    """
+    def __init__(self, points):
+        # type: (List[Tuple[float, float]]) -> None
+        """
+        :param points: (seconds since the start, rate in tx/s), the first point must be at time 0
+        """
+        points = sorted(points)
+        assert points and points[0][0] == 0, "the profile must start at time 0"
+        assert all(r >= 0 for _, r in points)
+        self._times = [t for t, _ in points]
+        self._rates = [r for _, r in points]
+
+    @classmethod
+    def from_string(cls, s):
+        # type: (str) -> RateProfile
+        """
+        :param s: either a constant rate, e.g. "100", or time:rate pairs, e.g. "0:100,30:500,60:0"
+        :return:
+        """
+        if ':' not in s:
+            return cls([(0, float(s))])
+        return cls([tuple(float(x) for x in p.split(':')) for p in s.split(',')])
+
+    @property
+    def max_rate(self):
+        # type: () -> float
+        return max(self._rates)
+
+    def rate_at(self, t):
+        # type: (float) -> float
+        return self._rates[max(bisect_right(self._times, t) - 1, 0)]
+
+    def tokens_between(self, t0, t1):
+        # type: (float, float) -> float
+        """
+        :return: the expected number of transactions in the interval [t0, t1)
+        """
+        res = 0.0
+        i = max(bisect_right(self._times, t0) - 1, 0)
+        while t0 < t1:
+            end = self._times[i + 1] if i + 1 < len(self._times) else t1
+            end = min(end, t1)
+            res += (end - t0) * self._rates[i]
+            t0 = end
+            i += 1
+        return res
+
+
+def parse_workload(spec):
+    # type: (str) -> Tuple[RateProfile, str, float]
+    """
+    Parse the parameter of a workload instruction, e.g. "rate=0:100,30:500 dist=zipf s=1.2".
+    :param spec: space separated key=value pairs, only rate is required,
+    dist defaults to DEFAULT_DISTRIBUTION and s to DEFAULT_ZIPF_S
+    :return: the rate profile, the name of the counterparty distribution and the Zipf exponent
+    """
+    kv = dict(p.split('=', 1) for p in spec.split())
+    dist = kv.get('dist', DEFAULT_DISTRIBUTION)
+    if dist not in DISTRIBUTIONS:
+        raise ValueError("unknown distribution {}".format(dist))
+    return RateProfile.from_string(kv['rate']), dist, float(kv.get('s', DEFAULT_ZIPF_S))
+
+
+class WorkloadGenerator(object):
+    """
+    Make transactions following a rate profile.
+    Instead of one timer per transaction, a token bucket is refilled every `tick` seconds
+    and all the whole tokens are spent at once, so the number of timer callbacks does not depend on the rate.
+    """
+    def __init__(self, make_tx, sampler, profile, tick=0.1, burst=None, clock=reactor):
+        # type: (Callable[[str], None], object, RateProfile, float, Optional[float], object) -> None
+        """
+        :param make_tx: makes one transaction with the given counterparty
+        :param sampler: draws the counterparties
+        :param profile:
+        :param tick: seconds between refills
+        :param burst: maximum number of tokens, tokens that are not spent during a stall of the reactor
+        are dropped beyond this, defaults to one second at the highest rate of the profile
+        :param clock: provides `seconds` and `callLater`, the reactor by default
+        """
+        self._make_tx = make_tx
+        self._sampler = sampler
+        self._profile = profile
+        self._tick = tick
+        self._burst = burst if burst is not None else max(profile.max_rate, 1.0)
+        self._clock = clock
+
+        self._tokens = 0.0
+        self._start = None  # type: float
+        self._last = None  # type: float
+        self._lc = None
+        self.made = 0
+
+    def start(self):
+        self._start = self._last = self._clock.seconds()
+        self._lc = task.LoopingCall(self.tick)
+        self._lc.clock = self._clock
+        self._lc.start(self._tick, False).addErrback(my_err_back)
+
+    def stop(self):
+        if self._lc is not None and self._lc.running:
+            self._lc.stop()
+        self._lc = None
+
+    def tick(self):
+        # type: () -> int
+        """
+        :return: the number of transactions made
+        """
+        now = self._clock.seconds()
+        self._tokens += self._profile.tokens_between(self._last - self._start, now - self._start)
+        self._tokens = min(self._tokens, self._burst)
+        self._last = now
+
+        # tolerate rounding errors, e.g. ten ticks of 0.1 tokens
+        n = int(self._tokens + 1e-9)
+        self._tokens = max(self._tokens - n, 0.0)
+        for _ in xrange(n):
+            self._make_tx(self._sampler.sample())
+        self.made += n
+        return n
@@ -1,7 +1,10 @@
 from twisted.internet import reactor, task, error
 from base64 import b64encode
+from collections import OrderedDict
 
+import ctypes
 import logging
+import struct
 import sys
 import libnacl
 
@@ -34,9 +37,10 @@ class Replay(object):
     """
     Dummy class returned by consensus algorithms to identify that the message should be replayed at a later time
     because it cannot yet be handled.
+    The key identifies the event that the message waits for, e.g. (round, instance, type), see ReplayBuffer.
     """
-    def __init__(self):
-        pass
+    def __init__(self, key=None):
+        self.key = key
 
 
 class Handled(object):
@@ -82,6 +86,122 @@ def hash_pointers_ok(blocks):
     return True
 
 
+def sign_detached(msg, sk):
+    # type: (str, str) -> str
+    """
+    Ed25519 signature without the message, libnacl 1.5 does not wrap the detached functions so we call libsodium.
+    :param msg:
+    :param sk:
+    :return: the 64 byte signature
+    """
+    sig = ctypes.create_string_buffer(libnacl.crypto_sign_BYTES)
+    ret = libnacl.nacl.crypto_sign_detached(sig, None, msg, ctypes.c_ulonglong(len(msg)), sk)
+    if ret:
+        raise ValueError('Failed to sign message')
+    return sig.raw
+
+
+def verify_detached(sig, msg, vk):
+    # type: (str, str, str) -> None
+    """
+    Verify a signature from `sign_detached`, throws ValueError on failure
+    :param sig:
+    :param msg:
+    :param vk:
+    :return:
+    """
+    if len(sig) != libnacl.crypto_sign_BYTES or len(vk) != libnacl.crypto_sign_PUBLICKEYBYTES:
+        raise ValueError('Invalid signature or verification key length')
+    ret = libnacl.nacl.crypto_sign_verify_detached(sig, msg, ctypes.c_ulonglong(len(msg)), vk)
+    if ret:
+        raise ValueError('Failed to validate message')
+
+
+def _merkle_leaf(x):
+    return libnacl.crypto_hash_sha256('\x00' + x)
+
+
+def _merkle_node(l, r):
+    return libnacl.crypto_hash_sha256('\x01' + l + r)
+
+
+def merkle_levels(leaves):
+    """
+    Build the levels of a Merkle tree, an unpaired node at the end of a level is carried up as it is.
+    :param leaves: list of digests
+    :return: list of levels, the first one are the hashed leaves and the last one is the root
+    """
+    levels = [[_merkle_leaf(x) for x in leaves]]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        nxt = [_merkle_node(level[i], level[i + 1]) for i in xrange(0, len(level) - 1, 2)]
+        if len(level) % 2 == 1:
+            nxt.append(level[-1])
+        levels.append(nxt)
+    return levels
+
+
+def merkle_root_of_levels(levels):
+    """
+    The root also commits to the number of leaves, so that the position of a leaf cannot be forged
+    :param levels: output of `merkle_levels`
+    :return:
+    """
+    n = len(levels[0])
+    top = levels[-1][0] if n > 0 else ''
+    return libnacl.crypto_hash_sha256('\x02' + struct.pack('<I', n) + top)
+
+
+def merkle_root(leaves):
+    return merkle_root_of_levels(merkle_levels(leaves))
+
+
+def merkle_proof(levels, index):
+    """
+    :param levels: output of `merkle_levels`
+    :param index: the position of the leaf
+    :return: the sibling hashes from the bottom to the top
+    """
+    siblings = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            siblings.append(level[sibling])
+        index >>= 1
+    return siblings
+
+
+def merkle_root_of_proof(leaf, index, size, siblings):
+    """
+    Compute the root of a Merkle tree with `size` leaves from `leaf` at `index` and its siblings.
+    :return: the root, or None if the proof is malformed
+    """
+    if not 0 <= index < size:
+        return None
+    h = _merkle_leaf(leaf)
+    n = size
+    siblings = list(siblings)
+    while n > 1:
+        if index ^ 1 < n:
+            if not siblings:
+                return None
+            sibling = siblings.pop(0)
+            h = _merkle_node(sibling, h) if index & 1 else _merkle_node(h, sibling)
+        index >>= 1
+        n = (n + 1) // 2
+    if siblings:
+        return None
+    return libnacl.crypto_hash_sha256('\x02' + struct.pack('<I', size) + h)
+
+
+def merkle_verify(leaf, index, size, siblings, root):
+    """
+    Check that `leaf` is at `index` of a Merkle tree with `size` leaves and the given root.
+    :return: True if the proof is correct
+    """
+    return merkle_root_of_proof(leaf, index, size, siblings) == root
+
+
 def my_err_back(failure):
     logging.error("ERROR BACK:")
     logging.error(failure.getErrorMessage())
@@ -89,11 +209,115 @@ def my_err_back(failure):
     stop_reactor()
 
 
-class GrowingList(list):
-    def __setitem__(self, index, value):
-        if index >= len(self):
-            self.extend([None] * (index + 1 - len(self)))
-        list.__setitem__(self, index, value)
+class LRUCache(object):
+    """
+    A bounded mapping that evicts the least recently used entry, with hit/miss counters.
+    """
+    def __init__(self, maxsize):
+        assert maxsize > 0
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._d = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._d.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._d[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._d.pop(key, None)
+        self._d[key] = value
+        if len(self._d) > self.maxsize:
+            self._d.popitem(last=False)
+
+    def clear(self):
+        self._d.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._d)
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._d)}
+
+
+class ReplayBuffer(object):
+    """
+    Holds the messages that cannot be handled yet, indexed by the key of their Replay.
+    A message is dispatched again only when its key is released, i.e. when the event it waits for happens.
+    Released messages are dispatched later in the same reactor iteration rather than from inside `release`,
+    because `release` is usually called while the consensus algorithm is in the middle of handling a message.
+    """
+    def __init__(self, dispatch, max_size=100000, clock=reactor):
+        """
+        :param dispatch: called with a released message and the vk of its sender
+        :param max_size: maximum number of buffered messages, new messages are dropped beyond this
+        :param clock: provides `callLater`, the reactor by default
+        """
+        assert max_size > 0
+        self._dispatch = dispatch
+        self._max_size = max_size
+        self._clock = clock
+        self._buf = {}  # key: replay key, val: [(vk, msg)]
+        self._size = 0
+        self._ready = []
+        self._drain_call = None
+        self.dropped = 0
+        self.replayed = 0
+
+    def put(self, key, vk, msg):
+        if self._size >= self._max_size:
+            self.dropped += 1
+            logging.debug("NODE: replay buffer full, dropping {}".format(key))
+            return
+        self._buf.setdefault(key, []).append((vk, msg))
+        self._size += 1
+
+    def release(self, key):
+        """
+        :param key:
+        :return:
+        """
+        self._take(self._buf.pop(key, []))
+
+    def release_if(self, pred):
+        """
+        Release all the keys that satisfy `pred`, e.g. those of the rounds that are over
+        :param pred:
+        :return:
+        """
+        for key in [k for k in self._buf if pred(k)]:
+            self._take(self._buf.pop(key))
+
+    def _take(self, items):
+        if not items:
+            return
+        self._size -= len(items)
+        self._ready.extend(items)
+        if self._drain_call is None:
+            self._drain_call = self._clock.callLater(0, self._drain)
+
+    def _drain(self):
+        self._drain_call = None
+        ready, self._ready = self._ready, []
+        self.replayed += len(ready)
+        for vk, msg in ready:
+            self._dispatch(msg, vk)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def stats(self):
+        return {'size': self._size, 'keys': len(self._buf), 'replayed': self.replayed, 'dropped': self.dropped}
 
 
 def encode_n(s, n=8):
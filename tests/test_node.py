@@ -0,0 +1,216 @@
+import random
+
+import pytest
+
+import src.messages.messages_pb2 as pb
+
+
+def test_encode_frame():
+    from twisted.test.proto_helpers import StringTransport
+    from src.protobufreceiver import ProtobufReceiver, encode_frame, FRAME_OVERHEAD
+
+    class Receiver(ProtobufReceiver):
+        def __init__(self):
+            self.objs = []
+
+        def obj_received(self, obj):
+            self.objs.append(obj)
+
+    sender = Receiver()
+    sender.makeConnection(StringTransport())
+    writes = []
+    sender.transport.write = writes.append
+
+    msgs = [pb.AskCons(r=r) for r in range(3)] + [pb.Dummy(m='a' * 100000)]
+    name, frame = encode_frame(msgs[0])
+    assert name == 'AskCons'
+    assert len(frame) - FRAME_OVERHEAD == msgs[0].ByteSize()
+
+    # frames are written as they are sent, MyProto queues them instead, see OutboundQueue
+    for msg in msgs:
+        sender.send_obj(msg)
+    assert len(writes) == len(msgs)
+
+    receiver = Receiver()
+    receiver.dataReceived(''.join(writes))
+    assert receiver.objs == msgs
+
+
+def test_router():
+    from src.router import Router
+    from src.protobufreceiver import message_tag
+
+    ticks = iter(range(100))
+    router = Router(timer=lambda: next(ticks))
+
+    handled = []
+    router.register('AskCons', lambda obj, remote_vk: handled.append((obj.r, remote_vk)))
+    router.add_filter('AskCons', lambda data, remote_vk: remote_vk != 'spam')
+    tag = message_tag('AskCons')
+
+    def route(r, remote_vk='vk'):
+        router.route(tag, pb.AskCons(r=r).SerializeToString(), remote_vk)
+
+    route(1)
+    route(2, 'spam')
+    assert handled == [(1, 'vk')]
+
+    router.defer('AskCons')
+    route(3)
+    assert router.stats['AskCons']['deferred'] == 1
+    router.resume('AskCons')
+    assert handled[-1] == (3, 'vk')
+
+    router.drop('AskCons')
+    route(4)
+    router.dispatch(pb.AskCons(r=5), 'vk')
+    assert handled[-1] == (5, 'vk')
+
+    size = len(pb.AskCons(r=1).SerializeToString())
+    assert router.stats['AskCons'] == {'count': 4, 'bytes': 4 * size, 'seconds': 3, 'dropped': 2, 'deferred': 0}
+
+    # views are handled under the original name
+    cons = []
+    router.register('Cons', lambda obj, _: cons.append(obj))
+    router.route(message_tag('Cons'), pb.Cons(round=1).SerializeToString(), 'vk')
+    assert isinstance(cons[0], pb.ConsView)
+
+    with pytest.raises(AssertionError):
+        router.route(message_tag('Dummy'), '', 'vk')
+
+
+def test_discovery_client_router():
+    from src.discovery import make_client_router
+    from src.protobufreceiver import message_tag
+
+    class FakeFactory(object):
+        def __init__(self):
+            self.nodes = []
+            self.instructions = []
+
+        def new_connection_if_not_exist(self, nodes):
+            self.nodes.append(dict(nodes))
+
+        def handle_instruction(self, msg):
+            self.instructions.append(msg.instruction)
+
+    factory = FakeFactory()
+    router = make_client_router(factory)
+    router.route(message_tag('DiscoverReply'), pb.DiscoverReply(nodes={'vk': 'addr'}).SerializeToString(), None)
+    router.route(message_tag('Instruction'), pb.Instruction(instruction='tx').SerializeToString(), None)
+    assert factory.nodes == [{'vk': 'addr'}]
+    assert factory.instructions == ['tx']
+
+    # the discovery server cannot inject messages meant for other nodes
+    with pytest.raises(AssertionError):
+        router.route(message_tag('TxReq'), '', None)
+
+
+def test_replay_buffer():
+    from twisted.internet.task import Clock
+    from src.utils import ReplayBuffer
+
+    clock = Clock()
+    replayed = []
+    buf = ReplayBuffer(lambda msg, vk: replayed.append((msg, vk)), max_size=4, clock=clock)
+
+    buf.put((2, None, 'round'), 'a', 'm1')
+    buf.put((2, 'x', 'ba'), 'b', 'm2')
+    buf.put((3, None, 'round'), 'c', 'm3')
+    buf.put((1, None, 'round'), 'd', 'm4')
+    buf.put((3, None, 'round'), 'e', 'm5')
+    assert len(buf) == 4
+    assert buf.dropped == 1
+
+    # only the matching messages are released, and only at the end of the turn
+    buf.release((2, None, 'round'))
+    buf.release((5, None, 'round'))
+    assert replayed == []
+    clock.advance(0)
+    assert replayed == [('m1', 'a')]
+
+    buf.release_if(lambda k: k[0] < 3)
+    clock.advance(0)
+    assert sorted(replayed[1:]) == [('m2', 'b'), ('m4', 'd')]
+    assert buf.stats == {'size': 1, 'keys': 1, 'replayed': 3, 'dropped': 1}
+
+
+def test_peer_table():
+    from src.peers import PeerTable
+
+    vks = ['vk{}'.format(i) for i in range(6)]
+    table = PeerTable('vk2', random.Random(1))
+    for vk in reversed(vks):
+        table.add(vk, 'localhost', 0, 'proto-' + vk)
+
+    assert table.sorted_vks == vks
+    assert table.neighbour == 'vk3'
+    assert all(table.random_other() != 'vk2' for _ in range(100))
+    assert set(table.random_other() for _ in range(200)) == set(vks) - {'vk2'}
+
+    table.set_promoters(vks[:2])
+    assert sorted(table.non_promoters) == vks[2:]
+    assert set(table.sample(10, exclude=vks[1:])) == {'vk0'}
+
+    # the views follow the changes
+    table.remove('vk3')
+    table.add('vk2', 'localhost', 1, 'new-proto')
+    assert 'vk3' not in table and len(table) == 5
+    assert table.proto('vk2') == 'new-proto' and table.proto('vk5') == 'proto-vk5'
+    assert table.neighbour == 'vk4'
+    assert sorted(table.non_promoters) == ['vk2', 'vk4', 'vk5']
+    table.set_promoters(['vk4'])
+    assert sorted(table.non_promoters) == ['vk0', 'vk1', 'vk2', 'vk5']
+    assert table.is_promoter('vk4') and not table.is_promoter('vk0')
+
+
+def test_outbound_queue():
+    from twisted.internet.task import Clock
+    from src.outbound import OutboundQueue, merge_stats, priority_of, CONSENSUS, CHECKPOINT, BULK, DROP, DEFER
+
+    assert priority_of('Bracha') == CONSENSUS
+    assert priority_of('Sig') == CHECKPOINT
+    assert priority_of('ValidationReq') == BULK
+
+    class Transport(object):
+        def __init__(self):
+            self.writes = []
+
+        def write(self, data):
+            self.writes.append(data)
+
+    clock = Clock()
+    t = Transport()
+    q = OutboundQueue(t, caps=(None, None, 10), policies=(DEFER, DEFER, DROP), coalesce_bytes=4, clock=clock)
+
+    # consensus frames overtake bulk frames that are queued earlier
+    assert q.push('TxReq', 'tttt')
+    assert q.push('ACS', 'aa')
+    assert q.push('CpMsg', 'cc')
+    assert t.writes == []
+    clock.advance(0)
+    assert t.writes == ['aacc', 'tttt']
+
+    # nothing is written while paused, the bulk class is capped and only drops what is retried beyond the cap
+    q.pauseProducing()
+    assert q.push('TxReq', '11111')
+    assert not q.congested(BULK)
+    assert q.push('TxReq', '22222')
+    assert q.congested(BULK)
+    assert not q.push('ValidationResp', '3')
+    assert q.push('TxResp', '4')
+    assert q.push('Mo14', 'm')
+    clock.advance(0)
+    assert len(t.writes) == 2
+    assert q.depth == [1, 0, 3]
+
+    q.resumeProducing()
+    assert t.writes[2:] == ['m11111', '22222', '4']
+    assert not q.congested(BULK)
+
+    stats = merge_stats([q])
+    assert stats['bulk'] == {'depth': 0, 'bytes': 0, 'sent': 4, 'dropped': 1, 'deferred': 1}
+    assert stats['pauses'] == 1
+
+    q.stopProducing()
+    assert not q.push('ACS', 'aa')
@@ -2,7 +2,7 @@ import random
 import string
 import pytest
 from src.trustchain import *
-from src.utils import hash_pointers_ok
+from src.utils import hash_pointers_ok, merkle_levels, merkle_root_of_levels, merkle_proof, merkle_verify
 
 
 @pytest.fixture
@@ -31,6 +31,29 @@ def test_sigs_failure(sigs):
         s.verify(vk, msg)
 
 
+def test_sigs_detached(sigs):
+    msg, vk, sk = sigs
+    s = Signature.new(vk, sk, msg)
+
+    # the message is not carried
+    assert not s.pb.signed_document
+    assert len(s.pb.sig) == libnacl.crypto_sign_BYTES
+
+    with pytest.raises(ValueError):
+        s.verify_uncached(msg + 'x')
+
+
+def test_sigs_legacy(sigs):
+    msg, vk, sk = sigs
+    s = Signature(pb.Signature(vk=vk, signed_document=libnacl.crypto_sign(msg, sk)))
+
+    # no exception should be thrown
+    s.verify(vk, msg)
+
+    with pytest.raises(ValueError):
+        s.verify_uncached(msg + 'x')
+
+
 def gen_txblock(prev_s, prev_r, vk_s, sk_s, vk_r, sk_r, h_s, h_r, m):
     # type: (str, str, str, str, str, str, int, int, str) -> Tuple[TxBlock, TxBlock]
     """
@@ -49,8 +72,8 @@ def gen_txblock(prev_s, prev_r, vk_s, sk_s, vk_r, sk_r, h_s, h_r, m):
     tx_s = TxBlock.new(prev_s, h_s, vk_r, m, vk_s, sk_s)
     tx_r = TxBlock.new(prev_r, h_r, vk_s, m, vk_r, sk_r, tx_s.inner.nonce)
 
-    tx_s.add_other_half(tx_r)
-    tx_r.add_other_half(tx_s)
+    tx_s.verify_other_half(tx_r)
+    tx_r.verify_other_half(tx_s)
 
     return tx_s, tx_r
 
@@ -68,7 +91,7 @@ def test_txblock():
     h_s = 1
     h_r = 1
 
-    # assertions are mostly in `add_other_half`
+    # assertions are mostly in `verify_other_half`
     gen_txblock(prev_s, prev_r, vk_s, sk_s, vk_r, sk_r, h_s, h_r, m)
 
 
@@ -211,19 +234,98 @@ def test_promoter(n, x, ps):
 
     assert len(promoters) == ps
 
+    # same as sorting all the registered CPs by luck
+    registered = sorted([b for b in cons.blocks if b.inner.p == 1], key=lambda b: b.luck)
+    assert promoters == [b.s.vk for b in registered][:x]
+
+
+def test_cons_view():
+    _, _, cons = gen_cons(10, 1)
+
+    # a view of the same bytes is the same Cons, and nothing is decoded to find that out
+    view = Cons(pb.ConsView.FromString(cons.SerializeToString()))
+    assert view.hash == cons.hash
+    assert view.round == 1
+    assert view.blocks.decoded_count == 0
+
+    encoded = Cons.new_encoded(1, [b.SerializeToString() for b in cons.blocks])
+    assert encoded == cons
+
+    assert view.get_promoters(4) == cons.get_promoters(4)
+    assert list(view.blocks) == list(cons.blocks)
+    assert view.blocks[2:4] == cons.blocks[2:4]
+
+
+def test_from_string(sigs):
+    _, vk, sk = sigs
+    tx = TxBlock.new('prev', 1, 'counterparty', 'm', vk, sk)
+    data = tx.SerializeToString()
+
+    # canonical bytes are kept
+    tx2 = TxBlock.from_string(data)
+    assert tx2._str is data
+    assert tx2 == tx and tx2.hash == tx.hash
+
+    # non-canonical bytes (here a repeated field) are not, so the hash is the same as the one of the creator
+    tx3 = TxBlock.from_string(data + pb.TxBlock(s=tx.pb.s).SerializeToString())
+    assert tx3.SerializeToString() == data
+    assert tx3.hash == tx.hash
+
+
+@pytest.mark.parametrize("n", [1, 2, 5])
+def test_tx_batch(n):
+    tc_s = TrustChain()
+    tc_r = TrustChain()
+    ms = ['m' + str(i) for i in range(n)]
+
+    txs_s = tc_s.new_tx_batch(tc_r.vk, ms)
+    # the counterparty rebuilds the same blocks from the inners and the single signature
+    other_halves = TxBlock.from_batch([tx.inner for tx in txs_s], txs_s[0].pb.s)
+    assert other_halves == txs_s
+
+    txs_r = tc_r.new_tx_batch(tc_s.vk, ms, [tx.inner.nonce for tx in txs_s])
+    other_halves_r = TxBlock.from_batch([tx.inner for tx in txs_r], txs_r[0].pb.s)
+    for tx_s, tx_r, other_half_s, other_half_r in zip(txs_s, txs_r, other_halves, other_halves_r):
+        tc_r.my_chain.add_other_half(tx_r.seq, other_half_s)
+        tc_s.my_chain.add_other_half(tx_s.seq, other_half_r)
+
+    assert tc_s.my_chain.unknown_count == n
+    assert tc_r.my_chain.unknown_count == n
+    assert hash_pointers_ok([b.compact for b in tc_s.my_chain.chain])
+
+    # a block that is not in the batch is rejected
+    forged = pb.TxBlock()
+    forged.CopyFrom(txs_s[0].pb)
+    forged.inner.prev = 'forged'
+    with pytest.raises(ValueError):
+        txs_r[0].verify_other_half(TxBlock(forged))
+
+
+def test_promoters_of_round():
+    tc_s, tc_r = generate_tc_pair(2, 1)
+    tc = TrustChain(n_promoters=1)
+    cons = tc_s.consensus[1]
+    tc.new_cp(1, cons, [Signature.new(tc.vk, tc._sk, cons.hash)], [tc.vk], 0)
+
+    # filled when the consensus result is stored
+    assert tc._promoters[1] == cons.get_promoters(1)
+    assert tc.promoters_of_round(1) == cons.get_promoters(1)
+
 
-def generate_tc_pair(n_cp, n_tx):
+def generate_tc_pair(n_cp, n_tx, store_s=None, merkle_roots=True):
     """
     
     :param n_cp: number of CP blocks excluding the genesis block
     :param n_tx: number of TX blocks in between CP blocks
+    :param store_s: block storage of the first TrustChain
+    :param merkle_roots: see TrustChain
     :return: 
     """
-    tc_s = TrustChain()
+    tc_s = TrustChain(store_s, merkle_roots=merkle_roots)
     vk_s = tc_s.vk
     sk_s = tc_s._sk
 
-    tc_r = TrustChain()
+    tc_r = TrustChain(merkle_roots=merkle_roots)
     vk_r = tc_r.vk
     sk_r = tc_r._sk
 
@@ -236,6 +338,8 @@ def generate_tc_pair(n_cp, n_tx):
                                      tc_s.next_seq, tc_r.next_seq, "123test")
             tc_s._new_tx(tx_s)
             tc_r._new_tx(tx_r)
+            tc_s.my_chain.add_other_half(tx_s.seq, tx_r)
+            tc_r.my_chain.add_other_half(tx_r.seq, tx_s)
 
         r = i + 1
         cons = Cons.new(r, [tc_s.latest_cp.pb, tc_r.latest_cp.pb])
@@ -265,8 +369,13 @@ def test_pieces(seq, n_cp, n_tx):
     pieces = tc_s.my_chain.pieces(seq)
     pieces2 = tc_s.agreed_pieces(seq)
 
-    # note that this only compares the parts in _tuple
-    assert pieces == pieces2
+    # agreed pieces are the same blocks, only the agreed rounds of the end points are set
+    assert [p.hash for p in pieces] == [p.hash for p in pieces2]
+    assert pieces[1:-1] == pieces2[1:-1]
+    assert pieces2[0].agreed_round != -1 and pieces2[-1].agreed_round != -1
+
+    # the blocks in my chain are not mutated
+    assert tc_s.my_chain.pieces(seq) == pieces
     assert hash_pointers_ok(pieces)
 
 
@@ -288,7 +397,7 @@ def test_validation(seq, n_cp, n_tx, expected):
     tc_s, tc_r = generate_tc_pair(n_cp, n_tx)
 
     # initially everything should have unkonwn state
-    is_unknowns = map(lambda tx: tx.validity == VALIDITY_ENUM.Unknown, tc_s.get_verifiable_txs())
+    is_unknowns = map(lambda tx: tc_s.my_chain.validity(tx.seq) == VALIDITY_ENUM.Unknown, tc_s.get_verifiable_txs())
     # We need - n_tx because the final "round" of transactions cannot be verified.
     # That is, the CP that follows them is not in consensus.
     assert len(is_unknowns) == n_cp * n_tx - n_tx
@@ -325,3 +434,586 @@ def test_validation(seq, n_cp, n_tx, expected):
         # if we load the cache again, it should be the initial response
         assert tc_s.load_cache_for_verification(seq) == resp
 
+
+def test_segment_validation():
+    n_cp, n_tx = 3, 5
+    tc_s, tc_r = generate_tc_pair(n_cp, n_tx)
+
+    # every TX that is followed by an agreed CP, i.e. the first two intervals
+    seqs = [tx.seq for tx in tc_s.get_verifiable_txs()]
+    seq_rs = [tc_s.my_chain.other_half(seq).seq for seq in seqs]
+    assert len(seqs) == (n_cp - 1) * n_tx
+
+    # one segment per interval
+    segments = tc_r.agreed_segments(seq_rs + [0, 10 ** 6])
+    assert len(segments) == n_cp - 1
+    assert segments[0] == tc_r.agreed_pieces(seq_rs[0])
+
+    # segments of another chain do not validate anything, and they are not cached under the wrong vk
+    assert tc_s.verify_segments(tc_s.vk, seqs, segments) == 0
+    assert tc_s.vk not in tc_s._other_chains
+
+    # so the genuine segments of that chain can still be cached
+    assert tc_s.verify_segments(tc_s.vk, [], tc_s.agreed_segments(seqs)) == 0
+    assert tc_s.vk in tc_s._other_chains
+
+    assert tc_s.verify_segments(tc_r.vk, seqs, segments) == len(seqs)
+    assert all(tc_s.my_chain.validity(seq) == VALIDITY_ENUM.Valid for seq in seqs)
+
+
+def test_validation_scheduler():
+    from twisted.internet.task import Clock
+    from src.trustchain.scheduler import ValidationScheduler
+
+    n_cp, n_tx = 3, 5
+    tc_s, tc_r = generate_tc_pair(n_cp, n_tx)
+    seqs = [tx.seq for tx in tc_s.get_pending_txs()]
+    assert len(seqs) == (n_cp - 1) * n_tx
+
+    sent = []
+    horizons = []
+
+    def pending_since(lo):
+        horizons.append(lo)
+        txs, hi = tc_s.get_pending_since(lo)
+        return [(tx.seq, tx.inner.counterparty) for tx in txs], hi
+
+    def is_pending(seq):
+        return tc_s.my_chain.validity(seq) == VALIDITY_ENUM.Unknown
+
+    def send(node, _seqs):
+        sent.append((node, _seqs))
+        return True
+
+    clock = Clock()
+    scheduler = ValidationScheduler(pending_since, is_pending, send,
+                                    per_peer=2, total=8, timeout=5, batch=3, clock=clock)
+
+    # the window of the counterparty is filled with the oldest TXs
+    assert scheduler.pump() == 2
+    assert sent == [(tc_r.vk, seqs[:3]), (tc_r.vk, seqs[3:6])]
+    assert scheduler.stats == {'queue_depth': 4, 'in_flight': 2, 'in_flight_txs': 6, 'timeouts': 0}
+    assert scheduler.pump() == 0
+
+    # the pending TXs are only handed over once
+    bound = tc_s.verifiable_bound
+    assert horizons == [0, bound]
+
+    # a response frees a slot and the next request is sent straight away
+    answered = sent[0][1]
+    seq_rs = [tc_s.my_chain.other_half(seq).seq for seq in answered]
+    assert tc_s.verify_segments(tc_r.vk, answered, tc_r.agreed_segments(seq_rs)) == 3
+    scheduler.on_response(answered)
+    assert sent[2] == (tc_r.vk, seqs[6:9])
+    assert scheduler.stats == {'queue_depth': 1, 'in_flight': 2, 'in_flight_txs': 6, 'timeouts': 0}
+
+    # unanswered requests expire and the TXs that are still pending are sent again,
+    # the rest of the first interval is validated from the cache
+    clock.advance(5)
+    scheduler.tick()
+    assert scheduler.stats['timeouts'] == 2
+    remaining = [tx.seq for tx in tc_s.get_pending_txs()]
+    assert remaining == seqs[n_tx:]
+    assert sent[3:] == [(tc_r.vk, remaining[:3]), (tc_r.vk, remaining[3:])]
+    assert set(horizons) == {0, bound}
+
+    # TXs that are not sent are retried after the timeout
+    del sent[:]
+
+    def all_pending(lo):
+        return [(seq, tc_r.vk) for seq in seqs if seq >= lo], bound
+
+    def always_pending(_):
+        return True
+
+    def send_nothing(node, _seqs):
+        sent.append(_seqs)
+        return False
+
+    scheduler = ValidationScheduler(all_pending, always_pending, send_nothing, per_peer=2, timeout=5, clock=clock)
+    assert scheduler.pump() == 0
+    # the other TXs of the same counterparty are not tried either
+    assert sent == [seqs[:1]]
+    assert scheduler.stats['queue_depth'] == len(seqs)
+    clock.advance(1)
+    scheduler.tick()
+    assert sent[1:] == []
+    clock.advance(4)
+    scheduler.tick()
+    assert sent[1:] == [seqs[:1]]
+
+    # a TX that becomes pending after it is covered by a consensus result is queued,
+    # one that is not covered yet is left for pending_since
+    def all_but_first(lo):
+        return [(seq, tc_r.vk) for seq in seqs[1:] if seq >= lo], bound
+
+    scheduler = ValidationScheduler(all_but_first, always_pending, send, per_peer=1, timeout=5, clock=clock)
+    scheduler.pump()
+    assert scheduler.stats['queue_depth'] == len(seqs) - 2
+    scheduler.add(seqs[0], tc_r.vk)
+    scheduler.add(bound + 1, tc_r.vk)
+    assert scheduler.stats['queue_depth'] == len(seqs) - 1
+
+
+@pytest.mark.parametrize("dist,s", [
+    ('uniform', 1.0),
+    ('zipf', 1.0),
+    ('zipf', 2.0),
+    ('neighbour', 1.0),
+])
+def test_samplers(dist, s):
+    from src.trustchain.workload import make_sampler
+
+    items = list(range(5))
+    if dist == 'uniform':
+        weights = [1.0] * len(items)
+    elif dist == 'zipf':
+        weights = [1.0 / (k ** s) for k in range(1, len(items) + 1)]
+    else:
+        weights = [1.0] + [0.0] * (len(items) - 1)
+
+    n = 20000
+    sampler = make_sampler(dist, items, s, random.Random(1))
+    counts = [0] * len(items)
+    for _ in range(n):
+        counts[sampler.sample()] += 1
+
+    for count, w in zip(counts, weights):
+        assert abs(float(count) / n - w / sum(weights)) < 0.02
+
+
+def test_workload():
+    from twisted.internet.task import Clock
+    from src.trustchain.workload import WorkloadGenerator, RateProfile, parse_workload, make_sampler, \
+        DEFAULT_DISTRIBUTION, DEFAULT_ZIPF_S
+
+    profile, dist, s = parse_workload("rate=0:100,2:1000,3:0 dist=zipf s=1.5")
+    assert (dist, s) == ('zipf', 1.5)
+    assert parse_workload("rate=1")[1:] == (DEFAULT_DISTRIBUTION, DEFAULT_ZIPF_S)
+    assert [profile.rate_at(t) for t in [0, 1.9, 2, 2.5, 3, 10]] == [100, 100, 1000, 1000, 0, 0]
+    assert profile.tokens_between(1.5, 2.5) == 550
+    assert RateProfile.from_string("20").rate_at(100) == 20
+
+    made = []
+    clock = Clock()
+    gen = WorkloadGenerator(made.append, make_sampler('neighbour', ['a']), profile, tick=0.1, clock=clock)
+    gen.start()
+
+    # one burst per tick rather than one timer per transaction
+    clock.advance(0.1)
+    assert gen.made == 10
+    clock.pump([0.1] * 39)
+    assert gen.made == len(made) == 1200
+    assert set(made) == {'a'}
+
+    # tokens are dropped beyond the burst size after a stall
+    gen = WorkloadGenerator(made.append, make_sampler('neighbour', ['a']), RateProfile([(0, 10)]), burst=5,
+                            clock=clock)
+    gen.start()
+    clock.advance(10)
+    assert gen.made == 5
+    gen.stop()
+
+
+@pytest.mark.parametrize("seq,n_cp,n_tx,expected", [
+    (4, 3, 5, VALIDITY_ENUM.Valid),
+    (7, 3, 5, VALIDITY_ENUM.Valid),
+    (7, 3, 9, VALIDITY_ENUM.Valid),
+    (15, 3, 5, None)
+])
+def test_merkle_validation(seq, n_cp, n_tx, expected):
+    tc_s, tc_r = generate_tc_pair(n_cp, n_tx)
+
+    seq_r = tc_s.my_chain.chain[seq].inner.seq
+    proof = tc_r.merkle_proof(seq_r)
+
+    # the last TXs are not followed by an agreed CP, so there is nothing to prove
+    if expected is None:
+        assert proof is None
+        return
+
+    assert len(proof.siblings) <= n_tx.bit_length()
+    assert tc_s.verify_tx_proof(seq, proof) == expected
+    assert tc_s.my_chain.validity(seq) == expected
+
+    # the proof of one TX must not validate another one
+    other_seq = seq + 1 if tc_s.my_chain.is_tx(seq + 1) else seq - 1
+    assert tc_s.verify_tx_proof(other_seq, proof) == VALIDITY_ENUM.Unknown
+
+
+def test_merkle_roots_off():
+    tc_s, tc_r = generate_tc_pair(2, 3, merkle_roots=False)
+
+    # without roots there is no proof, the responder falls back to the pieces
+    assert not tc_r.latest_cp.inner.merkle_root
+    assert tc_r.merkle_proof(2) is None
+    assert tc_r.agreed_pieces(2)
+
+
+def test_prune():
+    n_cp, n_tx = 3, 5
+    tc_s, tc_r = generate_tc_pair(n_cp, n_tx)
+    pieces = tc_s.agreed_pieces(4)
+
+    # nothing is settled, so nothing can be archived
+    assert tc_s.prune() == 0
+
+    # settle every TX before the last agreed CP, which is the second to last CP
+    last_agreed = tc_s.my_chain.chain[-2 - n_tx].seq
+    for seq in range(last_agreed):
+        if tc_s.my_chain.is_tx(seq):
+            validity = VALIDITY_ENUM.Invalid if seq == 3 else VALIDITY_ENUM.Valid
+            tc_s.my_chain.set_validity(seq, validity)
+    validated = tc_s.validated_count
+
+    assert tc_s.prune() == last_agreed
+    assert tc_s.prune() == 0
+    assert tc_s.my_chain.archived_count == last_agreed
+    # only the TXs are dropped
+    assert tc_s.my_chain.resident_count == len(tc_s.my_chain.chain) - 2 * n_tx
+
+    # the archived TXs keep their validity and can still be served
+    assert tc_s.my_chain.validity(3) == VALIDITY_ENUM.Invalid
+    assert tc_s.my_chain.validity(4) == VALIDITY_ENUM.Valid
+    assert tc_s.validated_count == validated
+    assert tc_s.agreed_pieces(4) == pieces
+    assert tc_s.merkle_proof(4) is not None
+
+    # drop the old consensus results, the rounds of my own CPs stay indexed
+    tc_s.prune(cons_retention=1)
+    assert sorted(tc_s.consensus.keys()) == [n_cp]
+    assert tc_s.consensus_round_of_cp(tc_s.my_chain.genesis) == 1
+    assert tc_s.consensus_round_of_cp(tc_s.my_chain.chain[last_agreed]) == n_cp
+
+
+def test_prune_keeps_needed_rounds():
+    n_cp, n_tx = 3, 5
+    tc_s, tc_r = generate_tc_pair(n_cp, n_tx)
+
+    # my TXs are pending, so the rounds that verify them are kept
+    tc_s.prune(cons_retention=1)
+    assert sorted(tc_s.consensus.keys()) == range(1, n_cp + 1)
+
+    # the counterparty settles and prunes everything it can, but it can still serve the pieces of old TXs
+    last_agreed = tc_r.my_chain.chain[-2 - n_tx].seq
+    for seq in range(last_agreed):
+        if tc_r.my_chain.is_tx(seq):
+            tc_r.my_chain.set_validity(seq, VALIDITY_ENUM.Valid)
+    tc_r.prune(cons_retention=1)
+    assert sorted(tc_r.consensus.keys()) == [n_cp]
+
+    for seq in [1, 4, 7]:
+        pieces = tc_r.agreed_pieces(seq)
+        assert pieces
+        assert tc_s.verify_tx(seq, pieces, use_cache=False) == VALIDITY_ENUM.Valid
+
+
+def test_merkle_utils():
+    for n in range(0, 10):
+        leaves = [str(i) * 32 for i in range(n)]
+        levels = merkle_levels(leaves)
+        root = merkle_root_of_levels(levels)
+        for i in range(n):
+            assert merkle_verify(leaves[i], i, n, merkle_proof(levels, i), root)
+            assert not merkle_verify(leaves[i], i, n + 1, merkle_proof(levels, i), root)
+        if n > 1:
+            assert not merkle_verify(leaves[0], 1, n, merkle_proof(levels, 0), root)
+
+
+@pytest.mark.parametrize("n_cp,n_tx", [
+    (3, 5),
+    (4, 1),
+])
+def test_cp_index(n_cp, n_tx):
+    tc_s, _ = generate_tc_pair(n_cp, n_tx)
+    chain = tc_s.my_chain
+
+    for r in range(n_cp + 1):
+        cp = chain.get_cp_of_round(r)
+        assert cp.round == r
+        assert cp.seq == r * (n_tx + 1)
+    assert chain.get_cp_of_round(n_cp + 1) is None
+
+    for seq in range(1, len(chain.chain) - 1):
+        if isinstance(chain.chain[seq], CpBlock):
+            continue
+        c_a, c_b = chain._enclosure(seq)
+        assert c_a.seq < seq < c_b.seq
+        assert all(isinstance(b, TxBlock) for b in chain.chain[c_a.seq + 1:c_b.seq])
+
+
+def test_cons_index():
+    n_cp = 3
+    tc_s, tc_r = generate_tc_pair(n_cp, 2)
+
+    for r in range(1, n_cp + 1):
+        for b in tc_s.consensus[r].blocks:
+            assert tc_s.consensus_round_of_cp(b) == r
+            assert tc_s.consensus_round_of_compact_cp(b.compact) == r
+            assert tc_s.compact_cp_in_consensus(b.compact, r)
+            assert not tc_s.compact_cp_in_consensus(b.compact, r + 1)
+
+    assert tc_s.consensus_round_of_compact_cp(tc_s.latest_cp.compact) == -1
+    assert not tc_s.compact_cp_in_consensus(tc_s.latest_cp.compact, n_cp + 1)
+
+
+def test_tx_tracker():
+    n_cp, n_tx = 3, 4
+    tc_s, tc_r = generate_tc_pair(n_cp, n_tx)
+    chain = tc_s.my_chain
+
+    unknown = chain.get_unknown_txs()
+    assert len(unknown) == chain.unknown_count == n_cp * n_tx
+    assert [tx.seq for tx in unknown] == sorted(tx.seq for tx in unknown)
+    assert len(chain.get_unknown_txs(counterparty=tc_r.vk)) == n_cp * n_tx
+    assert len(chain.get_unknown_txs(counterparty=tc_s.vk)) == 0
+    assert len(chain.get_unknown_txs(max_seq=n_tx + 1)) == n_tx
+
+    seq = unknown[0].seq
+    chain.set_validity(seq, VALIDITY_ENUM.Valid)
+    assert chain.unknown_count == n_cp * n_tx - 1
+    assert chain.validated_count == 1
+    assert [tx.seq for tx in chain.get_validated_txs()] == [seq]
+    assert seq not in [tx.seq for tx in chain.get_unknown_txs(counterparty=tc_r.vk)]
+
+    # setting the validity again has no effect
+    chain.set_validity(seq, VALIDITY_ENUM.Invalid)
+    assert chain.validated_count == 1
+
+    # TXs with a pending request are not verifiable until the next round
+    verifiable = tc_s.get_verifiable_txs()
+    chain.set_request_sent(verifiable[0].seq, tc_s.latest_round)
+    assert len(tc_s.get_verifiable_txs()) == len(verifiable) - 1
+
+
+def test_segment_store(tmpdir):
+    n_cp, n_tx = 3, 5
+    tc_s, tc_r = generate_tc_pair(n_cp, n_tx)
+
+    # replay my chain into a store with a tiny hot tail and tiny segments
+    store = open_segment_store(str(tmpdir), segment_size=1024, hot_size=2)
+    chain = Chain(tc_s.vk, tc_s._sk, store)
+    assert len(store) == 1
+    store.close()
+
+    store = open_segment_store(str(tmpdir), segment_size=1024, hot_size=2)
+    chain = Chain(tc_s.vk, tc_s._sk, store)
+    genesis = chain.genesis
+    for b in tc_s.my_chain.chain[1:]:
+        if isinstance(b, TxBlock):
+            chain.new_tx(b)
+            chain.add_other_half(b.seq, tc_s.my_chain.other_half(b.seq))
+        else:
+            chain.new_cp(b)
+
+    assert len(tmpdir.listdir()) > 2  # index and more than one segment
+    assert [b.hash for b in chain.chain] == [b.hash for b in tc_s.my_chain.chain]
+    assert chain.pieces(2) == tc_s.my_chain.pieces(2)
+    assert hash_pointers_ok(chain.pieces(2))
+
+    # pending TXs and CPs stay in memory, the other halves are in the side table
+    assert chain.unknown_count == n_cp * n_tx
+    assert store.resident_count == n_cp * n_tx + n_cp + 1
+    assert chain.other_half(2) == tc_s.my_chain.other_half(2)
+    chain.set_validity(2, VALIDITY_ENUM.Valid)
+    assert store.resident_count == n_cp * n_tx + n_cp
+    store.close()
+
+    # reopen
+    chain = Chain(tc_s.vk, tc_s._sk, open_segment_store(str(tmpdir)))
+    assert chain.genesis == genesis
+    assert chain.latest_hash == tc_s.latest_hash
+    assert chain.latest_cp == tc_s.latest_cp
+    assert chain.tx_count == tc_s.tx_count
+    assert chain.cp_count == tc_s.cp_count
+    assert chain.get_cp_of_round(2) == tc_s.my_chain.get_cp_of_round(2)
+
+    # the other halves and the validity survive the reopen
+    assert chain.unknown_count == n_cp * n_tx - 1
+    assert chain.other_half(2) == tc_s.my_chain.other_half(2)
+    assert chain.other_half(3) == tc_s.my_chain.other_half(3)
+    assert chain.validity(2) == VALIDITY_ENUM.Valid
+    assert chain.validity(3) == VALIDITY_ENUM.Unknown
+    assert chain.resident_count == n_cp * n_tx - 1 + n_cp + 1
+
+
+def test_segment_store_lookups(tmpdir):
+    store = open_segment_store(str(tmpdir), hot_size=2)
+    maps = []
+    map_file = store._map
+    store._map = lambda *args: maps.append(args) or map_file(*args)
+
+    # new blocks are looked up without mapping the index again
+    tc = TrustChain(store)
+    counterparty, _ = libnacl.crypto_sign_keypair()
+    for _ in range(200):
+        tc.new_tx(counterparty, 'm')
+        assert tc.my_chain.is_tx(tc.next_seq - 1)
+    assert maps == []
+    assert [b.seq for b in tc.my_chain.chain[:3]] == [0, 1, 2]
+    assert tc.my_chain.genesis is tc.my_chain.genesis
+
+
+def test_segment_store_restart(tmpdir):
+    n_cp, n_tx = 3, 5
+    tc_s, tc_r = generate_tc_pair(n_cp, n_tx, open_segment_store(str(tmpdir)))
+    verifiable = [tx.seq for tx in tc_s.get_verifiable_txs()]
+    tc_s.my_chain.set_validity(verifiable[0], VALIDITY_ENUM.Invalid)
+    tc_s.my_chain.chain.close()
+
+    # the key pair, the consensus results and the validation state are restored
+    tc = TrustChain(open_segment_store(str(tmpdir)))
+    assert tc.vk == tc_s.vk
+    assert tc.latest_hash == tc_s.latest_hash
+    assert sorted(tc.consensus) == sorted(tc_s.consensus)
+    assert tc.consensus_round_of_cp(tc.my_chain.chain[-2 - n_tx]) == n_cp
+    assert tc.my_chain.validity(verifiable[0]) == VALIDITY_ENUM.Invalid
+    assert tc.my_chain.unknown_count == n_cp * n_tx - 1
+    assert [tx.seq for tx in tc.get_verifiable_txs()] == verifiable[1:]
+
+    # so the pending TXs can still be validated, and new blocks extend the chain with the same key
+    seq = verifiable[1]
+    assert tc.verify_tx(seq, tc_r.agreed_pieces(tc.my_chain.other_half(seq).seq)) == VALIDITY_ENUM.Valid
+    tc.new_tx(tc_r.vk, 'm')
+    assert tc.my_chain.chain[-1].s.vk == tc_s.vk
+
+    # a store cannot be opened with another key
+    tc.my_chain.chain.close()
+    with pytest.raises(AssertionError):
+        Chain(tc_r.vk, tc_r._sk, open_segment_store(str(tmpdir)))
+
+
+def test_sigs_cache(sigs):
+    msg, vk, sk = sigs
+    s = Signature.new(vk, sk, msg)
+
+    s.verify(vk, msg)
+    hits = verification_cache_stats()['hits']
+    Signature(s.pb).verify(vk, msg)
+    assert verification_cache_stats()['hits'] == hits + 1
+
+    # a cached signature must not verify a different message
+    with pytest.raises(ValueError):
+        s.verify(vk, msg + 'x')
+
+
+@pytest.mark.parametrize("n,x,bad", [
+    (4, 4, 0),
+    (4, 4, 2),
+    (4, 4, 3),
+    (19, 19, 6),
+])
+def test_batch_verifier(n, x, bad):
+    from twisted.internet import defer
+    from src.trustchain.verifier import BatchVerifier
+
+    vks, ss, cons = gen_cons(n, 1)
+    ss = ss[:x]
+    for i in range(bad):
+        ss[i] = Signature.new(ss[i].vk, sigs()[2], cons.hash)  # signed with the wrong key
+
+    calls = []
+
+    def defer_now(f, *args):
+        calls.append(args)
+        return defer.maybeDeferred(f, *args)
+
+    t = (n - 1) / 3
+    res = []
+    BatchVerifier(defer_now).verify_signatures(cons.hash, ss, vks, t).addCallbacks(res.append, res.append)
+
+    if x - bad > t:
+        assert len(res[0]) == t + 1
+        assert all(s.is_verified(cons.hash) for s in res[0])
+        # we stop once there are enough valid signatures
+        assert len(calls) == bad + t + 1
+    else:
+        res[0].trap(ValueError)
+
+
+def test_batch_verifier_in_flight():
+    from twisted.internet import defer
+    from src.trustchain.verifier import BatchVerifier
+
+    n = 19
+    t = (n - 1) / 3
+    vks, ss, cons = gen_cons(n, 1)
+    bad = Signature.new(ss[0].vk, sigs()[2], cons.hash)
+    ss[0] = bad
+
+    jobs = []
+
+    def defer_later(f, *args):
+        d = defer.Deferred()
+        jobs.append((d, f, args))
+        return d
+
+    def run_job(i):
+        d, f, args = jobs[i]
+        try:
+            d.callback(f(*args))
+        except ValueError:
+            d.errback()
+
+    res = []
+    BatchVerifier(defer_later, margin=1).verify_signatures(cons.hash, ss, vks, t).addCallbacks(res.append, res.append)
+
+    # only t + 1 and the margin are submitted, not all n
+    assert len(jobs) == t + 2
+    assert jobs[0][2][0] == cons.hash
+
+    # a failure submits one more
+    run_job(0)
+    assert len(jobs) == t + 3
+
+    # a success does not
+    run_job(1)
+    assert len(jobs) == t + 3
+
+    for i in range(2, t + 3):
+        run_job(i)
+    assert len(res[0]) == t + 1
+    assert len(jobs) == t + 3
+
+
+def test_sparse_pieces():
+    n_tx = 3
+    tc_s, tc_r = generate_tc_pair(4, n_tx)
+    interval = n_tx + 1
+    first = tc_r.agreed_pieces(1)
+    third = tc_r.agreed_pieces(1 + 2 * interval)
+    second = tc_r.agreed_pieces(1 + interval)
+
+    pieces = SparsePieces()
+    assert pieces.put(third)
+    assert pieces.put(first)
+    assert len(pieces._runs) == 2
+    assert not pieces.has(1 + interval)
+    assert pieces.agreed_range(1 + interval) == []
+    assert pieces.agreed_range(1) == first
+
+    # the middle piece joins the two runs
+    assert pieces.put(second)
+    assert len(pieces._runs) == 1
+    assert pieces.count == 3 * interval + 1
+    expected = tc_r.my_chain.chain.compacts(first[0].seq, third[-1].seq + 1)
+    assert [b.hash for b in pieces] == [b.hash for b in expected]
+    assert pieces.agreed_range(1 + interval) == second
+
+    # storing the same pieces again is not an update
+    assert not pieces.put(second)
+
+
+def test_piece_cache_eviction():
+    tc_s, tc_r = generate_tc_pair(2, 3)
+    pieces = tc_r.agreed_pieces(2)
+
+    cache = PieceCache(2 * len(pieces) * CompactColumns.ROW_BYTES)
+    assert cache.put('a', pieces)
+    assert cache.put('b', pieces)
+    assert cache.agreed_range('a', 2) == pieces  # 'a' is now the most recently used
+    assert cache.put('c', pieces)
+
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    assert cache.evictions == 1
+    assert cache.nbytes == 2 * len(pieces) * CompactColumns.ROW_BYTES
@@ -1,6 +1,9 @@
 from tools import *
 import json
 
+import src.messages.messages_pb2 as pb
+from src.trustchain.trustchain import TrustChain, CpBlock, Signature
+
 
 def check_multiple_rounds(n, t, max_r):
     for r in range(1, 1 + max_r):
@@ -103,3 +106,86 @@ def test_tx(n, t, timeout, expected, folder, discover):
     print "Test: tx test passed"
 
 
+def test_round_state():
+    from src.trustchain.trustchain_runner import RoundState
+
+    tcs = [TrustChain() for _ in range(4)]
+    state = RoundState()
+
+    res = []
+    state.when_cps(3).addCallback(res.append)
+    state.when_cps(2).addCallback(lambda cps: res.append(len(cps)))
+
+    assert state.new_cp(tcs[0].genesis)
+    # duplicates do not count
+    assert not state.new_cp(CpBlock(tcs[0].genesis.pb))
+    assert res == []
+    assert state.new_cp(tcs[1].genesis)
+    assert res == [2]
+    assert state.new_cp(tcs[2].genesis)
+    assert res[1] == [tc.genesis for tc in tcs[:3]]
+
+    # fires straight away if the threshold is already crossed
+    state.when_cps(1).addCallback(res.append)
+    assert len(res) == 3
+
+    sigs = []
+    state.when_sigs(2).addCallback(sigs.append)
+    ss = [Signature.new(tc.vk, tc._sk, 'test') for tc in tcs]
+    assert state.new_sig(ss[0])
+    assert not state.new_sig(ss[0])
+    assert sigs == []
+    assert state.new_sig(ss[1])
+    assert sigs == [ss[:2]]
+
+
+def test_bootstrap_promoters():
+    from src.trustchain.trustchain_runner import TrustChainRunner
+
+    class Config(object):
+        n = 4
+        store_dir = None
+        validation_mode = 'pieces'
+        cons_retention = None
+
+    class ACS(object):
+        def __init__(self):
+            self.started = []
+
+        def start(self, msg, r):
+            self.started.append((msg, r))
+
+    class Factory(object):
+        def __init__(self):
+            self.config = Config()
+            self.acs = ACS()
+            self.promoters = []
+            self.cast = []
+
+        def promoter_cast(self, msg):
+            self.cast.append(msg)
+
+    factory = Factory()
+    runner = TrustChainRunner(factory)
+    runner.collect_rubbish_lc.stop()
+    runner.log_tx_count_lc.stop()
+
+    tcs = [runner.tc] + [TrustChain() for _ in range(3)]
+    factory.vk = runner.tc.vk
+    factory.sorted_peer_keys = sorted(tc.vk for tc in tcs)
+
+    runner.bootstrap_promoters()
+    assert factory.promoters == factory.sorted_peer_keys
+    assert factory.cast == [runner.tc.genesis.pb]
+
+    # ACS starts as soon as the CP that crosses the threshold arrives, duplicates do not count
+    for tc in tcs[:3]:
+        runner.handle_cp(tc.genesis.pb, tc.vk)
+    runner.handle_cp(tcs[0].genesis.pb, tcs[0].vk)
+    assert factory.acs.started == []
+
+    runner.handle_cp(tcs[3].genesis.pb, tcs[3].vk)
+    assert len(factory.acs.started) == 1
+    msg, r = factory.acs.started[0]
+    assert r == 1
+    assert [CpBlock(cp) for cp in pb.CpBlocks.FromString(msg).cps] == [tc.genesis for tc in tcs]